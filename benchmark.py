@@ -0,0 +1,281 @@
+"""
+Benchmarks of the calculation and plotting hot paths.
+
+    python -m benchmark -o baseline.json                  # save results
+    python -m benchmark --baseline baseline.json          # compare, exit code 1 on regressions
+
+Every case runs over a fixed corpus of parameter points (seeded jitter
+around the presets of the interface), so runs are comparable between
+commits on the same machine.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+import calculatingModule
+from calcTypes import Params
+
+# значения, которые ставит кнопка SetMat в interfaceL:
+# (E_gap, E_d, N_d0, E_as, N_as, m_e, m_h, epsilon, T, E_out) в единицах слайдеров
+presets = {
+    'custom': (5, 0.5, 10, 2.5, 10, 0.5, 0.5, 10.0, 300, 1),
+    'Si': (1.12, 1e-2, 10, 1.12/2, 10, 0.36, 0.81, 11.7, 300, 1),
+    'Ge': (0.661, 1e-2, 101, 0.661/2, 10, 0.22, 0.34, 16.2, 300, 1),
+    'GaAs': (1.424, 1e-2, 10, 1.424/2, 10, 0.063, 0.53, 12.9, 300, 1),
+}
+# множители слайдеров interfaceL
+cpp = {'N_d0': 1e12, 'N_as': 1e13, 'E_out': 1e4}
+
+batch_sizes = (1, 100, 10000)
+# имена случаев известны до подготовки данных: --only не строит лишнего
+point_names = ('create_scond', 'fermi_level', 'phi', 'W', 'band_profile', 'calculate_cold', 'calculate_warm', 'calculate_poisson')
+path_names = ('T', 'N_as')
+map_names = ('N_as-E_as', 'N_d0-T')
+plot_names = ('plot/draw', 'plot/update')
+
+
+def corpus(mat, size=50, seed=0):
+    """
+    {size} Params around the preset of {mat}: N_d0, N_as, T and E_out are
+    spread over the slider ranges, the same for every run with the same {seed}.
+    """
+    rng = np.random.default_rng(seed)
+    vals = dict(zip(Params.names, presets[mat]))
+    for name in ('N_d0', 'N_as', 'E_out'):
+        vals[name] *= cpp[name]
+    points = []
+    for _ in range(size):
+        point = dict(vals, mat=mat)
+        point['N_d0'] = vals['N_d0'] * 10**rng.uniform(-0.5, 0.5)
+        point['N_as'] = vals['N_as'] * 10**rng.uniform(0, 1)
+        point['T'] = rng.uniform(250, 400)
+        point['E_out'] = vals['E_out'] * rng.uniform(-1, 1)
+        points.append(calculatingModule.set_material(Params(**point)))
+    return points
+
+
+def batch_columns(size, seed=0):
+    """Columns for calculate_batch with all materials mixed."""
+    points = [p for mat in presets for p in corpus(mat, -(-size // len(presets)), seed)][:size]
+    return {name: np.array([getattr(p, name) for p in points]) for name in Params.names}
+
+
+def clear_caches():
+    calculatingModule.scond_cache.clear()
+    calculatingModule.fermi_cache.clear()
+
+
+def point_cases(mat, size):
+    """Cases over the corpus of one material: name -> (function of one pass, calls per pass)."""
+    points = corpus(mat, size)
+    sconds = [calculatingModule.create_scond(p) for p in points]
+    E_fs = [s.fermi_level(p.T) for s, p in zip(sconds, points)]
+    parms = [p.cgs(E_f) for p, E_f in zip(points, E_fs)]
+    phis = [calculatingModule.phi(parm) for parm in parms]
+    Ws = [float(calculatingModule.W(phi, parm)) for phi, parm in zip(phis, parms)]
+
+    def create_scond():
+        for p in points:
+            calculatingModule.create_scond(p)
+
+    def fermi_level():
+        for s, p in zip(sconds, points):
+            s.fermi_level(p.T)
+
+    def phi():
+        for parm in parms:
+            calculatingModule.phi(parm)
+
+    def W():
+        for phi_s, parm in zip(phis, parms):
+            calculatingModule.W(phi_s, parm)
+
+    def band_profile():
+        for p, phi_s, W_s, E_f in zip(points, phis, Ws, E_fs):
+            calculatingModule.band_profile(phi_s, W_s, p.E_gap, p.E_d, p.E_as, E_f, 31)
+
+    def calculate_cold():
+        clear_caches()
+        for p in points:
+            calculatingModule.calculate(p)
+
+    def calculate_warm():
+        for p in points:
+            calculatingModule.calculate(p)
+
+    def calculate_poisson():
+        for p in points:
+            calculatingModule.calculate(p, engine='poisson')
+
+    n = len(points)
+    cases = dict(create_scond=create_scond, fermi_level=fermi_level, phi=phi, W=W, band_profile=band_profile,
+                 calculate_cold=calculate_cold, calculate_warm=calculate_warm, calculate_poisson=calculate_poisson)
+    return {f'{name}/{mat}': (cases[name], n) for name in point_names}
+
+
+def batch_cases(sizes=batch_sizes):
+    cases = {}
+    for size in sizes:
+        columns = batch_columns(size)
+
+        def batch(columns=columns):
+            clear_caches()
+            calculatingModule.calculate_batch(**columns)
+        cases[f'calculate_batch/{size}'] = (batch, size)
+    return cases
+
+
+def path_cases(mat, size):
+    """Continuation along T and N_as paths of {size} points around the preset of {mat}, per point."""
+    import continuation
+    base = corpus(mat, 1)[0]
+    paths = {'T': np.linspace(250, 400, size), 'N_as': base.N_as * np.logspace(0, 1, size)}
+    cases = {}
+    for name in path_names:
+        values = paths[name]
+        def follow(name=name, values=values):
+            clear_caches()
+            continuation.follow(base, name, values)
+        cases[f'follow_{name}/{mat}'] = (follow, size)
+    return cases
+
+
+def map_cases(n=200):
+    """Phase map of {n} x {n} points over (N_as, E_as) and (N_d0, T) around the Si preset, per point."""
+    import phaseMap
+    base = corpus('Si', 1)[0]
+    axes = {'N_as-E_as': ('N_as', phaseMap.axis('N_as', 1e12, 1e15, n), 'E_as', phaseMap.axis('E_as', 0.1, 1.0, n)),
+            'N_d0-T': ('N_d0', phaseMap.axis('N_d0', 1e12, 1e16, n // 4), 'T', phaseMap.axis('T', 200, 500, n // 4))}
+    cases = {}
+    for name in map_names:
+        x_name, x, y_name, y = axes[name]
+        def phase_map(x_name=x_name, x=x, y_name=y_name, y=y):
+            clear_caches()
+            phaseMap.compute_map(base, x_name, x, y_name, y)
+        cases[f'map/{name}'] = (phase_map, x.size*y.size)
+    return cases
+
+
+def plot_cases(size):
+    """Drawing of the band plot on a headless Agg canvas: full redraw and blitted update."""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from plotModel import BandPlot
+
+    results = [calculatingModule.calculate(p) for mat in presets for p in corpus(mat, max(1, size // len(presets)))]
+    results = [r for r in results if r.ok]
+    fig = Figure(figsize=(8, 6), dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    plot = BandPlot(fig.add_subplot(), canvas)
+    plot.update(results[0])
+
+    def draw():
+        for r in results:
+            plot.update(r)
+            canvas.draw()
+
+    def update():
+        for r in results:
+            plot.update(r)
+
+    return dict(zip(plot_names, ((draw, len(results)), (update, len(results)))))
+
+
+def run_case(case, calls, repeat):
+    """Time {repeat} passes of {case}; returns seconds per call (median and min over passes)."""
+    case()  # прогрев: импорты, кэши numpy
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case()
+        times.append((time.perf_counter() - start) / calls)
+    return dict(median=float(np.median(times)), min=float(np.min(times)), calls=calls, repeat=repeat)
+
+
+def groups(size, plot=True):
+    """Groups of cases: list of (case names, function that prepares them and returns their dict)."""
+    result = []
+    for mat in presets:
+        result.append(([f'{name}/{mat}' for name in point_names], lambda mat=mat: point_cases(mat, size)))
+        result.append(([f'follow_{name}/{mat}' for name in path_names], lambda mat=mat: path_cases(mat, size)))
+    result.append(([f'calculate_batch/{n}' for n in batch_sizes], batch_cases))
+    result.append(([f'map/{name}' for name in map_names], map_cases))
+    if plot:
+        result.append((list(plot_names), lambda: plot_cases(size)))
+    return result
+
+
+def run(size=50, repeat=5, only=None, plot=True, progress=None):
+    """
+    Run all cases (names containing {only}, if given); only the groups
+    with a selected case are prepared.
+    Returns dict: meta and results {case name: timing}.
+    """
+    results = {}
+    for names, prepare in groups(size, plot):
+        selected = [name for name in names if not only or only in name]
+        if not selected:
+            continue
+        cases = prepare()
+        for name in selected:
+            case, calls = cases[name]
+            results[name] = run_case(case, calls, repeat)
+            if progress is not None:
+                progress(name, results[name])
+
+    meta = dict(python=platform.python_version(), numpy=np.__version__, machine=platform.machine(),
+                platform=platform.platform(), size=size, repeat=repeat, time=time.strftime('%Y-%m-%d %H:%M:%S'))
+    return dict(meta=meta, results=results)
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Cases slower than in {baseline} by more than {threshold} (relative, medians).
+    Returns list of (name, baseline seconds, current seconds).
+    """
+    regressions = []
+    for name, timing in results['results'].items():
+        old = baseline['results'].get(name)
+        if old is not None and timing['median'] > old['median'] * (1 + threshold):
+            regressions.append((name, old['median'], timing['median']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', help='save results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown, default 0.2')
+    parser.add_argument('--size', type=int, default=50, help='points per material, default 50')
+    parser.add_argument('--repeat', type=int, default=5, help='timed passes per case, default 5')
+    parser.add_argument('--only', help='run only cases whose name contains this text')
+    parser.add_argument('--no-plot', action='store_true', help='skip matplotlib cases')
+    args = parser.parse_args(argv)
+
+    def progress(name, timing):
+        print(f'{name:32s} {timing["median"]*1e6:12.1f} us/call  (min {timing["min"]*1e6:.1f})', file=sys.stderr)
+
+    results = run(args.size, args.repeat, args.only, not args.no_plot, progress)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new in regressions:
+            print(f'REGRESSION {name}: {old*1e6:.1f} -> {new*1e6:.1f} us/call ({new/old - 1:+.0%})', file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'no regressions above {args.threshold:.0%}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
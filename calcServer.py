@@ -0,0 +1,410 @@
+"""
+Local HTTP/JSON service around the calculation core, for tools that want phi and W on demand:
+
+    python -m calcServer --port 8765                 # 127.0.0.1 only, no network access needed
+    curl -d '{"mat": "Si", "N_d0": 1e16, "E_as": 0.5, "N_as": 1e12, "E_gap": 1.12, "E_d": 0.05}' localhost:8765/calculate
+
+    POST /calculate  one point: Params fields (m_e, m_h, epsilon, T, E_out, mat
+                     have the defaults of Params), optional "engine" and "accuracy"
+    POST /batch      {"points": [...], "engine": ..., "accuracy": ...} or a list of points
+    GET  /metrics    counters, batch sizes, latency percentiles and throughput
+    GET  /health
+
+Concurrent requests are collected for {window} ms (or until {max_batch}
+points) into one vectorized calculatingModule.calculate_batch call, run in a
+worker thread while the next batch is being collected. A point that is
+already queued or being calculated is not calculated again, and results
+are kept in an LRU cache (and in diskCache with --cache). Standard library
+only: asyncio streams with a minimal HTTP/1.1 parser (keep-alive,
+Content-Length bodies).
+"""
+import argparse
+import asyncio
+import collections
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+import calculatingModule
+import lruCache
+from calcTypes import Params
+
+# самый большой принимаемый запрос
+max_body = 16*2**20
+# сколько последних задержек хранится для перцентилей
+latency_window = 10000
+# за сколько секунд считается пропускная способность
+throughput_window = 10.0
+
+reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+# колонки calculate_batch, из которых строится ответ
+row_columns = ('phi', 'W', 'E_f', 'status', 'errors', 'iterations', 'residual')
+
+
+class RequestError(Exception):
+    """Bad request from a client, answered with {status} and the text of the error."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_point(data, engine='depletion', accuracy='exact'):
+    """(Params, engine, accuracy) of one point of a request; raises RequestError."""
+    if not isinstance(data, dict):
+        raise RequestError('a point must be a JSON object')
+    data = dict(data)
+    engine, accuracy = data.pop('engine', engine), data.pop('accuracy', accuracy)
+    if engine not in calculatingModule.engines:
+        raise RequestError(f'unknown engine: {engine}')
+    if accuracy not in ('exact', 'fast'):
+        raise RequestError(f'unknown accuracy: {accuracy}')
+    if data.get('mat', 'custom') not in calculatingModule.material_names + ('custom',):
+        raise RequestError(f'unknown material: {data["mat"]}')
+    try:
+        params = Params(**data)
+    except (TypeError, ValueError) as error:
+        raise RequestError(f'bad parameters: {error}')
+    return params, engine, accuracy
+
+
+def _number(value):
+    # в JSON нет NaN
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def make_result(row, engine='depletion'):
+    """
+    JSON object of one point: the columns of calculate_batch in {row} and
+    the message of calculate() (calculatingModule.batch_message).
+    """
+    status, errors = int(row['status']), int(row['errors'])
+    message = calculatingModule.batch_message(status, errors, row['E_f'], row['iterations'], row['residual'], engine)
+    return dict(phi=_number(row['phi']), W=_number(row['W']), E_f=_number(row['E_f']), status=status, errors=errors,
+                message=message)
+
+
+class Metrics:
+    """Counters of the server and latencies of the last latency_window requests."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.points = 0
+        self.failed = 0
+        self.batches = 0
+        self.calculated = 0
+        self.deduplicated = 0
+        self.cache_hits = 0
+        self.batch_seconds = 0.0
+        self.largest_batch = 0
+        self.latencies = collections.deque(maxlen=latency_window)
+        self.finished = collections.deque()
+
+    def request(self, seconds, points=1, failed=False):
+        now = time.monotonic()
+        self.requests += 1
+        self.points += points
+        self.failed += failed
+        self.latencies.append(seconds)
+        self.finished.append((now, points))
+        while self.finished and self.finished[0][0] < now - throughput_window:
+            self.finished.popleft()
+
+    def batch(self, points, seconds):
+        self.batches += 1
+        self.calculated += points
+        self.batch_seconds += seconds
+        self.largest_batch = max(self.largest_batch, points)
+
+    def as_dict(self, cache=None):
+        now = time.monotonic()
+        recent = [(t, points) for t, points in self.finished if t >= now - throughput_window]
+        span = min(throughput_window, time.time() - self.started) or 1.0
+        latency = {}
+        if self.latencies:
+            values = np.array(self.latencies) * 1e3
+            latency = dict(zip(('p50', 'p90', 'p99', 'max'), np.percentile(values, (50, 90, 99, 100)).round(3).tolist()),
+                           mean=round(float(values.mean()), 3))
+        metrics = dict(uptime=round(time.time() - self.started, 3), requests=self.requests, points=self.points,
+                       failed=self.failed, batches=self.batches, calculated=self.calculated,
+                       deduplicated=self.deduplicated, cache_hits=self.cache_hits,
+                       mean_batch=round(self.calculated / self.batches, 2) if self.batches else 0.0,
+                       largest_batch=self.largest_batch,
+                       batch_ms=round(self.batch_seconds / self.batches * 1e3, 3) if self.batches else 0.0,
+                       latency_ms=latency,
+                       requests_per_second=round(len(recent) / span, 1),
+                       points_per_second=round(sum(points for _, points in recent) / span, 1))
+        if cache is not None:
+            metrics['cache'] = cache
+        return metrics
+
+
+class Batcher:
+    """
+    Collects points of concurrent requests into batches for calculate_batch.
+
+    {window} - how long to wait for more points after the first one [s],
+    {max_batch} - batch size that is sent at once, {cache_size} - results in
+    the LRU cache, {disk_cache} - diskCache.DiskCache or None.
+    """
+
+    def __init__(self, window=0.002, max_batch=4096, cache_size=100000, disk_cache=None, metrics=None):
+        self.window = window
+        self.max_batch = max_batch
+        self.cache = lruCache.LRUCache(maxsize=cache_size)
+        self.disk_cache = disk_cache
+        self.metrics = Metrics() if metrics is None else metrics
+        self._queue = asyncio.Queue()
+        self._task = None
+        # точки, которые ждут в очереди или считаются: key -> future
+        self._pending = {}
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def calculate(self, params, engine='depletion', accuracy='exact'):
+        """Result of one point (dict of make_result), from the cache or the next batch."""
+        key = (engine, accuracy) + params.key()
+        result = self.cache.peek(key)
+        if result is not None:
+            self.metrics.cache_hits += 1
+            return result
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((key, params))
+        else:
+            self.metrics.deduplicated += 1
+        # shield: отмена одного запроса не отменяет результат для остальных
+        return await asyncio.shield(future)
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # пока считается этот пакет, в очереди собирается следующий
+            await self._process(batch)
+
+    async def _process(self, batch):
+        # одинаковые точки попадают в очередь один раз, см. calculate
+        unique = dict(batch)
+        started = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, self._calculate, unique)
+        except Exception as error:
+            results = dict.fromkeys(unique, error)
+        else:
+            self.metrics.batch(len(unique), time.perf_counter() - started)
+        for key, result in results.items():
+            future = self._pending.pop(key)
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                self.cache.put(key, result)
+                future.set_result(result)
+
+    def _calculate(self, unique):
+        # в рабочем потоке: отдельный вызов calculate_batch на каждую пару (engine, accuracy);
+        # исключение получают только запросы своей группы или своей строки
+        groups = collections.defaultdict(list)
+        for key in unique:
+            groups[key[:2]].append(key)
+        results = {}
+        for (engine, accuracy), keys in groups.items():
+            columns = {name: np.array([getattr(unique[key], name) for key in keys]) for name in Params.names}
+            try:
+                if self.disk_cache is not None:
+                    table = self.disk_cache.calculate_batch(**columns, engine=engine, accuracy=accuracy)
+                else:
+                    table = calculatingModule.calculate_batch(**columns, engine=engine, accuracy=accuracy)
+            except Exception as error:
+                results.update(dict.fromkeys(keys, error))
+                continue
+            for i, key in enumerate(keys):
+                try:
+                    results[key] = make_result({name: table[name][i] for name in row_columns}, engine)
+                except Exception as error:
+                    results[key] = error
+        return results
+
+
+class Server:
+    """The HTTP server: {batcher} calculates, the handlers only parse and answer."""
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.metrics = batcher.metrics
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                status, answer = await self._dispatch(method, path, body)
+                self._write(writer, status, answer, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except RequestError as error:
+            # запрос не разобран: отвечаем и закрываем соединение
+            self._write(writer, error.status, dict(error=str(error)), False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, path, version = line.decode('latin-1').split()
+        except ValueError:
+            raise RequestError('bad request line')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise RequestError('bad Content-Length')
+        if length < 0:
+            raise RequestError('bad Content-Length')
+        if length > max_body:
+            raise RequestError('request body is too large', 413)
+        body = await reader.readexactly(length) if length else b''
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method, path.split('?')[0], body, keep_alive
+
+    def _write(self, writer, status, answer, keep_alive):
+        body = json.dumps(answer, separators=(',', ':'), ensure_ascii=False).encode()
+        head = (f'HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: application/json; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode('latin-1') + body)
+
+    async def _dispatch(self, method, path, body):
+        routes = {'/calculate': ('POST', self.calculate), '/batch': ('POST', self.batch),
+                  '/metrics': ('GET', self.get_metrics), '/health': ('GET', self.health)}
+        if path not in routes:
+            return 404, dict(error=f'unknown path: {path}')
+        allowed, handler = routes[path]
+        if method != allowed:
+            return 405, dict(error=f'{path} accepts {allowed}')
+        started = time.perf_counter()
+        points = 0
+        try:
+            data = json.loads(body) if body else None
+            points, answer = await handler(data)
+            status = 200
+        except (RequestError, json.JSONDecodeError, UnicodeDecodeError) as error:
+            status, answer = getattr(error, 'status', 400), dict(error=str(error))
+        except Exception as error:
+            status, answer = 500, dict(error=f'{type(error).__name__}: {error}')
+        if allowed == 'POST':
+            self.metrics.request(time.perf_counter() - started, points, status != 200)
+        return status, answer
+
+    async def calculate(self, data):
+        params, engine, accuracy = parse_point(data)
+        return 1, await self.batcher.calculate(params, engine, accuracy)
+
+    async def batch(self, data):
+        if isinstance(data, dict):
+            engine, accuracy = data.get('engine', 'depletion'), data.get('accuracy', 'exact')
+            data = data.get('points')
+        else:
+            engine, accuracy = 'depletion', 'exact'
+        if not isinstance(data, list):
+            raise RequestError('points must be a JSON list')
+        points = [parse_point(point, engine, accuracy) for point in data]
+        results = await asyncio.gather(*(self.batcher.calculate(*point) for point in points))
+        return len(points), dict(results=list(results))
+
+    async def get_metrics(self, data):
+        cache = dict(memory=self.batcher.cache.info())
+        if self.batcher.disk_cache is not None:
+            cache['disk'] = self.batcher.disk_cache.info()
+        return 0, self.metrics.as_dict(cache)
+
+    async def health(self, data):
+        return 0, dict(status='ok')
+
+
+async def serve(host='127.0.0.1', port=8765, window=0.002, max_batch=4096, cache_size=100000, disk_cache=None, ready=None):
+    """Run the server until cancelled; {ready}(port) is called once it listens (port 0 - any free one)."""
+    batcher = Batcher(window, max_batch, cache_size, disk_cache)
+    batcher.start()
+    server = Server(batcher)
+    listener = await asyncio.start_server(server.handle, host, port)
+    if ready is not None:
+        ready(listener.sockets[0].getsockname()[1])
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m calcServer', description='Local HTTP/JSON calculation service.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (localhost by default)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--window', type=float, default=2.0, help='batching window [ms]')
+    parser.add_argument('--max-batch', type=int, default=4096, help='points in a batch that is sent without waiting')
+    parser.add_argument('--cache-size', type=int, default=100000, help='results kept in memory')
+    parser.add_argument('--cache', nargs='?', const='', metavar='PATH',
+                        help='also keep results in a persistent cache (diskCache, default path without PATH)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    disk_cache = None
+    if args.cache is not None:
+        import diskCache
+        disk_cache = diskCache.DiskCache(args.cache or None)
+    # fompy загружаем до первого запроса, чтобы он не ждал импорта
+    calculatingModule.preload()
+    ready = lambda port: print(f'Listening on http://{args.host}:{port}', file=sys.stderr, flush=True)
+    try:
+        asyncio.run(serve(args.host, args.port, args.window / 1e3, args.max_batch, args.cache_size, disk_cache, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+from fompy import constants
+
+import calculatingModule
+import rootSolver
+from calcTypes import Params, Results
+
+_missing = object()
+
+
+def _same(a, b):
+    if a is b:
+        return True
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        # массивы и прочее, что нельзя сравнить одним bool, считаем изменившимся
+        return False
+
+
+class Session:
+    """
+    Calculator that keeps intermediate results between calls and recomputes
+    only the stages whose inputs changed.
+
+    Stages and what they depend on (after set_material):
+        scond   - mat, m_e, m_h, E_gap, epsilon, N_d0, E_d
+        Nc      - scond, T
+        check   - Nc, E_as, E_gap, E_out, N_as, N_d0, epsilon, T
+        E_f     - scond, T
+        phi     - E_f, E_gap, E_as, E_out, N_d0, N_as, T, epsilon
+        W       - phi, epsilon, N_d0
+        profile - phi, W, E_f, E_gap, E_d, E_as, n_points, spacing
+    For engine='poisson' the stage 'poisson' depends on all parameters.
+    A stage whose new value equals the old one does not invalidate the
+    stages after it (e.g. E_d of 'custom' does not change E_f).
+    The phi and Fermi level solvers start from the previous solution.
+
+    {n_points}, {spacing}, {engine} - as in calculatingModule.calculate.
+    Not thread-safe: use one session per thread.
+    """
+
+    def __init__(self, n_points=31, spacing='uniform', engine='depletion'):
+        if engine not in calculatingModule.engines:
+            raise ValueError(f'Unknown engine: {engine}')
+        self.n_points = n_points
+        self.spacing = spacing
+        self.engine = engine
+        self.params = None
+        # stage -> значение, ключ входов, с которым оно посчитано, и версия
+        self._values = {}
+        self._keys = {}
+        self._versions = {}
+        self.recomputed = ()
+        self._diag = None
+
+    def clear(self):
+        self._values.clear()
+        self._keys.clear()
+        self._versions.clear()
+
+    def update(self, diagnostics=False, **changes):
+        """calculate() for the previous parameters with {changes}, e.g. update(E_out=2e5)."""
+        if self.params is None:
+            raise ValueError('No previous parameters, call calculate() first')
+        return self.calculate(self.params.replace(**changes), diagnostics)
+
+    def calculate(self, params, diagnostics=False):
+        """
+        Same as calculatingModule.calculate({params}), but reuses the stages
+        that do not depend on the changed parameters. The names of the
+        recomputed stages are left in {recomputed}.
+        """
+        if isinstance(params, dict):
+            params = Params.from_dict(params)
+        self.params = params
+        self._recomputed = []
+        if diagnostics:
+            import diagnostics as diagnostics_module
+            self._diag = diagnostics_module.Diagnostics(self.engine)
+        try:
+            results = self._calculate(params)
+        finally:
+            self.recomputed = tuple(self._recomputed)
+        if diagnostics:
+            results.diagnostics, self._diag = self._diag, None
+            diagnostics_module.stats.add(results.diagnostics, results.ok)
+        return results
+
+    def _stage(self, name, key, compute):
+        """Value of stage {name}: the stored one if {key} did not change, else compute()."""
+        hit = self._keys.get(name, _missing) == key
+        if not hit:
+            value = compute()
+            if name not in self._values or not _same(self._values[name], value):
+                self._versions[name] = self._versions.get(name, 0) + 1
+            self._values[name] = value
+            self._keys[name] = key
+            self._recomputed.append(name)
+        if self._diag is not None:
+            self._diag.lap(name)
+            self._diag.cache[name] = hit
+        return self._values[name]
+
+    def _version(self, name):
+        return self._versions.get(name, 0)
+
+    def _calculate(self, params):
+        p = self._stage('material', params, lambda: calculatingModule.set_material(params))
+        scond = self._stage('scond', p.scond_key(), lambda: calculatingModule.get_scond(p))
+        T = p.T
+        Nc, Nv = self._stage('Nc', (self._version('scond'), T), lambda: calculatingModule.state_densities(scond, T))
+        # все поля, которые читает validation.check
+        message = self._stage('check', (self._version('Nc'), p.E_as, p.E_gap, p.E_out, p.N_as, p.N_d0, p.epsilon, T),
+                              lambda: calculatingModule.checkparms(p, Nc, Nv))
+        if message != 'ok':
+            return Results(message)
+
+        if self.engine == 'poisson':
+            return self._stage('poisson', (p, self.n_points, self.spacing),
+                               lambda: calculatingModule.calculate_poisson(p, self.n_points, self.spacing))
+
+        try:
+            E_f = self._stage('E_f', (self._version('scond'), T),
+                              lambda: calculatingModule.get_fermi_level(p, self._values.get('E_f')))
+        except ValueError:
+            return Results('Ошибка! Не удалось найти уровень Ферми из условия электронейтральности')
+
+        parms = p.cgs(E_f)
+        try:
+            phi_s = self._stage('phi', (self._version('E_f'), p.E_gap, p.E_as, p.E_out, p.N_d0, p.N_as, T, p.epsilon),
+                                lambda: self._phi(parms))
+        except rootSolver.SolverError as error:
+            return Results('Ошибка! Уравнение на изгиб зон не решено (' + str(error) + ')')
+        W_s = self._stage('W', (self._version('phi'), p.epsilon, p.N_d0),
+                          lambda: float(calculatingModule.W(phi_s, parms)))
+        E_f = E_f / constants.eV
+
+        profile = self._stage('profile', (self._version('phi'), self._version('W'), self._version('E_f'),
+                                          p.E_gap, p.E_d, p.E_as, self.n_points, self.spacing),
+                              lambda: calculatingModule.band_profile(phi_s, W_s, p.E_gap, p.E_d, p.E_as, E_f,
+                                                                     self.n_points, self.spacing))
+        return Results('ok', phi_s, W_s, E_f, profile)
+
+    def _phi(self, parms):
+        # старый корень - хорошее начальное приближение: после сдвига слайдера
+        # Ньютону хватает 2-3 итераций вместо ~10
+        solution = calculatingModule.phi_solution(parms, x0=self._values.get('phi'))
+        if self._diag is not None:
+            self._diag.iterations, self._diag.residual = int(solution.iterations), float(solution.residual)
+        return float(solution.root)
@@ -0,0 +1,169 @@
+from collections import namedtuple
+
+import numpy as np
+from fompy import constants
+
+# перевод внешнего поля из В/м в СГС
+E_out_to_cgs = 3.3*1e-5
+
+
+class Params:
+    """
+    Immutable set of input parameters for calculate().
+
+    Values are kept in the units of the interface:
+    E_gap, E_d, E_as [eV] (E_d is counted from the conduction band, E_as from the valence band),
+    N_d0 [cm^(-3)], N_as [cm^(-2)], m_e, m_h [m_0], T [K], E_out [V/m].
+    The cgs values are available as E_gap_erg, E_d_erg, E_as_erg and E_out_cgs.
+
+    The hash is computed once, so Params can be used as a cache key
+    and sent to worker processes as is.
+    """
+
+    names = ('E_gap', 'E_d', 'N_d0', 'E_as', 'N_as', 'm_e', 'm_h', 'epsilon', 'T', 'E_out', 'mat')
+    __slots__ = names + ('_hash',)
+
+    def __init__(self, E_gap, E_d, N_d0, E_as, N_as, m_e=0.5, m_h=0.5, epsilon=10.0, T=300.0, E_out=0.0, mat='custom'):
+        values = (E_gap, E_d, N_d0, E_as, N_as, m_e, m_h, epsilon, T, E_out)
+        for name, value in zip(self.names, values):
+            object.__setattr__(self, name, float(value))
+        object.__setattr__(self, 'mat', str(mat))
+        object.__setattr__(self, '_hash', hash(self.key()))
+
+    @classmethod
+    def from_dict(cls, parms):
+        return cls(**{name: parms[name] for name in cls.names})
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.names}
+
+    def key(self):
+        return tuple(getattr(self, name) for name in self.names)
+
+    def scond_key(self):
+        """The values the bulk semiconductor depends on: (mat, m_e, m_h, E_gap, epsilon, N_d0, E_d)."""
+        return (self.mat, self.m_e, self.m_h, self.E_gap, self.epsilon, self.N_d0, self.E_d)
+
+    def replace(self, **changes):
+        values = self.as_dict()
+        values.update(changes)
+        return Params(**values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Params is immutable, use replace()')
+
+    def __delattr__(self, name):
+        raise AttributeError('Params is immutable')
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return isinstance(other, Params) and self.key() == other.key()
+
+    def __reduce__(self):
+        return (Params, self.key())
+
+    def __repr__(self):
+        return 'Params(' + ', '.join(f'{name}={getattr(self, name)!r}' for name in self.names) + ')'
+
+    @property
+    def E_gap_erg(self):
+        return self.E_gap * constants.eV
+
+    @property
+    def E_d_erg(self):
+        return self.E_d * constants.eV
+
+    @property
+    def E_as_erg(self):
+        return self.E_as * constants.eV
+
+    @property
+    def E_out_cgs(self):
+        return self.E_out * E_out_to_cgs
+
+    def cgs(self, E_f):
+        """
+        Parameters of the charge balance f_left = f_right in cgs units.
+        {E_f} - bulk Fermi level [erg].
+        """
+        return dict(E_gap=self.E_gap_erg, E_as=self.E_as_erg, E_out=self.E_out_cgs, N_d0=self.N_d0,
+                    N_as=self.N_as, T=self.T, epsilon=self.epsilon, E_f=E_f)
+
+
+class BandProfile(namedtuple('BandProfile', ['x', 'E_v', 'E_c', 'E_d', 'E_f', 'E_as'])):
+    """
+    Band diagram near the surface.
+
+    {x} [cm] and the bands {E_v}, {E_c}, {E_d} [eV] are arrays of the same shape;
+    the constant levels {E_f} and {E_as} [eV] are scalars (or one value per row in a batch).
+    """
+
+    __slots__ = ()
+
+    def as_structured(self):
+        """Structured array with fields x, E_v, E_c, E_d, e.g. for numpy.save."""
+        table = np.empty(np.shape(self.x), dtype=[(name, 'f8') for name in ('x', 'E_v', 'E_c', 'E_d')])
+        for name in table.dtype.names:
+            table[name] = getattr(self, name)
+        return table
+
+
+class Results:
+    """
+    Results of calculate().
+
+    {message} - 'ok' or the error text
+    {phi} - band bending [eV], {W} - space charge region width [cm], {E_f} - bulk Fermi level [eV]
+    {profile} - BandProfile or None if the calculation failed;
+    x_s, E_v_s, E_c_s, E_d_s, E_f_s, E_as_s give its levels as arrays over x
+    {diagnostics} - diagnostics.Diagnostics if calculate() was asked for it, else None
+    """
+
+    __slots__ = ('message', 'phi', 'W', 'E_f', 'profile', 'diagnostics')
+
+    def __init__(self, message, phi=0.0, W=0.0, E_f=0.0, profile=None, diagnostics=None):
+        self.message = message
+        self.phi = phi
+        self.W = W
+        self.E_f = E_f
+        self.profile = profile
+        self.diagnostics = diagnostics
+
+    @property
+    def ok(self):
+        return self.message == 'ok'
+
+    def _level(self, name):
+        if self.profile is None:
+            return np.empty(0)
+        # постоянные уровни не копируем, а растягиваем на все x
+        return np.broadcast_to(getattr(self.profile, name), np.shape(self.profile.x))
+
+    @property
+    def x_s(self):
+        return self._level('x')
+
+    @property
+    def E_f_s(self):
+        return self._level('E_f')
+
+    @property
+    def E_v_s(self):
+        return self._level('E_v')
+
+    @property
+    def E_c_s(self):
+        return self._level('E_c')
+
+    @property
+    def E_d_s(self):
+        return self._level('E_d')
+
+    @property
+    def E_as_s(self):
+        return self._level('E_as')
+
+    def __repr__(self):
+        return f'Results(message={self.message!r}, phi={self.phi!r}, W={self.W!r}, E_f={self.E_f!r})'
@@ -0,0 +1,130 @@
+import threading
+
+import lruCache
+
+
+class CalcWorker:
+    """
+    Run calculations in a background thread, so the window never waits for a solve.
+
+    Only the latest request matters: if several requests arrive while a
+    calculation is running, the older ones are dropped, and a result that
+    was already superseded by a newer request is not sent.
+
+    {window} - interface window; results come back as event {event_key}
+    through window.write_event_value with value (request_id, params, results)
+    {compute} - function params -> results; an exception raised by it is sent instead of results
+    {cache_size} - how many results to keep; with a cache the worker spends
+    idle time on the neighbours passed to submit, so a request for one of them
+    is answered at once. 0 - no cache and no prefetch.
+    {prefetch} - function params -> results for the neighbours, {compute} by default
+    """
+
+    def __init__(self, window, compute, event_key='-RESULT-', cache_size=0, prefetch=None):
+        self.window = window
+        self.compute = compute
+        self.prefetch = compute if prefetch is None else prefetch
+        self.event_key = event_key
+        self.cache = lruCache.LRUCache(maxsize=cache_size) if cache_size > 0 else None
+        self._condition = threading.Condition()
+        self._pending = None
+        self._prefetch = []
+        self._last_id = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, params, neighbours=()):
+        """
+        Queue {params} instead of any request not started yet, returns request id.
+
+        A cached result is sent right away. {neighbours} - params that are
+        likely to be requested next (most likely first); they replace the
+        previous ones and are computed into the cache while no request waits.
+        """
+        results = None if self.cache is None else self.cache.peek(params)
+        with self._condition:
+            self._last_id += 1
+            request_id = self._last_id
+            self._pending = None if results is not None else (request_id, params)
+            if results is not None:
+                # отправляем до того, как поток возьмется за соседей
+                self.window.write_event_value(self.event_key, (request_id, params, results))
+            if self.cache is not None:
+                self._prefetch = [p for p in neighbours if p not in self.cache]
+            self._condition.notify()
+        return request_id
+
+    def is_latest(self, request_id):
+        return request_id == self._last_id
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout=1)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._prefetch and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                if self._pending is not None:
+                    request_id, params = self._pending
+                    self._pending = None
+                else:
+                    # запросов нет: считаем заранее соседние положения слайдеров
+                    request_id, params = None, self._prefetch.pop(0)
+
+            if request_id is None:
+                if params not in self.cache:
+                    try:
+                        self.cache.put(params, self.prefetch(params))
+                    except Exception:
+                        # упреждающий расчет не обязателен, при настоящем запросе ошибка придет окну
+                        pass
+                continue
+
+            try:
+                results = self.compute(params)
+                if self.cache is not None:
+                    self.cache.put(params, results)
+            except Exception as error:
+                # поток не должен умирать: ошибку отдаем окну как результат
+                results = error
+
+            if self.is_latest(request_id) and not self._stopped:
+                self.window.write_event_value(self.event_key, (request_id, params, results))
+
+
+class StreamWorker(CalcWorker):
+    """
+    CalcWorker for calculations that give a sequence of results, e.g. a map
+    refined level by level: {compute}(params) returns an iterable, and every
+    item is sent as event {event_key} with value (request_id, params, item).
+    A newer request stops the iteration of the older one after its current item.
+    """
+
+    def __init__(self, window, compute, event_key='-STREAM-'):
+        super().__init__(window, compute, event_key)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                request_id, params = self._pending
+                self._pending = None
+
+            try:
+                for item in self.compute(params):
+                    if not self.is_latest(request_id) or self._stopped:
+                        break
+                    self.window.write_event_value(self.event_key, (request_id, params, item))
+            except Exception as error:
+                if self.is_latest(request_id) and not self._stopped:
+                    self.window.write_event_value(self.event_key, (request_id, params, error))
@@ -0,0 +1,181 @@
+"""
+Command-line entry point without the interface:
+
+    python -m calculatingCli --mat Si --N_d0 1e13              # one point, CSV to stdout
+    python -m calculatingCli -i points.csv -o results.npy      # batch
+
+Never imports Tk or matplotlib; fompy and scipy are loaded only when the
+calculation starts.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+_start = time.perf_counter()
+
+import numpy as np
+
+import calculatingModule
+from calcTypes import Params
+
+# значения по умолчанию как у слайдеров interfaceL
+defaults = dict(E_gap=5.0, E_d=0.5, N_d0=50e12, E_as=2.5, N_as=50e13, m_e=0.5, m_h=0.5,
+                epsilon=12.5, T=300.0, E_out=20e4, mat='custom')
+# колонки результата; профиль зон сохраняется в profile_x, profile_E_v, ...
+result_columns = ('phi', 'W', 'E_f', 'status', 'errors')
+profile_columns = ('x', 'E_v', 'E_c', 'E_d')
+
+epilog = '''
+Input files: CSV with a header or JSON (a list of objects or an object of lists);
+columns are named as the options above, missing columns take the option values.
+Output: CSV (default, to stdout) or NPY structured array, chosen by the extension.
+Status: 0 - ok, 1 - invalid parameters, 2 - not solved.
+Errors: sum of the violated conditions of an invalid row: 1 - non-positive T, E_gap,
+N_d0, epsilon or negative N_as, 2 - E_as outside the gap, 4 - E_out above the field
+of the acceptors, 8 - N_d0 above Nc, 16 - N_d0 above Nv.
+'''
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m calculatingCli', epilog=epilog,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     description='Band bending at the surface of a semiconductor.')
+    parser.add_argument('-i', '--input', help='CSV or JSON file with parameter columns')
+    parser.add_argument('-o', '--output', help='CSV or NPY file for the results (CSV to stdout by default)')
+    parser.add_argument('--engine', choices=calculatingModule.engines, default='depletion')
+    parser.add_argument('--accuracy', choices=('exact', 'fast'), default='exact',
+                        help='Fermi-Dirac integral of the bulk Fermi level: exact (as fompy) or fast (error < 0.004 kT)')
+    parser.add_argument('--sensitivities', action='store_true',
+                        help='add derivatives of phi, W and E_f by every parameter (columns dphi_dN_as, ...)')
+    parser.add_argument('--cache', nargs='?', const='', metavar='PATH',
+                        help='keep results in a persistent cache (diskCache, default path without PATH)')
+    parser.add_argument('--profile-points', type=int, default=0,
+                        help='save the band profile with this many points (NPY output only)')
+    parser.add_argument('--timing', action='store_true', help='print import and calculation time to stderr')
+    units = dict(E_gap='eV', E_d='eV, from the conduction band', N_d0='cm^-3', E_as='eV, from the valence band',
+                 N_as='cm^-2', m_e='m_0', m_h='m_0', T='K', E_out='V/m')
+    for name in Params.names:
+        if name == 'mat':
+            parser.add_argument('--mat', choices=calculatingModule.material_names + ('custom',), default=defaults['mat'])
+        else:
+            unit = f' [{units[name]}]' if name in units else ''
+            parser.add_argument('--' + name, type=float, default=defaults[name],
+                                help=f'default {defaults[name]:g}' + unit)
+    args = parser.parse_args(argv)
+    if args.sensitivities and args.engine != 'depletion':
+        parser.error('--sensitivities needs the depletion engine')
+    if args.sensitivities and args.cache is not None:
+        parser.error('sensitivities are not cached, use --sensitivities without --cache')
+    if args.profile_points > 0 and not (args.output or '').endswith('.npy'):
+        parser.error('--profile-points needs an .npy output file')
+    return args
+
+
+def read_columns(path):
+    """Parameter columns from a CSV or JSON file: dict name -> list of values."""
+    if path.endswith('.json'):
+        with open(path) as file:
+            data = json.load(file)
+        if isinstance(data, list):
+            return {name: [row[name] for row in data] for name in (data[0] if data else {})}
+        return data
+
+    with open(path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    return {name: [row[name] for row in rows] for name in (rows[0] if rows else {})}
+
+
+def get_columns(args):
+    """Columns for calculate_batch: from the input file, the missing ones from the options."""
+    columns = read_columns(args.input) if args.input else {}
+    unknown = set(columns) - set(Params.names)
+    if unknown:
+        raise ValueError('Unknown columns: ' + ', '.join(sorted(unknown)))
+    n = len(next(iter(columns.values()))) if columns else 1
+    # пустой файл - ошибка, а не одна точка из значений по умолчанию
+    if args.input and (not columns or n == 0):
+        raise ValueError('empty input')
+    table = {}
+    for name in Params.names:
+        values = columns.get(name, [getattr(args, name)]*n)
+        table[name] = np.asarray(values, dtype=str if name == 'mat' else float)
+    return table
+
+
+def make_table(columns, results, profile_points=0):
+    """Structured array with the parameters and results of every row (and derivatives, if calculated)."""
+    n = len(columns['E_gap'])
+    # производные: колонки d<величина>_d<параметр>
+    derivatives = {f'{key}_d{name}': values for key in ('dphi', 'dW', 'dE_f') if key in results
+                   for name, values in results[key].items()}
+    fields = [(name, 'U16' if name == 'mat' else 'f8') for name in Params.names]
+    fields += [(name, {'status': 'i1', 'errors': 'u1'}.get(name, 'f8')) for name in result_columns]
+    fields += [(name, 'f8') for name in derivatives]
+    fields += [('profile_' + name, 'f8', (profile_points,)) for name in profile_columns if profile_points > 0]
+    table = np.empty(n, dtype=fields)
+    for name in Params.names:
+        table[name] = columns[name]
+    for name in result_columns:
+        table[name] = results[name]
+    for name, values in derivatives.items():
+        table[name] = values
+    if profile_points > 0:
+        for name in profile_columns:
+            table['profile_' + name] = getattr(results['profile'], name)
+    return table
+
+
+def write_table(table, path=None):
+    if path is not None and path.endswith('.npy'):
+        np.save(path, table)
+        return
+    file = open(path, 'w', newline='') if path else sys.stdout
+    try:
+        writer = csv.writer(file)
+        writer.writerow(table.dtype.names)
+        for row in table.tolist():
+            writer.writerow([f'{value:.10g}' if isinstance(value, float) else value for value in row])
+    finally:
+        if path:
+            file.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        columns = get_columns(args)
+    except (OSError, ValueError, KeyError) as error:
+        print('Error reading input:', error, file=sys.stderr)
+        return 2
+
+    started = time.perf_counter()
+    if args.cache is None:
+        # с кэшем fompy может и не понадобиться: он загрузится при первом промахе
+        calculatingModule.preload(args.engine)
+    loaded = time.perf_counter()
+    if args.cache is not None:
+        import diskCache
+        cache = diskCache.DiskCache(args.cache or None)
+        results = cache.calculate_batch(**columns, engine=args.engine, profile_points=args.profile_points, accuracy=args.accuracy)
+    else:
+        results = calculatingModule.calculate_batch(**columns, engine=args.engine, profile_points=args.profile_points,
+                                                    accuracy=args.accuracy, sensitivities=args.sensitivities)
+    finished = time.perf_counter()
+
+    write_table(make_table(columns, results, args.profile_points), args.output)
+    if args.timing:
+        print(f'startup {started - _start:.3f} s, fompy/scipy import {loaded - started:.3f} s, '
+              f'calculation of {len(results["phi"])} points {finished - loaded:.3f} s', file=sys.stderr)
+
+    # для одной точки объясняем, что не так
+    if not args.input and results['status'][0] != calculatingModule.STATUS_OK:
+        row = {name: results[name][0] for name in ('status', 'errors', 'E_f', 'iterations', 'residual')}
+        print(calculatingModule.batch_message(**row, engine=args.engine), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,137 +1,540 @@
 import math
+import numpy as np
 from fompy import constants
-from fompy import materials
-from fompy import models
 
-from scipy.optimize import fsolve
+import rootSolver
+import lruCache
+import validation
+from calcTypes import Params, Results, BandProfile, E_out_to_cgs
 
+# статусы строк в calculate_batch
+STATUS_OK = 0
+STATUS_INVALID = 1 # не прошли checkparms
+STATUS_NOT_SOLVED = 2 # не нашли корень уравнения на phi
+
+# 'depletion' - приближение обеднения, 'poisson' - полное уравнение Пуассона (poissonSolver)
+engines = ('depletion', 'poisson')
+
+# fompy.materials и fompy.models тянут за собой scipy (больше половины секунды),
+# поэтому импортируем их только при первом расчете
+material_names = ('GaAs', 'Si', 'Ge')
+
+def get_material(name):
+    """fompy material of preset {name}, None for 'custom'."""
+    if name not in material_names:
+        return None
+    from fompy import materials
+    return getattr(materials, name)
+
+def preload(engine='depletion'):
+    """Import the modules needed by {engine} now instead of in the first calculation."""
+    import fompy.materials
+    import fompy.models
+    if engine == 'poisson':
+        import poissonSolver
+
+# полупроводник и уровень Ферми в объеме не зависят от N_as, E_as и E_out,
+# поэтому при движении этих слайдеров берем их из кэша
+scond_cache = lruCache.LRUCache(maxsize=64)
+fermi_cache = lruCache.LRUCache(maxsize=4096)
 
 def checkparms(params, Nc, Nv):
-    
-    message = 'ok'
-    
-    if(params['E_as'] > params['E_gap']): 
-        message = 'Ошибка! Поверхностные состояния по энергии НЕ попадают в запрещенную зону полупроводника'
-    if(params['E_out'] * 3.3*1e-5 > params['N_as'] * constants.e):
-        message = 'Ошибка! Внешнее поле больше, чем поле создаваемое поверхностными акцепторами'
-    if(params['N_d0'] > Nc or params['N_d0'] > Nv ):
-         message = 'Ошибка! Концентрация доноров больше, чем концентрация собственных плотностей состояний в валентной зоне и зоне проводимости' 
-    
-    return message
+    """
+    'ok' or the texts of all violated conditions (see validation) for {params}
+    with the material constants set; {Nc}, {Nv} - effective densities of states at T.
+    """
+    return validation.message(validation.check_params(params, Nc, Nv))
+
+def state_densities(scond, T):
+    """
+    Effective densities of states (Nc, Nv) [cm^(-3)] of {scond} at {T} [K];
+    NaN for T <= 0, which validation.check reports as NOT_POSITIVE (as calculate_batch does).
+    """
+    if not T > 0:
+        return math.nan, math.nan
+    return scond.Nc(T), scond.Nv(T)
 
-def create_scond(parms):
+def set_material(params):
+    """
+    Return {params} with the constants of the chosen material.
+    Presets take E_gap, epsilon and effective masses from fompy, 'custom' is returned as is.
+    """
+    mat_scond = get_material(params.mat)
+    if mat_scond is None:
+        return params
+    return params.replace(E_gap=mat_scond.Eg / constants.eV, epsilon=mat_scond.eps,
+                          m_h=mat_scond.mh / constants.me, m_e=mat_scond.me / constants.me)
+
+def create_scond(params):
+    from fompy import models
     
-    if parms['mat'] == 'GaAs':
-        mat_scond = materials.GaAs
-        
-    if parms['mat'] == 'Si':
-        mat_scond = materials.Si
+    mat_scond = get_material(params.mat)
         
-    if parms['mat'] =='Ge':
-        mat_scond = materials.Ge
-        
-    if parms['mat'] == 'custom':
-        scond = models.Semiconductor(parms['m_e']*constants.me,parms['m_h']*constants.me, parms['E_gap'] * constants.eV, eps=parms['epsilon'], chi=None)
+    if params.mat == 'custom':
+        scond = models.Semiconductor(params.m_e*constants.me, params.m_h*constants.me, params.E_gap_erg, eps=params.epsilon, chi=None)
     else:      
-        parms['E_gap'] = mat_scond.Eg / constants.eV #eV
-        parms['epsilon'] = mat_scond.eps 
-        parms['m_h'] = mat_scond.mh 
-        parms['m_e'] = mat_scond.me 
-        E_d_fp = (parms['E_gap'] - parms['E_d']) * constants.eV
-        scond = models.DopedSemiconductor(mat=mat_scond, Na=0, Ea=0, Nd=parms['N_d0'], Ed=E_d_fp)
+        E_d_fp = params.E_gap_erg - params.E_d_erg
+        scond = models.DopedSemiconductor(mat=mat_scond, Na=0, Ea=0, Nd=params.N_d0, Ed=E_d_fp)
     
     return scond
 
+def get_scond(params):
+    return scond_cache.get(params.scond_key(), lambda: create_scond(params))
+
+def fermi_level_near(scond, T, E_f0, width=None):
+    """
+    Bulk Fermi level [erg] of {scond} at {T}, searched near the guess {E_f0} [erg]
+    (e.g. the level at a close temperature).
+    
+    Solves the same neutrality equation as scond.fermi_level, but the bracket
+    starts {width} (kT by default) around the guess and is widened only if the
+    root is outside, so a good guess costs a few evaluations instead of ~30 bisections.
+    Raises ValueError like scond.fermi_level if there is no root in [-E_gap, 2 E_gap].
+    """
+    from scipy.optimize import brentq
+    
+    def imbalance(E_f):
+        # то же уравнение, что решает fompy в fermi_level
+        return scond._charge_imbalance(E_f, T)
+    
+    bottom, top = -scond.Eg, 2*scond.Eg
+    E_f0 = min(max(E_f0, bottom), top)
+    width = constants.k*T if width is None else width
+    lo, hi = max(E_f0 - width, bottom), min(E_f0 + width, top)
+    f_lo, f_hi = imbalance(lo), imbalance(hi)
+    # дисбаланс убывает с ростом E_f: пока знаки на концах одинаковы, раздвигаем отрезок в сторону корня
+    while f_lo*f_hi > 0 and (lo > bottom or hi < top):
+        width *= 4
+        if f_lo < 0:
+            hi, f_hi = lo, f_lo
+            lo = max(E_f0 - width, bottom)
+            f_lo = imbalance(lo)
+        else:
+            lo, f_lo = hi, f_hi
+            hi = min(E_f0 + width, top)
+            f_hi = imbalance(hi)
+    return brentq(imbalance, lo, hi, xtol=1e-9*scond.Eg)
+
+def get_fermi_level(params, E_f0=None):
+    """
+    Bulk Fermi level [erg] for {params}, cached.
+    If the guess {E_f0} [erg] is given, a cache miss is solved by fermi_level_near.
+    """
+    if E_f0 is None or not np.isfinite(E_f0):
+        return fermi_cache.get(params.scond_key() + (params.T,), lambda: get_scond(params).fermi_level(params.T))
+    return fermi_cache.get(params.scond_key() + (params.T,), lambda: fermi_level_near(get_scond(params), params.T, E_f0))
+
+def cache_info():
+    return dict(scond=scond_cache.info(), fermi_level=fermi_cache.info())
+
 # x == phi_s в эВ !!!!
+# f_left, f_right и W работают и с числами, и с массивами numpy в parms
 def f_left(x, parms):
     x_erg = x * constants.eV
-    return math.sqrt(parms['epsilon'] * x_erg * parms['N_d0']/(2*math.pi*(constants.e)**2))
+    return np.sqrt(parms['epsilon'] * x_erg * parms['N_d0']/(2*math.pi*(constants.e)**2))
+
+# parms['states'] - непрерывное распределение поверхностных состояний (surfaceStates) вместо уровня E_as
+def _states_occupied(x, parms):
+    import surfaceStates
+    return surfaceStates.occupied(parms['states'], (parms['E_f'] - x * constants.eV)/constants.eV, parms['T'],
+                                  parms['E_gap']/constants.eV)
 
 def f_right(x, parms):
+    if parms.get('states') is not None:
+        return _states_occupied(x, parms)[0] + parms['E_out']/(4*math.pi*constants.e)
     x_erg = x * constants.eV
-    return (parms['N_as']*(1/(1 + math.exp((parms['E_as'] + x_erg - parms['E_f'])/(constants.k*parms['T'])))) + parms['E_out']/(4*math.pi*constants.e))
+    with np.errstate(over='ignore'):
+        occupation = 1/(1 + np.exp((parms['E_as'] + x_erg - parms['E_f'])/(constants.k*parms['T'])))
+    return parms['N_as']*occupation + parms['E_out']/(4*math.pi*constants.e)
 
 def f(x, parms):
     return f_left(x, parms) - f_right(x, parms)
 
+# производные по x (x в эВ)
+def df_left(x, parms):
+    return f_left(x, parms) / (2*x)
+
+def df_right(x, parms):
+    if parms.get('states') is not None:
+        # u = E_f - phi
+        return -_states_occupied(x, parms)[1]
+    x_erg = x * constants.eV
+    with np.errstate(over='ignore'):
+        occupation = 1/(1 + np.exp((parms['E_as'] + x_erg - parms['E_f'])/(constants.k*parms['T'])))
+    return -parms['N_as'] * occupation*(1 - occupation) * constants.eV/(constants.k*parms['T'])
+
+def df(x, parms):
+    return df_left(x, parms) - df_right(x, parms)
+
 def W(phi, params):
     #phi в эВ
     phi_erg = phi * constants.eV
-    return math.sqrt(params['epsilon']*phi_erg/(params['N_d0']*2*math.pi*(constants.e)**2))
+    return np.sqrt(params['epsilon']*phi_erg/(params['N_d0']*2*math.pi*(constants.e)**2))
+
+def f_df_scalar(x, parms):
+    """f and df at one point {x} [eV] at once, with math instead of numpy."""
+    x_erg = x * constants.eV
+    kT = constants.k*parms['T']
+    z = (parms['E_as'] + x_erg - parms['E_f'])/kT
+    occupation = 1/(1 + math.exp(z)) if z < 700 else 0.0
+    left = math.sqrt(parms['epsilon'] * x_erg * parms['N_d0']/(2*math.pi*(constants.e)**2))
+    value = left - parms['N_as']*occupation - parms['E_out']/(4*math.pi*constants.e)
+    # при x = 0 производная бесконечна: решатель сделает шаг деления пополам
+    slope = (left/(2*x) if x > 0 else math.inf) + parms['N_as']*occupation*(1 - occupation)*constants.eV/kT
+    return value, slope
+
+def solve_phi_scalar(params, x0=None):
+    """
+    solve_phi for one point with a discrete level, in plain floats.
+    
+    The bracket is [0, E_gap] doubled while f < 0 there, as in solve_phi.
+    Without {x0} Newton starts from the pinning estimate E_f - E_as or,
+    if the acceptors are all filled below it, from phi_full, where
+    f_left = N_as + E_out/(4 pi e).
+    """
+    hi = params['E_gap']/constants.eV
+    for _ in range(10):
+        if not f_df_scalar(hi, params)[0] < 0:
+            break
+        hi *= 2
+    if x0 is None:
+        Q = params['N_as'] + params['E_out']/(4*math.pi*constants.e)
+        phi_full = 2*math.pi*(constants.e*Q)**2/(params['epsilon']*params['N_d0'])/constants.eV
+        pinning = (params['E_f'] - params['E_as'])/constants.eV
+        x0 = pinning if 0 < pinning < phi_full else phi_full
+    return rootSolver.solve_increasing_scalar(f_df_scalar, 0.0, hi, params, x0=x0)
+
+def solve_phi(params, x0=None):
+    """
+    Solve f(phi) = 0 for every row of {params} (numbers or numpy arrays).
+    
+    f_left grows and f_right decreases with phi, so the root is unique.
+    It is bracketed by [0, E_gap]; the upper bound is doubled for rows
+    where the root lies above the gap. One point with a discrete level
+    goes to solve_phi_scalar.
+    
+    Returns rootSolver.SolverResult with phi [eV], iterations, residual [cm^(-2)] and status.
+    """
+    if params.get('states') is None and np.ndim(params['E_gap']) == 0 and np.ndim(params['E_f']) == 0:
+        return solve_phi_scalar(params, x0)
+    func, dfunc = f, df
+    if params.get('states') is not None:
+        # таблицы состояний находим один раз на все итерации, а f и df
+        # вызываются подряд в одной точке: интерполируем один раз на обе
+        import surfaceStates
+        occupancy = surfaceStates.Occupancy(params['states'], params['T'], params['E_gap'] / constants.eV)
+        last = [None, None]
+        def occupied(x):
+            if last[0] is not x:
+                last[:] = x, occupancy((params['E_f'] - x * constants.eV)/constants.eV)
+            return last[1]
+        func = lambda x, parms: f_left(x, parms) - occupied(x)[0] - parms['E_out']/(4*math.pi*constants.e)
+        dfunc = lambda x, parms: df_left(x, parms) + occupied(x)[1]
+    lo = np.zeros(np.shape(params['E_gap']))
+    hi = rootSolver.expand_bracket(func, params['E_gap'] / constants.eV + lo, params)
+    return rootSolver.solve_increasing(func, dfunc, lo, hi, params, x0=x0)
+
+def phi_solution(params, x0=None):
+    """solve_phi for one point; raises rootSolver.SolverError if it failed."""
+    solution = solve_phi(params, x0)
+    if solution.status == rootSolver.NO_BRACKET:
+        raise rootSolver.SolverError('нет корня при phi > 0')
+    if solution.status == rootSolver.MAX_ITER:
+        raise rootSolver.SolverError(f'нет сходимости за {int(solution.iterations)} итераций, невязка {float(solution.residual):.3g}')
+    return solution
 
 def phi(params):
-    x_0 = 0.001
-    root = fsolve(f,x_0, args = params)
-    return root[0]
+    return float(phi_solution(params).root)
 
-def make_points(phi, W, parms):
-    #phi в эВ
-    #W в см
+def profile_grid(n_points=31, spacing='uniform'):
+    """
+    Points s = x/W of the band profile.
+    {spacing} - 'uniform': from 0 to 2 with equal steps, as in the interface;
+    'adaptive': 3/4 of the points inside the space charge region (s < 1), denser near x = 0
+    where the bands bend most, the rest in the bulk up to 2.
+    """
+    if spacing == 'uniform':
+        return np.linspace(0, 2, n_points)
+    if spacing == 'adaptive':
+        n_in = max(2, round(0.75*n_points))
+        return np.concatenate((1 - np.cos(np.linspace(0, np.pi/2, n_in)), 1 + np.linspace(0, 1, n_points - n_in + 1)[1:]))
+    raise ValueError(f'Unknown spacing: {spacing}')
+
+def band_profile(phi, W, E_gap, E_d, E_as, E_f, n_points=31, spacing='uniform'):
+    """
+    Band diagram for the depletion approximation: E_v(x) = phi * (1 - x/W)^2 for x < W.
     
-    N = 30
-    h = W*2/N
+    All values in eV and cm; they may be numbers or arrays of rows, then the
+    bands get one more (last) axis of {n_points} points placed by profile_grid({spacing}).
     
-    #парабола: ax^2 + bx + c
-    c = phi
-    a = c/(W**2)
-    b = -2 * W * a
-        
-    x_s = [] #координата
-    E_f_s = [] # энергия ферми
-    E_v_s = [] # потолок валентной зоны
-    E_c_s = [] # дно зоны проводимости
-    E_d_s = [] # энергия доноров
-    E_as_s = [] #энергия поверхностных акцепторов
-    
-    E_f = parms['E_f'] / constants.eV
-    E_gap = parms['E_gap'] / constants.eV
-    E_d = parms['E_d'] / constants.eV
-    E_as_eV = parms['E_as'] / constants.eV
-     
-    
-    for i in range(N+1):
-        x_s.append(i*h)
-        E_f_s.append(E_f)
-        E_as_s.append(E_as_eV)
-        
-        if x_s[i] > W:
-            E_v_s.append(0)
-            E_c_s.append(E_gap)
-            E_d_s.append(E_d)
-            
-        else:
-            bend = a*x_s[i]**2 + b*x_s[i] + c
-            E_v_s.append(bend)
-            E_c_s.append(E_gap + bend)
-            E_d_s.append(E_d + bend)
-            
-    return x_s, E_f_s, E_v_s, E_c_s, E_d_s, E_as_s
-
-def calculate(parms):
-    scond = create_scond(parms)
-    T = parms['T'] 
-    message = checkparms(parms, scond.Nc(T), scond.Nc(T))
-    results = dict(message = '', x_s = 0, E_f_s = 0 , E_v_s = 0, E_c_s = 0, E_d_s = 0, E_as_s = 0, phi = 0, W = 0)
-    if message == 'ok':
-        results['message'] = message
-        
-        #Переведем все в СГС
-        parms['E_gap'] = parms['E_gap'] * constants.eV
-        parms['E_d'] = parms['E_d'] * constants.eV
-        parms['E_as'] = parms['E_as'] * constants.eV
-        parms['E_out'] = parms['E_out'] * 3.3*1e-5
-        
-        
-        try:
-            parms['E_f'] = scond.fermi_level(T)
-            results['phi'] = phi(parms) #eV
-            results['W'] = W(results['phi'], parms) #cm
-            results['x_s'], results['E_f_s'], results['E_v_s'],results['E_c_s'], results['E_d_s'], results['E_as_s'] = make_points(results['phi'], results['W'], parms)
-        except Exception:
-            message = 'Ошибка! Некорректные данные'
-            results['message'] = message
-            return results
-        
-    else: results['message'] = message
+    Returns calcTypes.BandProfile; E_f and E_as stay scalars (one value per row).
+    """
+    s = profile_grid(n_points, spacing)
+    #s = x/W
+    phi, W, E_gap, E_d = (np.asarray(col, dtype=float)[..., None] for col in (phi, W, E_gap, E_d))
+    bend = phi * np.clip(1 - s, 0, None)**2
+    return BandProfile(W * s, bend, E_gap + bend, E_d + bend, E_f, E_as)
+
+def poisson_profile(solution, E_gap, E_d, E_as, n_points=31, spacing='uniform'):
+    """Band diagram of a poissonSolver solution at the points of profile_grid."""
+    import poissonSolver
+    x, bend = poissonSolver.resample(solution, profile_grid(n_points, spacing))
+    E_gap, E_d = (np.asarray(col, dtype=float)[..., None] for col in (E_gap, E_d))
+    return BandProfile(x, bend, E_gap + bend, E_d + bend, solution.E_f, E_as)
+
+def calculate_poisson(params, n_points=31, spacing='uniform', diag=None):
+    """calculate() with the full Poisson equation for {params} with the material constants set."""
+    import poissonSolver
+    solution = poissonSolver.solve(params.E_gap, params.E_d, params.N_d0, params.E_as, params.N_as, params.T,
+                                   params.E_out, params.m_e, params.m_h, params.epsilon)
+    if diag is not None:
+        diag.lap('poisson')
+        diag.iterations, diag.residual = int(solution.iterations[0]), float(solution.residual[0])
+    if not np.isfinite(solution.E_f[0]):
+        return Results('Ошибка! Не удалось найти уровень Ферми из условия электронейтральности')
+    if not solution.converged[0]:
+        return Results('Ошибка! Уравнение Пуассона не решено (нет сходимости, невязка ' + f'{float(solution.residual[0]):.3g})')
+    profile = poisson_profile(solution, params.E_gap, params.E_d, params.E_as, n_points, spacing)
+    profile = profile._replace(x=profile.x[0], E_v=profile.E_v[0], E_c=profile.E_c[0], E_d=profile.E_d[0], E_f=float(solution.E_f[0]))
+    if diag is not None:
+        diag.lap('band_profile')
+    return Results('ok', float(solution.phi[0]), float(solution.W[0]), float(solution.E_f[0]), profile)
+
+def calculate(params, n_points=31, spacing='uniform', engine='depletion', diagnostics=False, states=None):
+    """
+    Calculate band bending for one set of parameters.
+    
+    {params} - calcTypes.Params (a dict with the same keys is accepted too and is not modified)
+    {n_points}, {spacing} - resolution of the band profile, see band_profile
+    {engine} - 'depletion' or 'poisson' (see poissonSolver.solve: free carriers
+    in the space charge region, W is the equivalent depletion width)
+    {diagnostics} - if True, results.diagnostics gets diagnostics.Diagnostics with
+    the time of every stage, solver iterations and cache hits, and the call is
+    added to diagnostics.stats
+    {states} - surfaceStates distribution of the surface states instead of the
+    single level: N_as and E_as are replaced by its total density and mean energy
+    (depletion engine only)
+    
+    Returns calcTypes.Results
+    """
+    if engine not in engines:
+        raise ValueError(f'Unknown engine: {engine}')
+    if states is not None and engine != 'depletion':
+        raise ValueError('Distributed surface states are available only for the depletion engine')
+    if not diagnostics:
+        return _calculate(params, n_points, spacing, engine, None, states)
+    
+    import diagnostics as diagnostics_module
+    diag = diagnostics_module.Diagnostics(engine)
+    results = _calculate(params, n_points, spacing, engine, diag, states)
+    results.diagnostics = diag
+    diagnostics_module.stats.add(diag, results.ok)
+    return results
+
+def _calculate(params, n_points, spacing, engine, diag, states=None):
+    # diag is None, если диагностика выключена: тогда никаких замеров
+    if isinstance(params, dict):
+        params = Params.from_dict(params)
+    params = set_material(params)
+    if states is not None and params.E_gap > 0:
+        params = params.replace(N_as=states.total(params.E_gap), E_as=states.level(params.E_gap))
+    if diag is not None:
+        diag.lap('set_material')
+        diag.cache['scond'] = params.scond_key() in scond_cache
+    scond = get_scond(params)
+    if diag is not None:
+        diag.lap('create_scond')
+    T = params.T
+    message = checkparms(params, *state_densities(scond, T))
+    if diag is not None:
+        diag.lap('checkparms')
+    if message != 'ok':
+        return Results(message)
+    if engine == 'poisson':
+        return calculate_poisson(params, n_points, spacing, diag)
+    
+    if diag is not None:
+        diag.cache['fermi_level'] = params.scond_key() + (T,) in fermi_cache
+    try:
+        E_f = get_fermi_level(params)
+    except ValueError:
+        return Results('Ошибка! Не удалось найти уровень Ферми из условия электронейтральности')
+    if diag is not None:
+        diag.lap('fermi_level')
+    
+    #Переведем все в СГС
+    parms = params.cgs(E_f)
+    parms['states'] = states
+    try:
+        solution = phi_solution(parms)
+    except rootSolver.SolverError as error:
+        return Results('Ошибка! Уравнение на изгиб зон не решено (' + str(error) + ')')
+    phi_s = float(solution.root) #eV
+    if diag is not None:
+        diag.lap('phi')
+        diag.iterations, diag.residual = int(solution.iterations), float(solution.residual)
+    W_s = float(W(phi_s, parms)) #cm
+    E_f = E_f / constants.eV
+    if diag is not None:
+        diag.lap('W')
+    
+    profile = band_profile(phi_s, W_s, params.E_gap, params.E_d, params.E_as, E_f, n_points, spacing)
+    if diag is not None:
+        diag.lap('band_profile')
+    return Results(message, phi_s, W_s, E_f, profile)
+
+
+def batch_message(status, errors, E_f, iterations, residual, engine='depletion'):
+    """
+    Message of calculate() for one row of calculate_batch, built from the
+    columns of the row ({status}, {errors}, {E_f}, {iterations}, {residual}) without solving again.
+    """
+    if status == STATUS_OK:
+        return 'ok'
+    if status == STATUS_INVALID:
+        return validation.message(errors)
+    if not np.isfinite(E_f):
+        return 'Ошибка! Не удалось найти уровень Ферми из условия электронейтральности'
+    if engine == 'poisson':
+        return 'Ошибка! Уравнение Пуассона не решено (нет сходимости, невязка ' + f'{float(residual):.3g})'
+    # невязка NaN - корень не окружен (rootSolver.NO_BRACKET), иначе кончились итерации
+    if not np.isfinite(residual):
+        return 'Ошибка! Уравнение на изгиб зон не решено (нет корня при phi > 0)'
+    return ('Ошибка! Уравнение на изгиб зон не решено ' +
+            f'(нет сходимости за {int(iterations)} итераций, невязка {float(residual):.3g})')
+
+
+def calculate_batch(E_gap, E_d, N_d0, E_as, N_as, T, E_out, mat, m_e=0.5, m_h=0.5, epsilon=10.0, profile_points=0, engine='depletion', accuracy='exact',
+                    sensitivities=False, states=None):
+    """
+    Vectorized version of calculate() for many parameter points.
+    
+    Every argument is a column (array or scalar, broadcast together) in the
+    same units as calcTypes.Params: energies in eV, {N_d0} in cm^(-3),
+    {N_as} in cm^(-2), {T} in K, {E_out} in V/m. {m_e}, {m_h} and {epsilon}
+    are used only for 'custom' rows, the others take them from the material.
+    
+    Returns dict of arrays: phi [eV], W [cm], E_f [eV], status
+    (STATUS_OK, STATUS_INVALID or STATUS_NOT_SOLVED), solver iterations,
+    residual [cm^(-2)] and errors - validation error codes (bit fields,
+    0 for valid rows; only valid rows are solved).
+    If {profile_points} > 0, also 'profile': band_profile of every row
+    (x, E_v, E_c, E_d of shape (n, profile_points)).
+    {engine} - 'depletion' or 'poisson' as in calculate(); for 'poisson' the
+    residual is that of poissonSolver.
+    {accuracy} - Fermi-Dirac integral of the bulk Fermi level, see neutrality:
+    'exact' agrees with fompy (and calculate) within 1e-6 E_gap, 'fast' within 0.004 kT.
+    If {sensitivities}, also 'dphi', 'dW' and 'dE_f': dicts parameter name ->
+    derivative of every row (see sensitivity.gradients, NaN where status is not ok);
+    only for the depletion engine.
+    {states} - surfaceStates distribution, as in calculate(): the {N_as} and
+    {E_as} columns are replaced by its total density and mean energy in the gap
+    of every row; only for the depletion engine and without sensitivities.
+    """
+    if engine not in engines:
+        raise ValueError(f'Unknown engine: {engine}')
+    if sensitivities and engine != 'depletion':
+        raise ValueError('Sensitivities are available only for the depletion engine')
+    if states is not None and (engine != 'depletion' or sensitivities):
+        raise ValueError('Distributed surface states are available only for the depletion engine without sensitivities')
+    E_gap, E_d, N_d0, E_as, N_as, T, E_out, m_e, m_h, epsilon = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(col, dtype=float)) for col in (E_gap, E_d, N_d0, E_as, N_as, T, E_out, m_e, m_h, epsilon)))
+    n = E_gap.size
+    mat = np.broadcast_to(np.asarray(mat, dtype=object), (n,))
+    E_gap, m_e, m_h, epsilon = E_gap.copy(), m_e.copy(), m_h.copy(), epsilon.copy()
+    
+    # у готовых материалов параметры берутся из fompy, как в set_material
+    for name in material_names:
+        mat_scond = get_material(name)
+        rows = mat == name
+        E_gap[rows] = mat_scond.Eg / constants.eV
+        epsilon[rows] = mat_scond.eps
+        m_e[rows] = mat_scond.me / constants.me
+        m_h[rows] = mat_scond.mh / constants.me
+    if states is not None:
+        # строки с E_gap <= 0 остаются NaN и не пройдут проверку NOT_POSITIVE
+        E_as, N_as = np.full(n, np.nan), np.full(n, np.nan)
+        for gap in np.unique(E_gap[E_gap > 0]):
+            rows = E_gap == gap
+            E_as[rows], N_as[rows] = states.level(gap), states.total(gap)
+    
+    from fompy import models
+    with np.errstate(invalid='ignore'):
+        Nc = models.Semiconductor.effective_state_density(m_e * constants.me, T)
+        Nv = models.Semiconductor.effective_state_density(m_h * constants.me, T)
+    errors = validation.check(E_gap, E_as, N_d0, N_as, E_out, T, epsilon, Nc, Nv)
+    valid = errors == 0
+    if engine == 'poisson':
+        results = poisson_batch(valid, E_gap, E_d, N_d0, E_as, N_as, T, E_out, m_e, m_h, epsilon, profile_points)
+        results['errors'] = errors
+        return results
+    
+    # уровень Ферми считаем одним вызовом neutrality (та же модель, что у fompy
+    # в create_scond), по разу на каждый уникальный полупроводник и температуру
+    import neutrality
+    E_f = np.full(n, np.nan)
+    rows = np.flatnonzero(valid)
+    if rows.size:
+        doped = mat[rows] != 'custom'
+        keys = np.column_stack((doped, m_e[rows], m_h[rows], E_gap[rows], N_d0[rows], E_d[rows], T[rows]))
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        unique = rows[first]
+        neutral = neutrality.fermi_level(E_gap[unique], E_d[unique], N_d0[unique], T[unique], m_e[unique], m_h[unique],
+                                         doped=doped[first], accuracy=accuracy)
+        E_f[rows] = np.where(neutral.converged, neutral.root, np.nan)[inverse.ravel()]
+    
+    #Переведем все в СГС
+    parms = dict(E_gap=E_gap * constants.eV, E_as=E_as * constants.eV, E_out=E_out * E_out_to_cgs,
+                 N_d0=N_d0, N_as=N_as, T=T, epsilon=epsilon, E_f=E_f)
+    solvable = valid & np.isfinite(E_f)
+    solution = solve_phi(dict({key: value[solvable] for key, value in parms.items()}, states=states))
+    
+    phi_s = np.full(n, np.nan)
+    phi_s[solvable] = solution.root
+    iterations = np.zeros(n, dtype=int)
+    iterations[solvable] = solution.iterations
+    residual = np.full(n, np.nan)
+    residual[solvable] = solution.residual
+    with np.errstate(invalid='ignore', divide='ignore'):
+        W_s = W(phi_s, parms)
+    
+    status = np.full(n, STATUS_INVALID, dtype=np.int8)
+    status[solvable] = np.where(solution.converged, STATUS_OK, STATUS_NOT_SOLVED)
+    status[valid & ~solvable] = STATUS_NOT_SOLVED
+    
+    results = dict(phi=phi_s, W=W_s, E_f=E_f / constants.eV, status=status, iterations=iterations, residual=residual,
+                   errors=errors)
+    if sensitivities:
+        import sensitivity
+        ok = status == STATUS_OK
+        derivatives = sensitivity.gradients(phi_s[ok], {key: value[ok] for key, value in parms.items()},
+                                            E_d[ok], m_e[ok], m_h[ok], mat[ok], accuracy)
+        for key, columns in derivatives.items():
+            results[key] = {}
+            for name, values in columns.items():
+                results[key][name] = np.full(n, np.nan)
+                results[key][name][ok] = values
+    if profile_points > 0:
+        results['profile'] = band_profile(phi_s, W_s, E_gap, E_d, E_as, results['E_f'], profile_points)
     return results
 
+def poisson_batch(valid, E_gap, E_d, N_d0, E_as, N_as, T, E_out, m_e, m_h, epsilon, profile_points=0):
+    """calculate_batch() for engine='poisson': columns with the material constants set, {valid} rows are solved."""
+    import poissonSolver
+    n = E_gap.size
+    results = dict(phi=np.full(n, np.nan), W=np.full(n, np.nan), E_f=np.full(n, np.nan),
+                   status=np.full(n, STATUS_INVALID, dtype=np.int8), iterations=np.zeros(n, dtype=int), residual=np.full(n, np.nan))
+    x, bend = np.full((n, profile_points), np.nan), np.full((n, profile_points), np.nan)
+    # poissonSolver не принимает пустые массивы
+    if valid.any():
+        solution = poissonSolver.solve(*(col[valid] for col in (E_gap, E_d, N_d0, E_as, N_as, T, E_out, m_e, m_h, epsilon)))
+        for name in ('phi', 'W', 'E_f', 'iterations', 'residual'):
+            results[name][valid] = getattr(solution, name)
+        results['status'][valid] = np.where(solution.converged, STATUS_OK, STATUS_NOT_SOLVED)
+        if profile_points > 0:
+            profile = poisson_profile(solution, E_gap[valid], E_d[valid], E_as[valid], profile_points)
+            x[valid], bend[valid] = profile.x, profile.E_v
+    
+    if profile_points > 0:
+        results['profile'] = BandProfile(x, bend, E_gap[:, None] + bend, E_d[:, None] + bend, results['E_f'], E_as)
+    return results
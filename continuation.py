@@ -0,0 +1,185 @@
+"""
+Continuation along a path of one parameter, e.g. phi(T) or phi(N_as).
+
+Every point starts the band-bending solver from the extrapolation of the
+previous solutions and the bulk Fermi level from the previous level, so on
+a smooth path a point costs 1-2 Newton iterations instead of ~10.
+
+    path = continuation.trace(params, 'T', 200, 500)            # adaptive steps
+    path = continuation.follow(params, 'N_as', np.logspace(12, 15, 1000))
+
+Only the depletion engine is supported.
+"""
+from collections import namedtuple
+
+import numpy as np
+from fompy import constants
+
+import calculatingModule
+from calcTypes import Params
+
+# концентрации удобнее вести по логарифмической шкале
+log_names = ('N_d0', 'N_as')
+
+# values - значения параметра вдоль пути; phi [эВ], W [см], E_f [эВ], status (calculatingModule.STATUS_*),
+# iterations - итерации решателя phi, jumps[i] - решение скачком меняется между точками i-1 и i
+Path = namedtuple('Path', ['values', 'phi', 'W', 'E_f', 'status', 'iterations', 'jumps'])
+
+
+class Tracer:
+    """
+    Solver of the points of a path that remembers the accepted points
+    and predicts the next solution by linear extrapolation.
+
+    {base} - calcTypes.Params, {name} - the parameter that changes along the path,
+    {scale} - 'linear' or 'log' coordinate along the path
+    (by default 'log' for concentrations).
+    """
+
+    def __init__(self, base, name, scale=None):
+        if name not in Params.names or name == 'mat':
+            raise ValueError(f'Unknown path parameter: {name}')
+        if scale is None:
+            scale = 'log' if name in log_names else 'linear'
+        if scale not in ('linear', 'log'):
+            raise ValueError(f'Unknown scale: {scale}')
+        self.base = base
+        self.name = name
+        self.scale = scale
+        # принятые точки: координата, значение параметра, phi, W, E_f [эрг], статус, итерации, скачок
+        self.points = []
+        # по скольким точкам сделан последний прогноз: 0, 1 (константа) или 2 (прямая)
+        self.order = 0
+
+    def __len__(self):
+        return len(self.points)
+
+    def coordinate(self, value):
+        return np.log10(value) if self.scale == 'log' else value
+
+    def value(self, u):
+        return 10.0**u if self.scale == 'log' else u
+
+    def predict(self, u):
+        """Guesses (phi, E_f) at the coordinate {u} from the last accepted points, None where unknown."""
+        ok = []
+        for point in reversed(self.points[-2:]):
+            if point[5] != calculatingModule.STATUS_OK:
+                break
+            ok.append(point)
+        if not ok:
+            self.order = 0
+            return None, None
+        if len(ok) == 1 or ok[0][0] == ok[1][0]:
+            self.order = 1
+            return ok[0][2], ok[0][4]
+        self.order = 2
+        (u1, _, phi1, _, E_f1, *_), (u0, _, phi0, _, E_f0, *_) = ok
+        t = (u - u1)/(u1 - u0)
+        # изгиб зон не бывает отрицательным, экстраполяция не должна туда уводить
+        return max(phi1 + t*(phi1 - phi0), 0.0), E_f1 + t*(E_f1 - E_f0)
+
+    def solve(self, u):
+        """
+        Solve the point at the coordinate {u} starting from the prediction.
+        Returns the point (not yet accepted) and the prediction error [eV]:
+        the largest change of phi and E_f against the guess, 0 without a guess.
+        """
+        value = self.value(u)
+        phi0, E_f0 = self.predict(u)
+        p = calculatingModule.set_material(self.base.replace(**{self.name: value}))
+        scond = calculatingModule.get_scond(p)
+        if calculatingModule.checkparms(p, *calculatingModule.state_densities(scond, p.T)) != 'ok':
+            return (u, value, np.nan, np.nan, np.nan, calculatingModule.STATUS_INVALID, 0, False), 0.0
+        try:
+            E_f = calculatingModule.get_fermi_level(p, E_f0)
+        except ValueError:
+            return (u, value, np.nan, np.nan, np.nan, calculatingModule.STATUS_NOT_SOLVED, 0, False), 0.0
+
+        parms = p.cgs(E_f)
+        solution = calculatingModule.solve_phi(parms, phi0)
+        iterations = int(solution.iterations)
+        if not solution.converged:
+            return (u, value, np.nan, np.nan, E_f, calculatingModule.STATUS_NOT_SOLVED, iterations, False), 0.0
+        phi = float(solution.root)
+        point = (u, value, phi, float(calculatingModule.W(phi, parms)), E_f, calculatingModule.STATUS_OK, iterations, False)
+        error = 0.0 if phi0 is None else max(abs(phi - phi0), abs(E_f - E_f0)/constants.eV)
+        return point, error
+
+    def accept(self, point, jump=False):
+        self.points.append(point[:7] + (jump,))
+
+    def changed_status(self, point):
+        return bool(self.points) and self.points[-1][5] != point[5]
+
+    def path(self):
+        """Accepted points as a Path of arrays (empty without points)."""
+        if not self.points:
+            return Path(np.empty(0), np.empty(0), np.empty(0), np.empty(0),
+                        np.empty(0, dtype=np.int8), np.empty(0, dtype=int), np.empty(0, dtype=bool))
+        _, values, phi, W, E_f, status, iterations, jumps = (np.array(column) for column in zip(*self.points))
+        return Path(values.astype(float), phi.astype(float), W.astype(float), E_f.astype(float) / constants.eV,
+                    status.astype(np.int8), iterations.astype(int), jumps.astype(bool))
+
+
+def follow(base, name, values, tol=1e-3, scale=None):
+    """
+    Calculate {base} with {name} set to each of {values} in turn
+    (a sweep axis or a recorded sequence of slider positions).
+
+    A step is marked as a jump if the status changes or phi misses the
+    linear prediction from the two previous points by more than {tol} [eV]
+    and by more than the predicted change itself, i.e. the curve turns
+    or breaks faster than the points resolve it.
+
+    Returns Path.
+    """
+    tracer = Tracer(base, name, scale)
+    for value in np.asarray(values, dtype=float):
+        point, error = tracer.solve(tracer.coordinate(value))
+        jump = tracer.changed_status(point)
+        if tracer.order == 2 and error > tol:
+            predicted = tracer.predict(point[0])[0]
+            jump |= error > abs(predicted - tracer.points[-1][2])
+        tracer.accept(point, jump)
+    return tracer.path()
+
+
+def trace(base, name, start, stop, tol=1e-4, max_step=None, min_step=None, scale=None, max_points=100000):
+    """
+    Trace the path of {name} from {start} to {stop} with adaptive steps.
+
+    The step along the path coordinate (log10 of the value for 'log' {scale})
+    doubles while the prediction error of phi and E_f stays below {tol}/4 [eV]
+    and is halved, with the point solved again, when the error exceeds {tol}
+    or the status changes, so the points are dense where the curve bends
+    and sparse where it is straight.
+    {max_step} is 1/50 of the path and {min_step} 1e-6 of it by default.
+    A step that still fails at {min_step} is accepted and marked as a jump:
+    a discontinuity or a boundary of the valid parameter region.
+
+    Returns Path; at most {max_points} points.
+    """
+    tracer = Tracer(base, name, scale)
+    u, end = tracer.coordinate(float(start)), tracer.coordinate(float(stop))
+    span = abs(end - u)
+    direction = 1.0 if end >= u else -1.0
+    max_step = span/50 if max_step is None else max_step
+    min_step = span*1e-6 if min_step is None else min_step
+
+    tracer.accept(tracer.solve(u)[0])
+    step = max_step
+    while direction*(end - u) > 0 and len(tracer) < max_points:
+        step = min(step, abs(end - u))
+        # последний шаг точно попадает в конец пути
+        u_next = end if step == abs(end - u) else u + direction*step
+        point, error = tracer.solve(u_next)
+        failed = error > tol or tracer.changed_status(point)
+        if failed and step > min_step:
+            step = max(step/2, min_step)
+            continue
+        tracer.accept(point, failed)
+        u = u_next
+        if error < tol/4:
+            step = min(2*step, max_step)
+    return tracer.path()
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import numpy as np
+
+# границы корзин гистограмм времени: от 1 мкс до 10 с, 4 корзины на порядок
+time_bins = np.logspace(-6, 1, 29)
+
+
+class Diagnostics:
+    """
+    Instrumentation of one calculate() call.
+
+    {stages} - dict: stage name -> wall time [s], in the order of execution
+    {iterations}, {residual} - of the band-bending solver (None if it did not run)
+    {cache} - dict: cache name -> True on a hit, False on a miss
+    """
+
+    __slots__ = ('engine', 'stages', 'iterations', 'residual', 'cache', '_last')
+
+    def __init__(self, engine='depletion'):
+        self.engine = engine
+        self.stages = {}
+        self.iterations = None
+        self.residual = None
+        self.cache = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        """Record the time since the previous lap (or creation) as {stage}."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    @property
+    def total(self):
+        return sum(self.stages.values())
+
+    def as_dict(self):
+        return dict(engine=self.engine, stages=dict(self.stages), total=self.total,
+                    iterations=self.iterations, residual=self.residual, cache=dict(self.cache))
+
+    def __repr__(self):
+        stages = ', '.join(f'{name}={seconds*1e3:.3f}ms' for name, seconds in self.stages.items())
+        return f'Diagnostics({stages}, iterations={self.iterations}, residual={self.residual}, cache={self.cache})'
+
+
+class Stats:
+    """
+    Diagnostics of many calls aggregated into counters and histograms.
+
+    Stage times go into log-spaced histograms (time_bins), solver
+    iterations into a histogram by count. Safe to use from several threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.errors = 0
+            self.stage_count = {}
+            self.stage_total = {}
+            self.stage_hist = {}
+            self.iterations = {}
+            self.cache_hits = {}
+            self.cache_misses = {}
+
+    def add(self, diagnostics, ok=True):
+        """Add {diagnostics} of one call; {ok} - whether the calculation succeeded."""
+        with self._lock:
+            self.calls += 1
+            self.errors += not ok
+            for stage, seconds in diagnostics.stages.items():
+                self._add_stage(stage, seconds)
+            if diagnostics.iterations is not None:
+                self.iterations[diagnostics.iterations] = self.iterations.get(diagnostics.iterations, 0) + 1
+            for name, hit in diagnostics.cache.items():
+                counter = self.cache_hits if hit else self.cache_misses
+                counter[name] = counter.get(name, 0) + 1
+
+    def add_stage(self, stage, seconds):
+        """Add time of a stage measured outside calculate(), e.g. plotting in the interface."""
+        with self._lock:
+            self._add_stage(stage, seconds)
+
+    def _add_stage(self, stage, seconds):
+        if stage not in self.stage_hist:
+            self.stage_count[stage] = 0
+            self.stage_total[stage] = 0.0
+            self.stage_hist[stage] = np.zeros(len(time_bins) + 1, dtype=int)
+        self.stage_count[stage] += 1
+        self.stage_total[stage] += seconds
+        self.stage_hist[stage][np.searchsorted(time_bins, seconds)] += 1
+
+    def quantile(self, stage, q):
+        """Upper bound of the {q} quantile of the {stage} time from its histogram [s]."""
+        hist = self.stage_hist[stage]
+        k = int(np.searchsorted(np.cumsum(hist), q*hist.sum()))
+        return float(time_bins[min(k, len(time_bins) - 1)])
+
+    def dump(self):
+        """All counters and histograms as a JSON-serializable dict."""
+        with self._lock:
+            stages = {stage: dict(count=self.stage_count[stage], total=self.stage_total[stage],
+                                  hist=self.stage_hist[stage].tolist())
+                      for stage in self.stage_hist}
+            return dict(calls=self.calls, errors=self.errors, time_bins=time_bins.tolist(), stages=stages,
+                        iterations={str(k): v for k, v in sorted(self.iterations.items())},
+                        cache_hits=dict(self.cache_hits), cache_misses=dict(self.cache_misses))
+
+    def summary(self):
+        """Short text table for a status panel."""
+        with self._lock:
+            lines = [f'calls: {self.calls}, errors: {self.errors}']
+            for stage in self.stage_hist:
+                mean = self.stage_total[stage] / self.stage_count[stage]
+                lines.append(f'{stage:14s} {mean*1e3:8.3f} ms  p90 < {self.quantile(stage, 0.9)*1e3:.3g} ms')
+            if self.iterations:
+                n = sum(self.iterations.values())
+                mean = sum(k*v for k, v in self.iterations.items()) / n
+                lines.append(f'solver iterations: mean {mean:.1f}, max {max(self.iterations)}')
+            for name in sorted(set(self.cache_hits) | set(self.cache_misses)):
+                hits, misses = self.cache_hits.get(name, 0), self.cache_misses.get(name, 0)
+                lines.append(f'cache {name}: {hits} hits, {misses} misses')
+            return '\n'.join(lines)
+
+
+# общая статистика всех вызовов calculate(..., diagnostics=True)
+stats = Stats()
@@ -0,0 +1,337 @@
+"""
+Persistent cache of calculation results shared by the interface, the CLI and batch jobs.
+
+    cache = diskCache.DiskCache()                  # default_path(), 256 MB
+    results = cache.calculate(params)              # calculatingModule.calculate, kept on disk
+    columns = cache.calculate_batch(**columns)     # only rows not stored yet are calculated
+
+Keys are SHA-256 hashes of the canonical JSON of all inputs together with
+model_version() - a hash of the source of the model modules and the fompy
+version - so results of an older model are never returned. Values are
+bytes: raw float64 rows of calculate_batch, and Results of calculate as
+a JSON header with the message followed by raw float64 numbers - nothing is
+unpickled, so a tampered database cannot run code. They are kept in an
+SQLite database in WAL mode: any number of processes may read and
+write it at once. When the database grows over {max_bytes},
+the least recently used results are deleted.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import calculatingModule
+from calcTypes import BandProfile, Params, Results
+
+# модули, от которых зависят результаты: их изменение делает старые результаты недействительными
+model_modules = ('calcTypes', 'calculatingModule', 'fermiDirac', 'neutrality', 'poissonSolver', 'rootSolver', 'surfaceStates',
+                 'validation')
+# колонки calculate_batch, которые хранятся по строкам
+row_columns = ('phi', 'W', 'E_f', 'status', 'iterations', 'residual', 'errors')
+profile_columns = ('x', 'E_v', 'E_c', 'E_d')
+# версия формата значений calculate: входит в ключ, старые значения просто не находятся
+results_format = 2
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS results_used ON results (used);
+CREATE TABLE IF NOT EXISTS total (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO total VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results
+    BEGIN UPDATE total SET bytes = bytes + new.size; END;
+CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results
+    BEGIN UPDATE total SET bytes = bytes - old.size; END;
+CREATE TRIGGER IF NOT EXISTS results_update AFTER UPDATE OF size ON results
+    BEGIN UPDATE total SET bytes = bytes + new.size - old.size; END;
+'''
+
+_model_version = None
+
+
+def model_version():
+    """Hash of the source of model_modules and the fompy version."""
+    global _model_version
+    if _model_version is None:
+        import importlib.util
+        from importlib import metadata
+        digest = hashlib.sha256()
+        for name in model_modules:
+            with open(importlib.util.find_spec(name).origin, 'rb') as file:
+                digest.update(file.read())
+        try:
+            digest.update(metadata.version('fti-fompy').encode())
+        except metadata.PackageNotFoundError:
+            pass
+        _model_version = digest.hexdigest()[:16]
+    return _model_version
+
+
+def _canonical(value):
+    if isinstance(value, (float, np.floating)):
+        # -0.0 и 0.0 - одно и то же значение
+        return float(value) + 0.0
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.str_):
+        return str(value)
+    return value
+
+
+def make_key(kind, **inputs):
+    """Key of the result of {kind} for {inputs} (JSON-serializable values)."""
+    text = json.dumps(dict(kind=kind, model=model_version(), **{name: _canonical(value) for name, value in inputs.items()}),
+                      sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def row_keys(kind, rows, **inputs):
+    """
+    Keys of many results of {kind} that differ only in {rows} (tuples of numbers
+    and strings), the other {inputs} are common. Faster than make_key per row.
+    """
+    prefix = make_key(kind, **inputs)
+    return [hashlib.sha256((prefix + repr(tuple(_canonical(value) for value in row))).encode()).hexdigest() for row in rows]
+
+
+def encode_results(results):
+    """
+    Bytes of calcTypes.Results without diagnostics: a JSON line with the
+    message and the number of profile points, then float64 phi, W, E_f and,
+    with a profile, its E_f, E_as and the arrays of profile_columns.
+    """
+    profile = results.profile
+    numbers = [results.phi, results.W, results.E_f]
+    points = None
+    if profile is not None:
+        points = int(np.size(profile.x))
+        numbers += [profile.E_f, profile.E_as]
+        numbers += [value for name in profile_columns for value in np.broadcast_to(getattr(profile, name), (points,))]
+    header = json.dumps(dict(message=results.message, points=points), separators=(',', ':'))
+    return header.encode() + b'\n' + np.asarray(numbers, dtype=float).tobytes()
+
+
+def decode_results(blob):
+    """Results from encode_results bytes; ValueError, KeyError or TypeError if they are damaged."""
+    header, _, data = blob.partition(b'\n')
+    header = json.loads(header)
+    points = header['points']
+    numbers = np.frombuffer(data, dtype=float)
+    if numbers.size != 3 + (0 if points is None else 2 + len(profile_columns)*points):
+        raise ValueError('Wrong size of a stored result')
+    profile = None
+    if points is not None:
+        bands = numbers[5:].reshape(len(profile_columns), points).copy()
+        profile = BandProfile(*bands, float(numbers[3]), float(numbers[4]))
+    return Results(str(header['message']), float(numbers[0]), float(numbers[1]), float(numbers[2]), profile)
+
+
+def default_path():
+    """Database in the user cache directory, $BAND_CACHE overrides it."""
+    if 'BAND_CACHE' in os.environ:
+        return os.environ['BAND_CACHE']
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'microelectronics_phys', 'results.sqlite')
+
+
+class DiskCache:
+    """
+    Content-addressed result cache in the SQLite database {path} (default_path() by default).
+
+    {max_bytes} - size of the stored values after which the least recently
+    used ones are deleted, down to 90% of it.
+    Errors of the database (e.g. a read-only directory) are counted in
+    info() and turn the cache into a no-op instead of failing the calculation.
+    """
+
+    def __init__(self, path=None, max_bytes=256*2**20):
+        self.path = default_path() if path is None else path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        # соединение нельзя переносить в дочерний процесс: после fork открываем новое
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(_schema)
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def get_many(self, keys):
+        """dict: key -> value (bytes) for the stored ones of {keys}."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            try:
+                connection = self._connect()
+                # SQLite ограничивает число параметров запроса
+                for start in range(0, len(keys), 500):
+                    part = keys[start:start + 500]
+                    marks = ','.join('?'*len(part))
+                    for key, value in connection.execute(f'SELECT key, value FROM results WHERE key IN ({marks})', part):
+                        found[key] = bytes(value)
+                if found:
+                    now = time.time()
+                    used = list(found)
+                    connection.execute('BEGIN IMMEDIATE')
+                    for start in range(0, len(used), 500):
+                        part = used[start:start + 500]
+                        connection.execute(f'UPDATE results SET used = ? WHERE key IN ({",".join("?"*len(part))})', [now] + part)
+                    connection.execute('COMMIT')
+            except (sqlite3.Error, OSError):
+                self._rollback()
+                self.errors += 1
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def put_many(self, items):
+        """Store the (key, value) pairs of {items} (values are bytes), then evict old results if too big."""
+        rows = []
+        now = time.time()
+        for key, value in items:
+            blob = bytes(value)
+            rows.append((key, blob, len(blob), now))
+        if not rows:
+            return
+        with self._lock:
+            try:
+                connection = self._connect()
+                connection.execute('BEGIN IMMEDIATE')
+                connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', rows)
+                self._evict(connection)
+                connection.execute('COMMIT')
+            except (sqlite3.Error, OSError):
+                self._rollback()
+                self.errors += 1
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def _evict(self, connection):
+        total, = connection.execute('SELECT bytes FROM total').fetchone()
+        if total <= self.max_bytes:
+            return
+        excess = total - int(0.9*self.max_bytes)
+        old = []
+        for key, size in connection.execute('SELECT key, size FROM results ORDER BY used'):
+            old.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany('DELETE FROM results WHERE key = ?', old)
+
+    def _rollback(self):
+        try:
+            if self._connection is not None and self._connection.in_transaction:
+                self._connection.execute('ROLLBACK')
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self.hits = self.misses = self.errors = 0
+            try:
+                self._connect().execute('DELETE FROM results')
+            except (sqlite3.Error, OSError):
+                self._rollback()
+                self.errors += 1
+
+    def info(self):
+        with self._lock:
+            try:
+                entries, size = self._connect().execute('SELECT COUNT(*), (SELECT bytes FROM total) FROM results').fetchone()
+            except (sqlite3.Error, OSError):
+                entries, size = 0, 0
+                self.errors += 1
+        return dict(hits=self.hits, misses=self.misses, errors=self.errors, size=entries, bytes=size,
+                    max_bytes=self.max_bytes, path=self.path)
+
+    def calculate(self, params, n_points=31, spacing='uniform', engine='depletion', compute=None):
+        """
+        calculatingModule.calculate({params}, {n_points}, {spacing}, {engine}) through the cache.
+        {compute}(params) - what to call on a miss instead, e.g. a calcSession.Session.
+        Diagnostics of the calculation are not stored.
+        """
+        if isinstance(params, dict):
+            params = Params.from_dict(params)
+        key = make_key('calculate', params=params.as_dict(), n_points=n_points, spacing=spacing, engine=engine,
+                       format=results_format)
+        blob = self.get(key)
+        if blob is not None:
+            try:
+                return decode_results(blob)
+            except (ValueError, KeyError, TypeError):
+                # испорченное значение считаем промахом и перезаписываем
+                with self._lock:
+                    self.errors += 1
+                    self.hits -= 1
+                    self.misses += 1
+        if compute is None:
+            results = calculatingModule.calculate(params, n_points, spacing, engine)
+        else:
+            results = compute(params)
+        self.put(key, encode_results(results))
+        return results
+
+    def calculate_batch(self, E_gap, E_d, N_d0, E_as, N_as, T, E_out, mat, m_e=0.5, m_h=0.5, epsilon=10.0,
+                        profile_points=0, engine='depletion', accuracy='exact'):
+        """
+        calculatingModule.calculate_batch through the cache: every row is stored
+        separately, only the rows that are not stored (once per distinct row) are calculated.
+        """
+        columns = dict(zip(Params.names, np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(col, dtype=float)) for col in (E_gap, E_d, N_d0, E_as, N_as, m_e, m_h, epsilon, T, E_out)),
+            np.atleast_1d(np.asarray(mat, dtype=object)))))
+        settings = dict(engine=engine, accuracy=accuracy, profile_points=profile_points)
+        keys = row_keys('batch', zip(*(columns[name].tolist() for name in Params.names)), names=Params.names, **settings)
+        # строка хранится как float64: колонки row_columns, затем полосы профиля
+        width = len(row_columns) + len(profile_columns)*profile_points
+        stored = self.get_many(keys)
+
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in stored:
+                missing.setdefault(key, i)
+        if missing:
+            rows = np.fromiter(missing.values(), dtype=int, count=len(missing))
+            results = calculatingModule.calculate_batch(**{name: values[rows] for name, values in columns.items()}, **settings)
+            table = [np.asarray(results[name], dtype=float)[:, None] for name in row_columns]
+            if profile_points > 0:
+                table += [getattr(results['profile'], name) for name in profile_columns]
+            table = np.ascontiguousarray(np.hstack(table))
+            new = {key: table[j].tobytes() for j, key in enumerate(missing)}
+            self.put_many(new.items())
+            stored.update(new)
+
+        table = np.frombuffer(b''.join(stored[key] for key in keys), dtype=float).reshape(len(keys), width)
+        results = {name: table[:, j].copy() for j, name in enumerate(row_columns)}
+        results['status'] = results['status'].astype(np.int8)
+        results['iterations'] = results['iterations'].astype(int)
+        results['errors'] = results['errors'].astype(np.uint8)
+        if profile_points > 0:
+            bands = table[:, len(row_columns):].reshape(len(keys), len(profile_columns), profile_points)
+            results['profile'] = BandProfile(*(bands[:, j].copy() for j in range(len(profile_columns))),
+                                             results['E_f'], columns['E_as'].astype(float))
+        return results
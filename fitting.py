@@ -0,0 +1,311 @@
+"""
+Surface-state parameters N_as, E_as (and optionally N_d0) from measured phi and W.
+
+    fit = fitting.fit(params, {'T': [200, 250, 300, 350]}, phi=phi_measured, W=W_measured)
+    fit.N_as, fit.E_as, fit.errors['E_as']
+
+Every sample (a row of the measurement arrays) is fitted by Levenberg-Marquardt
+on the residuals (model - measured)/sigma. All samples of a chunk are solved
+together: one calculate_batch call with sensitivities=True per iteration
+gives the model and its analytic Jacobian for every measurement of every
+sample, and the small normal equations are solved for all samples at once.
+Chunks of samples run in a process pool.
+N_as and N_d0 are fitted by their log10, E_as is kept inside [0, E_gap].
+A fit is converged only if its chi^2 agrees with the measurement errors;
+parameters the measurements do not determine get an infinite error.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from fompy import constants
+from scipy.stats import chi2
+
+import calculatingModule
+from calcTypes import Params, E_out_to_cgs
+
+# подбираемые параметры; концентрации подбираем по логарифму
+fit_names = ('N_as', 'E_as', 'N_d0')
+log_names = ('N_as', 'N_d0')
+# сингулярные числа J меньше rcond от наибольшего считаем нулевыми
+rcond = 1e-8
+# chi^2 больше квантиля 1 - significance не совместим с ошибками измерений
+significance = 1e-3
+
+# N_as, E_as, N_d0 - массивы по образцам, errors - их стандартные ошибки из (J^T J)^(-1)
+# (inf, если измерения параметр не определяют), cost - сумма квадратов нормированных невязок (chi^2),
+# dof - число измерений минус число параметров, converged - спуск остановился и chi^2 совместим
+# с ошибками измерений, iterations - итерации Левенберга-Марквардта по всем стартам
+FitResult = namedtuple('FitResult', ['N_as', 'E_as', 'N_d0', 'errors', 'cost', 'dof', 'converged', 'iterations'])
+
+
+class Problem:
+    """
+    Measurements of {n} samples under {m} conditions.
+
+    {bases} - list of calcTypes.Params, one per sample (the fitted values are the
+    initial guess); {conditions} - dict name -> array (n, m) of the parameters
+    that change between measurements; {phi}, {W} - arrays (n, m) of measured
+    values, NaN where not measured; {sigma_phi}, {sigma_W} - their errors;
+    {names} - fitted parameters.
+    """
+
+    def __init__(self, bases, conditions, phi, W, sigma_phi, sigma_W, names):
+        self.bases = [calculatingModule.set_material(base) for base in bases]
+        self.conditions = conditions
+        self.measured = np.concatenate((phi, W), axis=1)
+        self.sigma = np.concatenate((sigma_phi, sigma_W), axis=1)
+        self.mask = np.isfinite(self.measured)
+        self.names = names
+        self.columns = {name: np.array([getattr(base, name) for base in self.bases], dtype=object if name == 'mat' else float)
+                        for name in Params.names}
+        self.E_gap = self.columns['E_gap']
+
+    @property
+    def shape(self):
+        return self.measured.shape[0], self.measured.shape[1] // 2
+
+    def initial(self):
+        """Initial parameters (n, k): the values of the bases."""
+        return np.column_stack([self.to_theta(name, self.columns[name]) for name in self.names])
+
+    def occupied(self):
+        """
+        Electrons on the surface states n_s = Q - E_out/(4 pi e) [cm^(-2)] seen in every
+        measurement (n, 2m): Q = f_left(phi) or N_d0*W; NaN where not measured.
+        """
+        n, m = self.shape
+        values = {name: self.conditions[name] if name in self.conditions else np.repeat(self.columns[name][:, None], m, axis=1)
+                  for name in ('epsilon', 'N_d0', 'E_out')}
+        phi, W = self.measured[:, :m], self.measured[:, m:]
+        Q = np.concatenate((calculatingModule.f_left(phi, values), values['N_d0']*W), axis=1)
+        return Q - np.tile(values['E_out'], 2) * E_out_to_cgs/(4*np.pi*constants.e)
+
+    def to_theta(self, name, value):
+        return np.log10(value) if name in log_names else value
+
+    def from_theta(self, name, theta):
+        return 10.0**theta if name in log_names else theta
+
+    def clip(self, theta, rows):
+        theta = theta.copy()
+        if 'E_as' in self.names:
+            j = self.names.index('E_as')
+            theta[:, j] = np.clip(theta[:, j], 0.0, self.E_gap[rows])
+        return theta
+
+    def evaluate(self, theta, rows, jacobian=True, accuracy='exact'):
+        """
+        Normalized residuals (r, n_rows, 2m) for parameters {theta} (r, k) of
+        samples {rows}, their cost (inf where the model fails at a measurement)
+        and, if {jacobian}, the Jacobian (r, 2m, k).
+        """
+        n, m = len(rows), self.shape[1]
+        columns = {}
+        for name in Params.names:
+            columns[name] = np.repeat(self.columns[name][rows], m)
+        for name, values in self.conditions.items():
+            columns[name] = values[rows].ravel()
+        for j, name in enumerate(self.names):
+            columns[name] = np.repeat(self.from_theta(name, theta[:, j]), m)
+        results = calculatingModule.calculate_batch(**columns, accuracy=accuracy, sensitivities=jacobian)
+
+        model = np.concatenate((results['phi'].reshape(n, m), results['W'].reshape(n, m)), axis=1)
+        mask = self.mask[rows]
+        residual = np.where(mask, (model - self.measured[rows]) / self.sigma[rows], 0.0)
+        with np.errstate(invalid='ignore'):
+            cost = np.where(np.isfinite(residual).all(axis=1), (residual**2).sum(axis=1), np.inf)
+        if not jacobian:
+            return residual, cost, None
+
+        J = np.zeros((n, 2*m, len(self.names)))
+        for j, name in enumerate(self.names):
+            d = np.concatenate((results['dphi'][name].reshape(n, m), results['dW'][name].reshape(n, m)), axis=1)
+            if name in log_names:
+                # производная по log10 параметра
+                d = d * np.log(10) * np.repeat(self.from_theta(name, theta[:, j]), 2*m).reshape(n, 2*m)
+            J[:, :, j] = np.where(mask, d / self.sigma[rows], 0.0)
+        return residual, cost, J
+
+
+def solve_chunk(problem, theta0, rows, maxiter=100, xtol=1e-10, ftol=1e-10, atol=1e-10, accuracy='exact'):
+    """
+    Levenberg-Marquardt from all initial guesses {theta0} (r, k) at once,
+    {rows} - the sample of {problem} of every guess.
+    Returns (theta, cost, J, converged, iterations).
+    """
+    n, k = theta0.shape
+    theta = problem.clip(theta0, rows)
+    residual, cost, J = problem.evaluate(theta, rows, accuracy=accuracy)
+    lam = np.full(n, 1e-3)
+    converged = np.zeros(n, dtype=bool)
+    # в недопустимой начальной точке (модель не считается) подбирать не из чего
+    failed = ~np.isfinite(cost)
+    iterations = np.zeros(n, dtype=int)
+
+    for _ in range(maxiter):
+        active = np.flatnonzero(~converged & ~failed)
+        if not active.size:
+            break
+        iterations[active] += 1
+        Ja, ra = J[active], residual[active]
+        A = np.einsum('rij,rik->rjk', Ja, Ja)
+        g = np.einsum('rij,ri->rj', Ja, ra)
+        # демпфирование Марквардта: по диагонали, чтобы не зависеть от масштаба параметров
+        diagonal = np.einsum('rjj->rj', A)
+        damped = A + (lam[active, None] * np.maximum(diagonal, 1e-12))[:, :, None] * np.eye(k)
+        step = -np.linalg.solve(damped, g[:, :, None])[:, :, 0]
+        trial = problem.clip(theta[active] + step, rows[active])
+
+        r_t, cost_t, J_t = problem.evaluate(trial, rows[active], accuracy=accuracy)
+        better = cost_t < cost[active]
+        accepted = active[better]
+        decrease = cost[accepted] - cost_t[better]
+        moved = np.abs(trial[better] - theta[accepted]).max(axis=1)
+        theta[accepted], residual[accepted], J[accepted] = trial[better], r_t[better], J_t[better]
+        cost[accepted] = cost_t[better]
+        lam[accepted] /= 10
+        lam[active[~better]] *= 10
+
+        # невязки нормированы на ошибки измерений, поэтому изменение chi^2 меньше atol уже ничего не значит
+        converged[accepted] |= (moved <= xtol) | (decrease <= ftol*cost[accepted] + atol)
+        # шаг не уменьшает невязку даже при сильном демпфировании - это минимум
+        converged[active[~better]] |= lam[active[~better]] > 1e10
+    return theta, cost, J, converged & np.isfinite(cost), iterations
+
+
+def grid_start(problem, theta0, grid, N_as_range, starts=3, accuracy='fast'):
+    """
+    Initial guesses (n, {starts}, k): the best of {theta0} and a {grid} x {grid} grid
+    of log10 N_as in {N_as_range} and E_as over the gap (N_d0 as in {theta0}),
+    plus a row of the grid at N_as equal to the largest measured surface charge.
+    """
+    n, k = theta0.shape
+    names = problem.names
+    candidates = [theta0]
+    # при заполненных акцепторах N_as равно заряду на поверхности, а долина невязки
+    # по log10 N_as уже шага сетки: эту строку сетки берем прямо из измерений
+    with np.errstate(invalid='ignore', divide='ignore'):
+        occupied = np.log10(np.nanmax(np.where(problem.mask, problem.occupied(), np.nan), axis=1))
+    if 'N_as' in names:
+        occupied = np.where(np.isfinite(occupied), occupied, theta0[:, names.index('N_as')])
+    log_Ns = list(np.linspace(np.log10(N_as_range[0]), np.log10(N_as_range[1]), grid)) + [occupied]
+    for log_N in log_Ns:
+        for fraction in (np.arange(grid) + 0.5) / grid:
+            theta = theta0.copy()
+            if 'N_as' in names:
+                theta[:, names.index('N_as')] = log_N
+            if 'E_as' in names:
+                theta[:, names.index('E_as')] = fraction * problem.E_gap
+            candidates.append(theta)
+    candidates = np.stack(candidates, axis=1)
+    c = candidates.shape[1]
+    # все кандидаты всех образцов - одним расчетом, как будто это отдельные образцы
+    rows = np.repeat(np.arange(n), c)
+    _, cost, _ = problem.evaluate(candidates.reshape(n*c, k), rows, jacobian=False, accuracy=accuracy)
+    best = np.argsort(np.where(np.isfinite(cost), cost, np.inf).reshape(n, c), axis=1, kind='stable')[:, :starts]
+    return candidates[np.arange(n)[:, None], best]
+
+
+def fit_chunk(problem, grid=8, N_as_range=(1e10, 1e15), starts=3, maxiter=100, accuracy='exact'):
+    """Fit all samples of {problem}, returns FitResult."""
+    theta = problem.initial()[:, None, :]
+    if grid > 0:
+        theta = grid_start(problem, theta[:, 0], grid, N_as_range, starts)
+    n, starts, k = theta.shape
+    # E_as и N_as входят в баланс почти одной комбинацией, поэтому у невязки бывают
+    # ложные минимумы: спускаемся из нескольких лучших точек сетки и берем лучший итог
+    rows = np.repeat(np.arange(n), starts)
+    theta, cost, J, converged, iterations = solve_chunk(problem, theta.reshape(n*starts, k), rows, maxiter, accuracy=accuracy)
+    best = np.arange(n)*starts + np.argmin(cost.reshape(n, starts), axis=1)
+    theta, cost, J, converged = theta[best], cost[best], J[best], converged[best]
+    iterations = iterations.reshape(n, starts).sum(axis=1)
+
+    # ковариация (J^T J)^(-1) через SVD: направления с сингулярным числом ниже rcond от
+    # наибольшего данные не определяют, ошибка входящих в них параметров бесконечна
+    finite = np.isfinite(J).all(axis=(1, 2))
+    _, singular, Vt = np.linalg.svd(np.where(finite[:, None, None], J, 0.0), full_matrices=False)
+    null = singular <= rcond * singular[:, :1]
+    inverse = np.where(null, 0.0, 1/np.where(null, 1.0, singular))**2
+    variance = np.einsum('rij,ri->rj', Vt**2, inverse)
+    unidentified = (null[:, :, None] & (np.abs(Vt) > np.sqrt(rcond))).any(axis=1)
+    variance = np.where(unidentified, np.inf, variance)
+    variance[~finite] = np.nan
+    values, errors = {}, {}
+    for name in fit_names:
+        if name in problem.names:
+            j = problem.names.index(name)
+            values[name] = problem.from_theta(name, theta[:, j])
+            sigma = np.sqrt(variance[:, j])
+            # ошибка log10 N переводится в ошибку N линейно
+            errors[name] = sigma * np.log(10) * values[name] if name in log_names else sigma
+        else:
+            values[name] = problem.columns[name]
+    dof = problem.mask.sum(axis=1) - k
+    # остановка в ложном минимуме тоже "сходится": верим только chi^2, совместимому с ошибками измерений
+    with np.errstate(invalid='ignore'):
+        converged &= ~(cost > chi2.isf(significance, np.maximum(dof, 1)))
+    return FitResult(values['N_as'], values['E_as'], values['N_d0'], errors, cost, dof, converged, iterations)
+
+
+def merge(results):
+    """One FitResult from FitResults of consecutive chunks."""
+    fields = {}
+    for field in FitResult._fields:
+        if field == 'errors':
+            fields[field] = {name: np.concatenate([r.errors[name] for r in results]) for name in results[0].errors}
+        else:
+            fields[field] = np.concatenate([getattr(r, field) for r in results])
+    return FitResult(**fields)
+
+
+def fit(base, conditions, phi=None, W=None, sigma_phi=0.01, sigma_W=None, fit_N_d0=False, grid=8,
+        N_as_range=(1e10, 1e15), starts=3, maxiter=100, accuracy='exact', chunk_size=64, workers=None):
+    """
+    Fit N_as and E_as (and N_d0 if {fit_N_d0}) of every sample to measured phi and W.
+
+    {base} - calcTypes.Params for all samples or a list with one per sample;
+    its fitted values are also a candidate initial guess.
+    {conditions} - dict name -> values of the measurement conditions
+    (e.g. T or E_out), shape (m,) for all samples or (n, m).
+    {phi} [eV], {W} [cm] - measurements, shape (n, m) (or (m,) for one sample),
+    NaN where not measured; at least one of them is needed.
+    {sigma_phi} [eV], {sigma_W} [cm] - measurement errors (scalars or arrays),
+    by default 0.01 eV and 5% of W.
+    {grid} - the initial guess is the best point of a {grid} x {grid} grid of
+    N_as in {N_as_range} and E_as over the gap (0 - start from {base}); the fit
+    starts from the {starts} best points and keeps the best result.
+    Samples are fitted in chunks of {chunk_size} in a pool of {workers} processes
+    (None - all cores, 0 - in this process).
+
+    Returns FitResult of arrays with one value per sample.
+    """
+    if phi is None and W is None:
+        raise ValueError('Nothing to fit: give phi and/or W')
+    shape = np.atleast_2d(phi if phi is not None else W).shape
+    phi = np.full(shape, np.nan) if phi is None else np.atleast_2d(np.asarray(phi, dtype=float))
+    W = np.full(shape, np.nan) if W is None else np.atleast_2d(np.asarray(W, dtype=float))
+    if phi.shape != W.shape:
+        raise ValueError('phi and W must have the same shape')
+    n, m = shape
+    sigma_phi = np.broadcast_to(np.asarray(sigma_phi, dtype=float), shape)
+    sigma_W = np.broadcast_to(0.05*W if sigma_W is None else np.asarray(sigma_W, dtype=float), shape)
+    bases = [base]*n if isinstance(base, Params) else list(base)
+    if len(bases) != n:
+        raise ValueError(f'{len(bases)} base parameter sets for {n} samples')
+    names = fit_names if fit_N_d0 else fit_names[:2]
+    for name in conditions:
+        if name not in Params.names or name == 'mat' or name in names:
+            raise ValueError(f'Unknown condition: {name}')
+    conditions = {name: np.broadcast_to(np.asarray(values, dtype=float), shape) for name, values in conditions.items()}
+
+    problems = [Problem(bases[start:start + chunk_size], {name: values[start:start + chunk_size] for name, values in conditions.items()},
+                        phi[start:start + chunk_size], W[start:start + chunk_size],
+                        sigma_phi[start:start + chunk_size], sigma_W[start:start + chunk_size], names)
+                for start in range(0, n, chunk_size)]
+    arguments = (grid, N_as_range, starts, maxiter, accuracy)
+    if workers == 0 or len(problems) == 1:
+        return merge([fit_chunk(problem, *arguments) for problem in problems])
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return merge(list(pool.map(fit_chunk, problems, *([argument]*len(problems) for argument in arguments))))
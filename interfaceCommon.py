@@ -0,0 +1,119 @@
+"""
+Logic shared by interfaceL and interfaceW: prefetch neighbours of the sliders,
+calculations for CalcWorker and the requests and drawing of the phase map.
+
+Never imports PySimpleGUI: the window, its values and the plots are passed in.
+"""
+import numpy as np
+
+import calcSession
+import diskCache
+import phaseMap
+from calcTypes import Params, Results
+
+# шаги слайдеров (resolution в settings_col): соседние положения считаются заранее
+slider_steps = (0.01, 0.01, 0.1, 0.01, 0.1, 0.01, 0.01, 0.1, 1, 1)
+# сдвинутый слайдер считаем на столько шагов в обе стороны, остальные - на один шаг
+prefetch_depth = 3
+# слайдеры, заблокированные у готовых материалов (см. block_unblock_properties_SC)
+locked_sliders = (0, 5, 6, 7)
+# параметры, которые можно отложить по осям карты
+map_names = [name for name in Params.names if name != 'mat']
+
+
+def neighbours(vals, mat, get_params, moved=None):
+    """
+    Params a few slider steps away from {vals}, most likely first:
+    the slider {moved} (e.g. 'SL9') up to prefetch_depth steps on both sides,
+    then one step of every other unlocked slider.
+    {get_params}(vals, mat) - getParams of the interface.
+    """
+    vals = [float(v) for v in vals]
+
+    def shifted(i, k):
+        new = list(vals)
+        new[i] = round(vals[i] + k*slider_steps[i], 10)
+        return get_params(new, mat)
+
+    first = int(moved[2:]) - 1 if moved else None
+    result = []
+    if first is not None:
+        for k in range(1, prefetch_depth + 1):
+            result += [shifted(first, k), shifted(first, -k)]
+    for i in range(10):
+        if i != first and not (mat != 'custom' and i in locked_sliders):
+            result += [shifted(i, 1), shifted(i, -1)]
+    return result
+
+
+class Calculator:
+    """
+    calculate and prefetch for CalcWorker: both go through one calcSession.Session
+    (used only from the worker thread), only calculate uses the disk cache.
+    {disk_cache} - diskCache.DiskCache, the default one if None;
+    {diagnostics} - collect diagnostics of the calculations (switched by the interface).
+    """
+
+    def __init__(self, disk_cache=None):
+        self.session = calcSession.Session()
+        # результаты прошлых сеансов и других программ: пресеты SetMat считаются один раз
+        self.disk_cache = diskCache.DiskCache() if disk_cache is None else disk_cache
+        self.diagnostics = False
+
+    def calculate(self, params):
+        try:
+            return self.disk_cache.calculate(params, compute=lambda p: self.session.calculate(p, diagnostics=self.diagnostics))
+        except Exception as error:
+            return Results('Ошибка! ' + str(error))
+
+    def prefetch(self, params):
+        # соседние положения слайдеров считаем мимо диска: в постоянный кэш
+        # попадают только результаты, которые пользователь запросил
+        try:
+            return self.session.calculate(params, diagnostics=self.diagnostics)
+        except Exception as error:
+            return Results('Ошибка! ' + str(error))
+
+
+def map_choices(x_name, y_name):
+    """Parameters offered on the X and Y axes: each axis excludes the one on the other."""
+    return [name for name in map_names if name != y_name], [name for name in map_names if name != x_name]
+
+
+def map_request(base, values):
+    """
+    Arguments of phaseMap.progressive: parameters {base} from the sliders and
+    the axes from the Map tab {values}. Raises ValueError on bad input.
+    """
+    n = int(values['-MAPN-'])
+    if n < 2:
+        raise ValueError('n < 2')
+    if values['-MAPX-'] == values['-MAPY-']:
+        raise ValueError('X = Y')
+    x = phaseMap.axis(values['-MAPX-'], float(values['-MAPX0-']), float(values['-MAPX1-']), n)
+    y = phaseMap.axis(values['-MAPY-'], float(values['-MAPY0-']), float(values['-MAPY1-']), n)
+    return base, values['-MAPX-'], x, values['-MAPY-'], y
+
+
+def compute_map(request):
+    # вызывается в фоновом потоке StreamWorker, отдает карты от грубой к подробной
+    return phaseMap.progressive(*request)
+
+
+def map_axis(name, values):
+    if name in phaseMap.log_names:
+        return np.log10(values), 'log10 ' + name
+    return values, name
+
+
+def draw_map(window, map_plot, map_last, values):
+    """Draw {map_last} - (request, stride, maps) of compute_map - on plotModel.MapPlot {map_plot}."""
+    if map_last is None:
+        return
+    (base, x_name, x, y_name, y), stride, maps = map_last
+    quantity = values['-MAPQ-']
+    x, x_label = map_axis(x_name, x[::stride])
+    y, y_label = map_axis(y_name, y[::stride])
+    map_plot.update(x, y, maps[quantity], quantity, x_label, y_label, filled=values['-MAPFILL-'] and stride == 1)
+    rows, cols = maps[quantity].shape
+    window['-MAPINFO-'].update(f'{cols} x {rows} points' + (', refining...' if stride > 1 else ''), text_color='black')
@@ -4,57 +4,46 @@ import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib
-import calculatingModule
+import time
+import diagnostics
+import interfaceCommon
+import phaseMap
+from calcTypes import Params
+from calcWorker import CalcWorker, StreamWorker
+from plotModel import BandPlot, MapPlot
 matplotlib.use('TkAgg')
 
 # coef_phys_parameters on interface
 cpp = {'N_d0': 1e12, 'N_as': 1e13, 'E_out': 1e4}
 
-def draw_figure(ax, figure_canvas_agg, results):
+def getParams(vals, mat):
     """
-    Redraw plot for each new event.
-    
-    {ax} is responsible for adjusting of the plot
-    
-    {figure_canvas_agg} helps draw plot in the window-interface
+    {vals} - values of the 10 parameters as in update_sliders, {mat} - material
     """
-    
-    ax.cla()                 
-    ax.set_xlabel("x [cm]")
-    ax.set_ylabel("E [eV]")
-    ax.grid()
-# update plots
-    if results['message'] == 'ok':
-        ax.plot(results['x_s'], results['E_f_s'], label='Fermi Energy')
-        ax.plot(results['x_s'], results['E_v_s'], label='Valence Band')
-        ax.plot(results['x_s'], results['E_c_s'], label='Conduction Band')
-        ax.plot(results['x_s'], results['E_d_s'], label='Donor Energy')
-        ax.plot(results['x_s'], results['E_as_s'], label='Acceptor Energy')
-        ax.axhline(results['phi'], c='k', linestyle='dashed')
-        ax.text(0.002, results['phi'] + 0.02, 'phi = '+str(round(results['phi'], 4)) + ' [eV]')
-        ax.axvline(results['W'], c='k', linestyle='dashed')
-        ax.text(results['W']+0.0001, 0.2, 'W = '+str(round(results['W'], 4)) + ' [cm]')
-        ax.legend(bbox_to_anchor=(1., 0.5), fontsize=10, loc='right')
-    
-    figure_canvas_agg.draw()
+    return Params(
+        E_gap=float(vals[0]),    # Band gap [eV]
+        E_d=float(vals[1]),    # Donors level [eV]
+        N_d0=float(vals[2])*cpp['N_d0'],    # Concentration of donors 10^27 [cm^(-3)]
+        E_as=float(vals[3]),    # Surface acceptors level [eV]
+        N_as=float(vals[4])*cpp['N_as'],    # Concentration of surface acceptors 10^27 [cm^(-3)]
+        m_e=float(vals[5]),    # Effective electron mass [m_0]
+        m_h=float(vals[6]),    # Effective hole mass [m_0]
+        epsilon=float(vals[7]),    # Dielectric permittivity
+        T=float(vals[8]),    # Temperature [K]
+        E_out=float(vals[9])*cpp['E_out'],   # External electric field
+        mat=mat           # Material
+    )
 
-def getCalculatedValues(values):
-    args = {
-        "E_gap":   float(values['-IN1-']),    # Band gap [eV]
-        "E_d":     float(values['-IN2-']),    # Donors level [eV]
-        "N_d0":    float(values['-IN3-'])*cpp['N_d0'],    # Concentration of donors 10^27 [cm^(-3)]
-        "E_as":    float(values['-IN4-']),    # Surface acceptors level [eV]
-        "N_as":    float(values['-IN5-'])*cpp['N_as'],    # Concentration of surface acceptors 10^27 [cm^(-3)]
-        "m_e":     float(values['-IN6-']),    # Effective electron mass [m_0]
-        "m_h":     float(values['-IN7-']),    # Effective hole mass [m_0]
-        "epsilon": float(values['-IN8-']),    # Dielectric permittivity
-        "T":       float(values['-IN9-']),    # Temperature [K]
-        "E_out":   float(values['-IN10-'])*cpp['E_out'],   # External electric field
-        "mat":     values['-Mats-']           # Material
-    }
-    
-    return calculatingModule.calculate(args)
+# calculate и prefetch для CalcWorker; diagnostics включается галочкой Diagnostics
+calculator = interfaceCommon.Calculator()
+# последняя полученная карта: (аргументы phaseMap.progressive, шаг, карты)
+map_last = None
 
+def update_map_names(values):
+    # на каждой оси нельзя выбрать параметр, отложенный по другой
+    x_names, y_names = interfaceCommon.map_choices(values['-MAPX-'], values['-MAPY-'])
+    window['-MAPX-'].update(value=values['-MAPX-'], values=x_names)
+    window['-MAPY-'].update(value=values['-MAPY-'], values=y_names)
 
 # handling of events
 def update_sliders(vals):
@@ -100,10 +89,10 @@ def block_unblock_properties_SC(block):
         window['I10'].update('unlock.png', size=simg)
     
 def output_info(results):
-    if results['message'] != 'ok':
-            window['-PlotINFO-'].update(results['message'], text_color='red', background_color='yellow')
+    if not results.ok:
+            window['-PlotINFO-'].update(results.message, text_color='red', background_color='yellow')
     else:
-        window['-PlotINFO-'].update(f"bending of zone phi:          {results['phi']:.4f} [eV]\nSpace charge region W:     {results['W']:.4f} [cm]", text_color='black', background_color='white')
+        window['-PlotINFO-'].update(f"bending of zone phi:          {results.phi:.4f} [eV]\nSpace charge region W:     {results.W:.4f} [cm]", text_color='black', background_color='white')
 
 # set theme for the window-interface
 sg.theme('LightGrey2') 
@@ -121,6 +110,8 @@ plot_col =\
 [
     [sg.Canvas(key='-CANVAS-', size=(640, 640))],
     [sg.Text('', key='-PlotINFO-', size=(60, 3), pad=((75, 0), (15, 0)), font=('Helvetica', 15), justification='c')],
+    [sg.Checkbox('Diagnostics', key='-DIAGON-', default=False, enable_events=True, pad=((75, 0), (5, 0)))],
+    [sg.Text('', key='-DIAG-', size=(60, 12), pad=((75, 0), (5, 0)), font=('Courier', 10), visible=False)],
 ]
 
 # define settings column for layout
@@ -245,11 +236,30 @@ settings_col =\
     ]])],
 ]
 
+# карта phi, W и пиннинга по двум параметрам (phaseMap)
+map_col =\
+[
+    [sg.Canvas(key='-MAPCANVAS-', size=(640, 500))],
+    [sg.Text('X:', size=(3, 1), font=font),
+     sg.Combo(interfaceCommon.map_choices('N_as', 'E_as')[0], key='-MAPX-', default_value='N_as', size=(8, 1),
+              font=font, readonly=True, enable_events=True),
+     sg.Input('1e12', key='-MAPX0-', size=(8, 1), font=font), sg.Input('1e15', key='-MAPX1-', size=(8, 1), font=font)],
+    [sg.Text('Y:', size=(3, 1), font=font),
+     sg.Combo(interfaceCommon.map_choices('N_as', 'E_as')[1], key='-MAPY-', default_value='E_as', size=(8, 1),
+              font=font, readonly=True, enable_events=True),
+     sg.Input('0.1', key='-MAPY0-', size=(8, 1), font=font), sg.Input('1', key='-MAPY1-', size=(8, 1), font=font)],
+    [sg.Text('Points:', font=font), sg.Input('500', key='-MAPN-', size=(5, 1), font=font),
+     sg.Combo(phaseMap.quantities, key='-MAPQ-', default_value='pinning', size=(8, 1), font=font, enable_events=True),
+     sg.Checkbox('contours', key='-MAPFILL-', default=True, enable_events=True, font=font),
+     sg.Button('Map', key='-MAPGO-', font=font)],
+    [sg.Text('', key='-MAPINFO-', size=(50, 1), font=font)],
+]
+
 # define whole layout
 layout =\
 [
     [sg.Menu(menu_def)],
-    [sg.Column(plot_col, vertical_alignment='top', justification='C', expand_x=True, size=(800, 800)),
+    [sg.Column([[sg.TabGroup([[sg.Tab('Bands', plot_col), sg.Tab('Map', map_col)]])]], vertical_alignment='top', justification='C', expand_x=True, size=(800, 800)),
     sg.VerticalSeparator(color='006699'),
     sg.Column(settings_col, vertical_alignment='top', justification='C', size=(1000, 800))],
 ]
@@ -269,6 +279,19 @@ ax.set_ylabel("E [eV]")
 figure_canvas_agg = FigureCanvasTkAgg(fig, window['-CANVAS-'].TKCanvas)
 # Adjust placement of the canvas
 figure_canvas_agg.get_tk_widget().pack(side='top', fill='both', expand=1)
+# Plot artists are created once and updated on every new result
+plot = BandPlot(ax, figure_canvas_agg)
+# Figure of the Map tab
+map_fig = matplotlib.figure.Figure(figsize=(6, 5), dpi=100)
+map_canvas = FigureCanvasTkAgg(map_fig, window['-MAPCANVAS-'].TKCanvas)
+map_canvas.get_tk_widget().pack(side='top', fill='both', expand=1)
+map_plot = MapPlot(map_fig.add_subplot(), map_canvas)
+
+# calculations run in background thread, results come as '-RESULT-' events
+# готовые результаты и соседние положения слайдеров, посчитанные заранее
+worker = CalcWorker(window, calculator.calculate, cache_size=512, prefetch=calculator.prefetch)
+# карты считаются в своем потоке и приходят по уровням как события '-MAP-'
+map_worker = StreamWorker(window, interfaceCommon.compute_map, '-MAP-')
 
 # handling of events
 while True:
@@ -280,19 +303,59 @@ while True:
     if event in ('SL1', 'SL2', 'SL3', 'SL4', 'SL5', 'SL6', 'SL7', 'SL8', 'SL9', 'SL10'):
         vals = (values['SL1'], values['SL2'], values['SL3'], values['SL4'], values['SL5'],
                 values['SL6'], values['SL7'], values['SL8'], values['SL9'],values['SL10'])
+        # округляем, чтобы значения совпадали с посчитанными заранее соседями
+        vals = tuple(round(float(v), 10) for v in vals)
         update_inputs(vals)
-        results = getCalculatedValues(values)
-        draw_figure(ax, figure_canvas_agg, results)
-        output_info(results)
+        worker.submit(getParams(vals, values['-Mats-']), interfaceCommon.neighbours(vals, values['-Mats-'], getParams, event))
     
     if event == 'Draw':
         vals = (values['-IN1-'], values['-IN2-'], values['-IN3-'], values['-IN4-'], values['-IN5-'], 
                 values['-IN6-'], values['-IN7-'], values['-IN8-'], values['-IN9-'], values['-IN10-'])
         update_sliders(vals)
-        results = getCalculatedValues(values)
-        draw_figure(ax, figure_canvas_agg, results)
-        output_info(results)
+        worker.submit(getParams(vals, values['-Mats-']), interfaceCommon.neighbours(vals, values['-Mats-'], getParams))
+    
+    if event == '-RESULT-':
+        # результат приходит из фонового потока; устаревшие уже отброшены
+        request_id, params, results = values['-RESULT-']
+        if worker.is_latest(request_id):
+            start = time.perf_counter()
+            plot.update(results)
+            output_info(results)
+            if calculator.diagnostics:
+                diagnostics.stats.add_stage('plot', time.perf_counter() - start)
+                cache, disk = worker.cache.info(), calculator.disk_cache.info()
+                window['-DIAG-'].update(diagnostics.stats.summary() + f"\nprefetch cache: {cache['hits']} hits, {cache['misses']} misses, {cache['size']} results"
+                                        + f"\ndisk cache: {disk['hits']} hits, {disk['misses']} misses, {disk['size']} results, {disk['bytes']/2**20:.1f} MB")
+    
+    if event == '-MAPGO-':
+        vals = (values['SL1'], values['SL2'], values['SL3'], values['SL4'], values['SL5'],
+                values['SL6'], values['SL7'], values['SL8'], values['SL9'], values['SL10'])
+        try:
+            map_worker.submit(interfaceCommon.map_request(getParams(vals, values['-Mats-']), values))
+            window['-MAPINFO-'].update('calculating...', text_color='black')
+        except ValueError as error:
+            window['-MAPINFO-'].update('Ошибка! Неверные параметры карты (' + str(error) + ')', text_color='red')
     
+    if event == '-MAP-':
+        request_id, request, level = values['-MAP-']
+        if map_worker.is_latest(request_id):
+            if isinstance(level, Exception):
+                window['-MAPINFO-'].update('Ошибка! ' + str(level), text_color='red')
+            else:
+                map_last = (request,) + level
+                interfaceCommon.draw_map(window, map_plot, map_last, values)
+    
+    if event in ('-MAPX-', '-MAPY-'):
+        update_map_names(values)
+
+    if event in ('-MAPQ-', '-MAPFILL-'):
+        interfaceCommon.draw_map(window, map_plot, map_last, values)
+
+    if event == '-DIAGON-':
+        calculator.diagnostics = values['-DIAGON-']
+        diagnostics.stats.reset()
+        window['-DIAG-'].update('', visible=calculator.diagnostics)
+
     if event == 'SetMat':
         """
         vals = (E_gap, E_d, N_d0, E_as, N_as, m_e, m_h, epsilon, T, E_out)
@@ -334,4 +397,6 @@ while True:
     if event == 'About...':
         sg.popup(help_text, title='Help', font=font, line_width=80, background_color='#ffffe8')
  
+worker.stop()
+map_worker.stop()
 window.close()
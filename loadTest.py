@@ -0,0 +1,134 @@
+"""
+Load test of calcServer:
+
+    python -m loadTest --spawn                                   # start a server on a free port, test, stop it
+    python -m loadTest --port 8765 -c 64 -n 20000 --distinct 500
+
+{concurrency} keep-alive connections send {requests} POST /calculate in
+total; points are drawn from {distinct} seeded ones around the presets of
+benchmark, so both batching and the cache of the server are exercised.
+Prints client-side latency percentiles and throughput, then /metrics of the server.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import benchmark
+
+
+def make_points(distinct, seed=0):
+    """JSON bodies of {distinct} points of all benchmark presets."""
+    points = [p for mat in benchmark.presets for p in benchmark.corpus(mat, -(-distinct // len(benchmark.presets)), seed)]
+    return [json.dumps(p.as_dict()).encode() for p in points[:distinct]]
+
+
+class Connection:
+    """Keep-alive HTTP/1.1 connection to the server."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b''):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n'
+                          f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+
+async def run(host, port, requests=10000, concurrency=32, distinct=1000, seed=0):
+    """Send the requests; returns (latencies [s], statuses, wall time [s], metrics of the server)."""
+    bodies = make_points(distinct, seed)
+    order = np.random.default_rng(seed).integers(len(bodies), size=requests)
+    latencies = np.empty(requests)
+    statuses = np.empty(requests, dtype=int)
+    counter = iter(range(requests))
+
+    async def client():
+        connection = Connection(host, port)
+        try:
+            # каждый клиент берет следующий номер запроса, пока они не кончатся
+            for i in counter:
+                started = time.perf_counter()
+                statuses[i], _ = await connection.request('POST', '/calculate', bodies[order[i]])
+                latencies[i] = time.perf_counter() - started
+        finally:
+            await connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    connection = Connection(host, port)
+    _, metrics = await connection.request('GET', '/metrics')
+    await connection.close()
+    return latencies, statuses, wall, metrics
+
+
+def spawn_server(window):
+    """calcServer in a child process on a free port of localhost: (process, port)."""
+    process = subprocess.Popen([sys.executable, '-m', 'calcServer', '--port', '0', '--window', str(window)],
+                               stderr=subprocess.PIPE, text=True)
+    line = process.stderr.readline()
+    if 'Listening on' not in line:
+        process.kill()
+        raise RuntimeError('server did not start: ' + line)
+    return process, int(line.rsplit(':', 1)[1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m loadTest', description='Load test of calcServer.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--spawn', action='store_true', help='start a server for the test (on a free port)')
+    parser.add_argument('--window', type=float, default=2.0, help='batching window of the spawned server [ms]')
+    parser.add_argument('-n', '--requests', type=int, default=10000)
+    parser.add_argument('-c', '--concurrency', type=int, default=32)
+    parser.add_argument('--distinct', type=int, default=1000, help='number of different points')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.spawn:
+        process, args.port = spawn_server(args.window)
+    try:
+        latencies, statuses, wall, metrics = asyncio.run(run(args.host, args.port, args.requests, args.concurrency,
+                                                             args.distinct, args.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    p50, p90, p99 = np.percentile(latencies * 1e3, (50, 90, 99))
+    print(f'{args.requests} requests, {args.concurrency} connections, {args.distinct} distinct points: '
+          f'{wall:.2f} s, {args.requests / wall:.0f} requests/s')
+    print(f'latency ms: p50 {p50:.2f}, p90 {p90:.2f}, p99 {p99:.2f}, max {latencies.max()*1e3:.2f}')
+    failed = int(np.count_nonzero(statuses != 200))
+    if failed:
+        print(f'{failed} requests failed', file=sys.stderr)
+    print('server:', json.dumps(metrics, indent=1))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Maps of phi, W and the Fermi level pinning over a grid of two parameters.
+
+    x = phaseMap.axis('N_as', 1e12, 1e15, 500)
+    y = phaseMap.axis('E_as', 0.1, 1.0, 500)
+    for stride, maps in phaseMap.progressive(params, 'N_as', x, 'E_as', y):
+        ...  # every 'stride'-th row and column, coarse maps first
+
+Points are evaluated with calculatingModule.calculate_batch; every
+refinement level computes only the points that the coarser ones did not.
+"""
+import numpy as np
+
+import calculatingModule
+from calcTypes import Params
+from continuation import log_names
+
+# величины карты; pinning = E_f - E_as на поверхности, около нуля уровень Ферми закреплен акцепторами
+quantities = ('phi', 'W', 'E_f', 'pinning')
+
+
+def axis(name, lo, hi, n, scale=None):
+    """{n} values of {name} from {lo} to {hi}; {scale} 'log' or 'linear', by default 'log' for log_names."""
+    if name not in Params.names or name == 'mat':
+        raise ValueError(f'Unknown map parameter: {name}')
+    if scale is None:
+        scale = 'log' if name in log_names else 'linear'
+    if scale == 'log':
+        if lo <= 0 or hi <= 0:
+            raise ValueError(f'{name} must be positive on a log scale')
+        return np.logspace(np.log10(lo), np.log10(hi), n)
+    if scale == 'linear':
+        return np.linspace(lo, hi, n)
+    raise ValueError(f'Unknown scale: {scale}')
+
+
+def evaluate(base, x_name, x_values, y_name, y_values, rows, cols, engine='depletion'):
+    """
+    Calculate the grid points ({rows}[i], {cols}[i]): {base} (calcTypes.Params) with
+    {y_name} = {y_values}[row] and {x_name} = {x_values}[col].
+    Returns dict of flat arrays: phi, W, E_f, pinning and status.
+    """
+    if x_name == y_name:
+        raise ValueError(f'Both map axes are {x_name}')
+    columns = base.as_dict()
+    columns[x_name] = np.asarray(x_values, dtype=float)[cols]
+    columns[y_name] = np.asarray(y_values, dtype=float)[rows]
+    results = calculatingModule.calculate_batch(**columns, engine=engine)
+    # E_as меряется от потолка валентной зоны, а на поверхности зоны подняты на phi
+    E_as = np.broadcast_to(columns['E_as'], results['phi'].shape)
+    results['pinning'] = results['E_f'] - E_as - results['phi']
+    return {name: results[name] for name in quantities + ('status',)}
+
+
+def empty_maps(shape):
+    maps = {name: np.full(shape, np.nan) for name in quantities}
+    maps['status'] = np.full(shape, calculatingModule.STATUS_INVALID, dtype=np.int8)
+    return maps
+
+
+def compute_map(base, x_name, x_values, y_name, y_values, engine='depletion'):
+    """Maps of shape (len({y_values}), len({x_values})) in one batch, see evaluate."""
+    shape = (len(y_values), len(x_values))
+    rows, cols = np.indices(shape).reshape(2, -1)
+    maps = empty_maps(shape)
+    for name, values in evaluate(base, x_name, x_values, y_name, y_values, rows, cols, engine).items():
+        maps[name].flat[:] = values
+    return maps
+
+
+def strides(shape, coarse=32):
+    """Strides of the refinement levels: powers of two down to 1, the first one gives about {coarse} points per side."""
+    stride = 1
+    while max(shape) // (2*stride) >= coarse:
+        stride *= 2
+    result = []
+    while stride >= 1:
+        result.append(stride)
+        stride //= 2
+    return result
+
+
+def progressive(base, x_name, x_values, y_name, y_values, coarse=32, engine='depletion', chunk_size=65536):
+    """
+    Compute the maps coarse to fine.
+
+    Yields (stride, maps) after every level: maps are dicts as in compute_map
+    with every {stride}-th row and column (views of the full arrays), the last
+    level has stride 1. Each level computes only its new points, in chunks of
+    {chunk_size}, so stopping the iteration between levels wastes little work.
+    """
+    shape = (len(y_values), len(x_values))
+    maps = empty_maps(shape)
+    done = np.zeros(shape, dtype=bool)
+    for stride in strides(shape, coarse):
+        level = np.zeros(shape, dtype=bool)
+        level[::stride, ::stride] = True
+        rows, cols = np.nonzero(level & ~done)
+        for start in range(0, rows.size, chunk_size):
+            r, c = rows[start:start + chunk_size], cols[start:start + chunk_size]
+            for name, values in evaluate(base, x_name, x_values, y_name, y_values, r, c, engine).items():
+                maps[name][r, c] = values
+        done |= level
+        yield stride, {name: values[::stride, ::stride] for name, values in maps.items()}
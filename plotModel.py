@@ -0,0 +1,177 @@
+import numpy as np
+
+# названия линий в легенде и уровни BandProfile, которые они рисуют
+band_lines = (('Fermi Energy', 'E_f'), ('Valence Band', 'E_v'), ('Conduction Band', 'E_c'),
+              ('Donor Energy', 'E_d'), ('Acceptor Energy', 'E_as'))
+
+
+class BandPlot:
+    """
+    Band diagram whose artists are created once and then only updated.
+
+    Every update moves the lines with set_data and redraws them over a saved
+    background (blitting). The whole figure is drawn again only when the
+    axes limits really have to change or the plot is switched on/off.
+
+    {ax} is the axes of the plot
+    {canvas} is the matplotlib canvas ({figure_canvas_agg} in the interface)
+    {show_text} - whether to write phi and W values next to the dashed lines
+    """
+
+    def __init__(self, ax, canvas, show_text=True):
+        self.ax = ax
+        self.canvas = canvas
+        self.show_text = show_text
+
+        ax.set_xlabel("x [cm]")
+        ax.set_ylabel("E [eV]")
+        ax.grid(True)
+
+        self.lines = [ax.plot([], [], label=label, animated=True)[0] for label, _ in band_lines]
+        self.phi_line = ax.axhline(0, c='k', linestyle='dashed', animated=True)
+        self.W_line = ax.axvline(0, c='k', linestyle='dashed', animated=True)
+        self.phi_text = ax.text(0, 0, '', animated=True)
+        self.W_text = ax.text(0, 0, '', animated=True)
+        self.legend = ax.legend(bbox_to_anchor=(1., 0.5), fontsize=10, loc='right')
+
+        self.visible = True
+        self._set_visible(False)
+        self._background = None
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def animated_artists(self):
+        artists = self.lines + [self.phi_line, self.W_line]
+        if self.show_text:
+            artists += [self.phi_text, self.W_text]
+        return artists
+
+    def update(self, results):
+        """Show {results} (calcTypes.Results); a failed calculation leaves an empty plot."""
+        if not results.ok:
+            if self.visible:
+                self._set_visible(False)
+                self.canvas.draw()
+            return
+
+        profile = results.profile
+        x = profile.x
+        x_ends = [x[0], x[-1]]
+        for line, (_, name) in zip(self.lines, band_lines):
+            level = getattr(profile, name)
+            # постоянные уровни рисуем по двум точкам
+            if np.ndim(level) == 0:
+                line.set_data(x_ends, [level, level])
+            else:
+                line.set_data(x, level)
+        self.phi_line.set_ydata([results.phi, results.phi])
+        self.W_line.set_xdata([results.W, results.W])
+        self.phi_text.set_position((0.002, results.phi + 0.02))
+        self.phi_text.set_text('phi = '+str(round(results.phi, 4)) + ' [eV]')
+        self.W_text.set_position((results.W+0.0001, 0.2))
+        self.W_text.set_text('W = '+str(round(results.W, 4)) + ' [cm]')
+
+        redraw = not self.visible
+        self._set_visible(True)
+        redraw |= self._update_limits(results)
+        if redraw or self._background is None:
+            self.canvas.draw()
+        else:
+            self.blit()
+
+    def blit(self):
+        self.canvas.restore_region(self._background)
+        self._draw_animated()
+        self.canvas.blit(self.ax.bbox)
+
+    def _update_limits(self, results):
+        """
+        Change the limits only if the data leave the view or take less than half of it.
+        Returns True if the limits were changed.
+        """
+        profile = results.profile
+        levels = [np.min(getattr(profile, name)) for _, name in band_lines] + [np.max(getattr(profile, name)) for _, name in band_lines]
+        x_min, x_max = 0.0, max(profile.x.max(), results.W)
+        y_min = min(min(levels), results.phi, 0.0)
+        y_max = max(max(levels), results.phi)
+
+        changed = False
+        for (lo, hi), get, set_ in (((x_min, x_max), self.ax.get_xlim, self.ax.set_xlim),
+                                    ((y_min, y_max), self.ax.get_ylim, self.ax.set_ylim)):
+            view_lo, view_hi = get()
+            span = (hi - lo) or 1.0
+            inside = view_lo <= lo and hi <= view_hi
+            if not inside or (hi - lo) < 0.5*(view_hi - view_lo):
+                set_(lo - 0.05*span, hi + 0.05*span)
+                changed = True
+        return changed
+
+    def _set_visible(self, visible):
+        self.visible = visible
+        for artist in self.lines + [self.phi_line, self.W_line, self.phi_text, self.W_text, self.legend]:
+            artist.set_visible(visible)
+        if not self.show_text:
+            self.phi_text.set_visible(False)
+            self.W_text.set_visible(False)
+
+    def _on_draw(self, event):
+        # после полной перерисовки запоминаем фон без подвижных линий
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self.animated_artists():
+            self.ax.draw_artist(artist)
+
+
+# подписи величин карты phaseMap
+map_labels = {'phi': 'phi [eV]', 'W': 'W [cm]', 'E_f': 'E_f [eV]', 'pinning': 'E_f - E_as at the surface [eV]'}
+
+
+class MapPlot:
+    """
+    Map of one quantity over a grid of two parameters.
+
+    While the map is refined it is shown with imshow (cheap to redraw);
+    the complete map may be drawn with filled contours (contourf) instead.
+
+    {ax} is the axes of the map, {canvas} is its matplotlib canvas
+    """
+
+    def __init__(self, ax, canvas):
+        self.ax = ax
+        self.canvas = canvas
+        self.image = None
+        self.colorbar = None
+        self.contours = None
+
+    def update(self, x, y, data, quantity, x_label, y_label, filled=False):
+        """
+        Show {data} of shape (len({y}), len({x})); {x} and {y} are the coordinates
+        of the columns and rows (e.g. log10 of concentrations), NaN points stay empty.
+        {filled} - draw filled contours instead of the image.
+        """
+        if self.contours is not None:
+            self.contours.remove()
+            self.contours = None
+        finite = data[np.isfinite(data)]
+        vmin, vmax = (finite.min(), finite.max()) if finite.size else (0.0, 1.0)
+        if vmin == vmax:
+            vmin, vmax = vmin - 0.5, vmax + 0.5
+        extent = (x[0], x[-1], y[0], y[-1])
+
+        if self.image is None:
+            self.image = self.ax.imshow(data, origin='lower', aspect='auto', interpolation='nearest', extent=extent)
+            self.colorbar = self.ax.figure.colorbar(self.image, ax=self.ax)
+        else:
+            self.image.set_data(data)
+            self.image.set_extent(extent)
+        self.image.set_clim(vmin, vmax)
+        # у contourf должно быть хотя бы 2x2 точек
+        filled = filled and min(data.shape) > 1 and finite.size > 0
+        self.image.set_visible(not filled)
+        if filled:
+            self.contours = self.ax.contourf(x, y, data, levels=np.linspace(vmin, vmax, 21), cmap=self.image.get_cmap())
+        self.colorbar.set_label(map_labels.get(quantity, quantity))
+        self.ax.set_xlabel(x_label)
+        self.ax.set_ylabel(y_label)
+        self.canvas.draw()
@@ -0,0 +1,263 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+from scipy.linalg import solve_banded
+from fompy import constants
+from fompy import models
+
+import neutrality
+import rootSolver
+from calcTypes import E_out_to_cgs
+
+PoissonResult = namedtuple('PoissonResult', ['phi', 'W', 'E_f', 'converged', 'iterations', 'residual', 'x', 'E_v'])
+
+
+class Problem:
+    """
+    Dimensionless form of the 1D Poisson equation for the rows of a batch.
+
+    Energies are counted from the bulk valence band in units of kT, lengths
+    in units of the Debye length L_D = sqrt(eps kT / (4 pi e^2 N_d0)), densities
+    in units of N_d0. u(xi) is the band bending, E_v(x) = u kT.
+
+        u'' = r(u) = (p - n + N_d^+) / N_d0,   u'(0) = -s(u(0)),   u(L) = 0
+
+    s(u0) = f_right / (N_d0 L_D) is the charge of the surface acceptors and
+    of the external field, the same as in calculatingModule.f_right.
+    """
+
+    def __init__(self, E_gap, E_d, N_d0, E_as, N_as, T, E_out, m_e, m_h, epsilon):
+        kT = constants.k * T
+        self.kT = kT
+        self.N_d0 = N_d0
+        self.L_D = np.sqrt(epsilon * kT / (4*math.pi * constants.e**2 * N_d0))
+        self.eg = E_gap * constants.eV / kT
+        # уровень доноров отсчитываем от валентной зоны, как в create_scond
+        self.ed = (E_gap - E_d) * constants.eV / kT
+        self.eas = E_as * constants.eV / kT
+        self.Nc = models.Semiconductor.effective_state_density(m_e * constants.me, T) / N_d0
+        self.Nv = models.Semiconductor.effective_state_density(m_h * constants.me, T) / N_d0
+        self.N_as = N_as / (N_d0 * self.L_D)
+        self.field = E_out * E_out_to_cgs / (4*math.pi * constants.e) / (N_d0 * self.L_D)
+        self.ef = None
+
+    def charge(self, w):
+        """
+        Space charge (p - n + N_d^+)/N_d0 and its derivative by {w}, where
+        {w} is the Fermi level above the local valence band in kT.
+        The charge decreases with w.
+        """
+        # параметры строк растягиваем на точки сетки
+        ed, eg, Nc, Nv = (np.reshape(col, np.shape(col) + (1,)*(np.ndim(w) - np.ndim(col)))
+                          for col in (self.ed, self.eg, self.Nc, self.Nv))
+        return neutrality.charge(w, eg, ed, Nc, Nv, 1.0)
+
+    def surface(self, u0):
+        """Surface charge s(u0) and its derivative."""
+        with np.errstate(over='ignore'):
+            occupation = 1/(1 + np.exp(self.eas + u0 - self.ef))
+        return self.N_as*occupation + self.field, -self.N_as*occupation*(1 - occupation)
+
+    def fermi_level(self):
+        """
+        Bulk Fermi level from p + N_d^+ - n = 0 with the same carrier
+        densities as in the Poisson equation, so the bulk is exactly neutral.
+        """
+        solution = neutrality.solve(self.eg, self.ed, self.Nc, self.Nv, 1.0)
+        self.ef = solution.root
+        return solution
+
+    def depletion_guess(self):
+        """
+        Band bending u0 of the depletion approximation, W = sqrt(2 u0) L_D;
+        0 where the surface charge is not positive.
+        """
+        def balance(u0, _):
+            return np.sqrt(2*u0) - self.surface(u0)[0]
+
+        def dbalance(u0, _):
+            return 1/np.sqrt(2*u0) - self.surface(u0)[1]
+
+        lo = np.zeros(self.ef.shape)
+        hi = rootSolver.expand_bracket(balance, self.eg + lo, None)
+        solution = rootSolver.solve_increasing(balance, dbalance, lo, hi, None)
+        return np.where(solution.converged, solution.root, 0.0)
+
+
+def graded_mesh(L, n_points, h0):
+    """
+    Mesh on [0, {L}] (rows of lengths) whose steps grow geometrically from about {h0}.
+    """
+    L = np.asarray(L, dtype=float)[..., None]
+    t = np.linspace(0, 1, n_points)
+    # шаг у поверхности h0 ~ L*beta/(n*expm1(beta)), beta ищем простой итерацией
+    ratio = np.maximum(L / ((n_points - 1)*h0), 1.0)
+    beta = np.log1p(ratio) + 1
+    for _ in range(50):
+        beta = np.log1p(ratio*beta)
+    beta = np.maximum(beta, 1e-6)
+    return L * np.expm1(beta*t) / np.expm1(beta)
+
+
+def interp_rows(xq, xp, fp):
+    """numpy.interp for every row of 2D arrays at once."""
+    n, m = xp.shape
+    # сдвигаем строки так, чтобы они не пересекались, и ищем во всем массиве сразу
+    span = np.max(xp[:, -1] - xp[:, 0]) + 1
+    offset = (np.arange(n)*span - xp[:, 0])[:, None]
+    xq = np.clip(xq, xp[:, :1], xp[:, -1:])
+    j = np.searchsorted((xp + offset).ravel(), (xq + offset).ravel(), side='right') - 1
+    j = np.clip(j.reshape(xq.shape), (np.arange(n)*m)[:, None], (np.arange(n)*m + m - 2)[:, None])
+    x0, x1 = xp.ravel()[j], xp.ravel()[j + 1]
+    y0, y1 = fp.ravel()[j], fp.ravel()[j + 1]
+    return y0 + (y1 - y0)*(xq - x0)/(x1 - x0)
+
+
+def equidistribute(xi, u):
+    """
+    New mesh with the same number of points where every cell has the same
+    arc length of the curve u(xi): points gather where the bands bend fast.
+    """
+    h = np.diff(xi, axis=1)
+    monitor = np.sqrt(1 + (np.diff(u, axis=1)/h)**2)
+    # сглаживаем, чтобы соседние шаги не отличались слишком сильно
+    for _ in range(4):
+        monitor[:, 1:-1] = (monitor[:, :-2] + 2*monitor[:, 1:-1] + monitor[:, 2:])/4
+    arc = np.concatenate((np.zeros((xi.shape[0], 1)), np.cumsum(monitor*h, axis=1)), axis=1)
+    arc /= arc[:, -1:]
+    target = np.broadcast_to(np.linspace(0, 1, xi.shape[1]), xi.shape)
+    xi_new = interp_rows(target, arc, xi)
+    return xi_new, interp_rows(xi_new, xi, u)
+
+
+def newton(problem, xi, u, tol=1e-10, maxiter=50):
+    """
+    Newton iterations for the finite-volume equations on mesh {xi}, starting from {u}.
+
+    The Jacobian is tridiagonal; all rows of the batch are solved as one
+    block-diagonal banded system. Large steps are damped logarithmically,
+    which keeps the iterations stable far from the solution.
+
+    Returns (u, converged, iterations, residual), residual is max |G| of the last iteration.
+    """
+    n, m = u.shape
+    h = np.diff(xi, axis=1)
+    volume = np.zeros_like(xi)
+    volume[:, :-1] += h/2
+    volume[:, 1:] += h/2
+    volume[:, -1] = 0
+    u = u.copy()
+    converged = np.zeros(n, dtype=bool)
+    iterations = np.zeros(n, dtype=int)
+    ab = np.zeros((3, n*m))
+
+    for _ in range(maxiter):
+        flux = np.diff(u, axis=1)/h
+        q, dq = problem.charge(problem.ef[:, None] - u)
+        s, ds = problem.surface(u[:, 0])
+
+        # G_i = поток справа - поток слева - объем ячейки * r(u_i)
+        G = -volume*q
+        G[:, :-1] += flux
+        G[:, 1:] -= flux
+        G[:, 0] += s
+        G[:, -1] = u[:, -1]
+
+        diag = volume*dq
+        diag[:, :-1] -= 1/h
+        diag[:, 1:] -= 1/h
+        diag[:, 0] += ds
+        diag[:, -1] = 1
+        upper = np.zeros_like(u)
+        upper[:, :-1] = 1/h
+        lower = np.zeros_like(u)
+        lower[:, 1:-1] = 1/h[:, :-1]
+
+        ab[0, 1:] = upper.ravel()[:-1]
+        ab[1] = diag.ravel()
+        ab[2, :-1] = lower.ravel()[1:]
+        du = solve_banded((1, 1), ab, -G.ravel(), check_finite=False).reshape(n, m)
+        residual = np.max(np.abs(G), axis=1)
+
+        step = np.max(np.abs(du), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            damping = np.where(step > 1, np.log1p(step)/step, 1.0)
+        active = ~converged
+        iterations += active
+        u += np.where(active, damping, 0)[:, None]*du
+        converged |= step <= tol*np.maximum(1, np.abs(u[:, 0]))
+        if converged.all():
+            break
+
+    return u, converged, iterations, residual
+
+
+def solve(E_gap, E_d, N_d0, E_as, N_as, T, E_out, m_e=0.5, m_h=0.5, epsilon=10.0, phi0=None,
+          n_points=201, n_remesh=2, tol=1e-10, maxiter=50):
+    """
+    Band bending from the full nonlinear Poisson equation, without the depletion approximation.
+
+    Free electrons and holes (Fermi-Dirac statistics) and partly ionized
+    donors are kept in the space charge, so accumulation, inversion and
+    high temperatures are described too. The surface boundary condition is
+    the charge balance of calculatingModule.f_right.
+    The bulk Fermi level is found from neutrality of the doped semiconductor
+    (also for 'custom', where calculate() uses the undoped one).
+
+    Arguments are columns in the units of calcTypes.Params with the material
+    constants already set (see calculatingModule.set_material).
+    {phi0} - initial guess for phi [eV], e.g. a previous solution;
+    by default the depletion approximation is used.
+    {n_points} - mesh points per row; the mesh is adapted {n_remesh} times
+    to the solution.
+
+    Returns PoissonResult of arrays: phi [eV], W [cm] (the width of the
+    depletion layer with the same charge), E_f [eV], converged, iterations,
+    residual (dimensionless) and the mesh profile x [cm], E_v [eV] of shape (n, n_points).
+    """
+    columns = np.broadcast_arrays(*(np.atleast_1d(np.asarray(col, dtype=float))
+                                    for col in (E_gap, E_d, N_d0, E_as, N_as, T, E_out, m_e, m_h, epsilon)))
+    problem = Problem(*columns)
+    bulk_ok = problem.fermi_level().converged
+
+    problem.ef = np.where(bulk_ok, problem.ef, 0.0)
+    # начальное приближение - профиль обеднения, длина области с запасом
+    # на несколько дебаевских длин в объеме
+    if phi0 is None:
+        u0 = problem.depletion_guess()
+    else:
+        u0 = np.broadcast_to(phi0, problem.ef.shape) * constants.eV / problem.kT
+    u0 = np.nan_to_num(u0)
+    W0 = np.sqrt(2*np.abs(u0))
+    xi = graded_mesh(2*W0 + 25, n_points, 1e-2)
+    u = u0[:, None] * np.clip(1 - xi/np.maximum(W0, 1e-12)[:, None], 0, None)**2
+
+    iterations = np.zeros(problem.ef.shape, dtype=int)
+    for k in range(n_remesh + 1):
+        if k > 0:
+            xi, u = equidistribute(xi, u)
+        u, converged, its, residual = newton(problem, xi, u, tol, maxiter)
+        iterations += its
+    converged &= bulk_ok & np.isfinite(u).all(axis=1)
+
+    s, _ = problem.surface(u[:, 0])
+    to_eV = problem.kT / constants.eV
+    nan = np.where(converged, 1.0, np.nan)
+    return PoissonResult(phi=u[:, 0]*to_eV*nan, W=np.abs(s)*problem.L_D*nan, E_f=problem.ef*to_eV*np.where(bulk_ok, 1.0, np.nan),
+                         converged=converged, iterations=iterations, residual=residual,
+                         x=xi*problem.L_D[:, None], E_v=u*to_eV[:, None])
+
+
+def resample(solution, s):
+    """
+    Band bending of {solution} at x = X*{s}, {s} - 1D array of points as in
+    calculatingModule.profile_grid. X is 3/4 of the depth where the bending
+    drops to 1% of phi, so that s = 2 is in the flat bulk as for the
+    depletion profile. Returns (x, E_v) of shape (n, len(s)).
+    """
+    phi = np.nan_to_num(solution.phi)[:, None]
+    tail = np.abs(solution.E_v) <= 0.01*np.abs(phi)
+    depth = np.take_along_axis(solution.x, np.argmax(tail, axis=1)[:, None], axis=1)
+    x = 0.75*depth*np.asarray(s)
+    return x, interp_rows(x, solution.x, solution.E_v)
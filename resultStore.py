@@ -0,0 +1,89 @@
+import json
+import os
+
+import numpy as np
+
+header_name = 'store.json'
+
+
+def create_store(path, columns, meta=None):
+    """
+    Create a column store in directory {path} and return it opened for writing.
+
+    {columns} - dict: column name -> (dtype, shape); every column is a
+    preallocated .npy file that is written through numpy.memmap.
+    {meta} - any JSON-serializable dict saved in the header.
+    """
+    os.makedirs(path, exist_ok=True)
+    header = dict(columns={name: [np.dtype(dtype).str, [int(n) for n in np.atleast_1d(shape)]] for name, (dtype, shape) in columns.items()},
+                  meta=meta or {})
+    for name, (dtype, shape) in header['columns'].items():
+        column = np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode='w+', dtype=dtype, shape=tuple(shape))
+        column.flush()
+        del column
+    # заголовок пишем последним: без него хранилище считается недописанным
+    tmp_path = os.path.join(path, header_name + '.tmp')
+    with open(tmp_path, 'w') as file:
+        json.dump(header, file)
+    os.replace(tmp_path, os.path.join(path, header_name))
+    return ResultStore(path, mode='r+')
+
+
+def store_exists(path):
+    return os.path.exists(os.path.join(path, header_name))
+
+
+class ResultStore:
+    """
+    Columnar result store on disk: one .npy file per column and a JSON header.
+
+    Columns are opened lazily as numpy.memmap on first access, so
+    multi-GB results are not loaded into memory.
+    {mode} - 'r' for reading, 'r+' for writing into existing columns.
+    Several processes may open the same store and write disjoint slices.
+    """
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.mode = mode
+        with open(os.path.join(path, header_name)) as file:
+            header = json.load(file)
+        self.meta = header['meta']
+        self.shapes = {name: tuple(shape) for name, (dtype, shape) in header['columns'].items()}
+        self.dtypes = {name: np.dtype(dtype) for name, (dtype, shape) in header['columns'].items()}
+        self._columns = {}
+
+    @property
+    def names(self):
+        return tuple(self.shapes)
+
+    def __contains__(self, name):
+        return name in self.shapes
+
+    def __getitem__(self, name):
+        if name not in self._columns:
+            if name not in self.shapes:
+                raise KeyError(name)
+            self._columns[name] = np.load(os.path.join(self.path, name + '.npy'), mmap_mode=self.mode)
+        return self._columns[name]
+
+    def write(self, start, values):
+        """Write dict of arrays {values} into rows [start, start + len) of the columns."""
+        for name, value in values.items():
+            column = self[name]
+            column[start:start + len(value)] = value
+
+    def flush(self):
+        for column in self._columns.values():
+            column.flush()
+
+    def close(self):
+        if self.mode != 'r':
+            self.flush()
+        self._columns.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,140 @@
+import math
+import numpy as np
+from collections import namedtuple
+
+# статусы решения для каждой строки
+CONVERGED = 0
+NO_BRACKET = 1 # на концах отрезка функция одного знака
+MAX_ITER = 2 # не сошлось за maxiter итераций
+
+SolverResult = namedtuple('SolverResult', ['root', 'converged', 'iterations', 'residual', 'status'])
+
+
+class SolverError(RuntimeError):
+    """
+    Raised when the band-bending equation has no root in the bracket
+    or the iterations did not converge.
+    """
+
+
+def expand_bracket(func, hi, args, n_expand=10):
+    """
+    Double {hi} for rows where {func} is still negative there.
+
+    {func} must be increasing in x, so the root lies to the right of any
+    point where {func} < 0.
+    """
+    for _ in range(n_expand):
+        low = func(hi, args) < 0
+        if not low.any():
+            break
+        hi = np.where(low, 2*hi, hi)
+    return hi
+
+
+def solve_increasing(func, dfunc, lo, hi, args, x0=None, xtol=1e-12, rtol=1e-10, maxiter=100):
+    """
+    Find the root of an increasing function on [lo, hi] for many problems at once.
+
+    Safeguarded Newton method: the Newton step uses the analytic derivative
+    {dfunc}, and a bisection step is taken instead whenever the Newton step
+    leaves the current bracket or does not shrink fast enough.
+    The bracket is updated every iteration, so the method never diverges.
+    A row stops when the last step, the next Newton correction or the
+    bracket is below {xtol} + {rtol}*|x|.
+
+    {func}(x, args) and {dfunc}(x, args) must work on arrays of x.
+    {x0} is an optional initial guess (e.g. the previous solution).
+
+    Returns SolverResult of arrays: root, converged, iterations, residual, status.
+    """
+    lo, hi = np.broadcast_arrays(np.asarray(lo, dtype=float), np.asarray(hi, dtype=float))
+    lo, hi = lo.copy(), hi.copy()
+
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        f_lo = func(lo, args)
+        f_hi = func(hi, args)
+        bracketed = (f_lo <= 0) & (f_hi >= 0)
+
+        x = (lo + hi)/2 if x0 is None else np.clip(np.broadcast_to(x0, lo.shape), lo, hi)
+        x = np.where(f_lo == 0, lo, np.where(f_hi == 0, hi, x))
+        fx = func(x, args)
+        dfx = dfunc(x, args)
+
+        # Ньютоновская поправка меньше допуска - корень уже найден с нужной точностью
+        done = ~bracketed | (np.abs(fx) <= (xtol + rtol*np.abs(x))*np.abs(dfx))
+        iterations = np.zeros(lo.shape, dtype=int)
+        dx_old = hi - lo
+
+        for _ in range(maxiter):
+            if done.all():
+                break
+            active = ~done
+            iterations += active
+
+            # сужаем отрезок по знаку функции
+            lo = np.where(active & (fx < 0), x, lo)
+            hi = np.where(active & (fx > 0), x, hi)
+
+            newton = x - fx/dfx
+            use_bisect = ~np.isfinite(newton) | (newton <= lo) | (newton >= hi) | (np.abs(2*fx) > np.abs(dx_old*dfx))
+            x_new = np.where(use_bisect, (lo + hi)/2, newton)
+
+            dx = np.where(active, x_new - x, 0)
+            dx_old = np.where(active, dx, dx_old)
+            x = np.where(active, x_new, x)
+            fx = np.where(active, func(x, args), fx)
+            dfx = np.where(active, dfunc(x, args), dfx)
+
+            tol = xtol + rtol*np.abs(x)
+            done |= (np.abs(dx) <= tol) | (np.abs(fx) <= tol*np.abs(dfx)) | (hi - lo <= tol)
+
+    status = np.where(~bracketed, NO_BRACKET, np.where(done, CONVERGED, MAX_ITER))
+    root = np.where(bracketed, x, np.nan)
+    residual = np.where(bracketed, fx, np.nan)
+
+    return SolverResult(root, status == CONVERGED, iterations, residual, status)
+
+
+def solve_increasing_scalar(fdf, lo, hi, args, x0=None, xtol=1e-12, rtol=1e-10, maxiter=100):
+    """
+    solve_increasing for one problem in plain floats, without the array machinery.
+
+    {fdf}(x, args) returns (f, df) at once, so every iteration evaluates the
+    function only once. Same safeguards and stopping rules as solve_increasing.
+
+    Returns SolverResult of numbers.
+    """
+    lo, hi = float(lo), float(hi)
+    f_lo, _ = fdf(lo, args)
+    f_hi, _ = fdf(hi, args)
+    if not (f_lo <= 0 <= f_hi):
+        return SolverResult(math.nan, False, 0, math.nan, NO_BRACKET)
+    if f_lo == 0:
+        return SolverResult(lo, True, 0, 0.0, CONVERGED)
+    if f_hi == 0:
+        return SolverResult(hi, True, 0, 0.0, CONVERGED)
+
+    # приближение на краю или вне отрезка не берем: на краю производная бывает бесконечной
+    x = float(x0) if x0 is not None and lo < x0 < hi else (lo + hi)/2
+    fx, dfx = fdf(x, args)
+    if abs(fx) <= (xtol + rtol*abs(x))*abs(dfx) < math.inf:
+        return SolverResult(x, True, 0, fx, CONVERGED)
+    dx_old = hi - lo
+    for iterations in range(1, maxiter + 1):
+        if fx < 0:
+            lo = x
+        elif fx > 0:
+            hi = x
+        # вне отрезка или медленное сужение - шаг деления пополам, как в solve_increasing
+        newton = x - fx/dfx if dfx != 0 else math.nan
+        if not (lo < newton < hi) or abs(2*fx) > abs(dx_old*dfx):
+            newton = (lo + hi)/2
+        dx = newton - x
+        dx_old = dx
+        x = newton
+        fx, dfx = fdf(x, args)
+        tol = xtol + rtol*abs(x)
+        if abs(dx) <= tol or abs(fx) <= tol*abs(dfx) < math.inf or hi - lo <= tol:
+            return SolverResult(x, True, iterations, fx, CONVERGED)
+    return SolverResult(x, False, maxiter, fx, MAX_ITER)
@@ -0,0 +1,80 @@
+"""
+Derivatives of phi, W and E_f by every input parameter of the depletion model.
+
+phi is the root of f(phi, p) = f_left - f_right = 0, so by the implicit
+function theorem
+
+    dphi/dp = -(df/dp + df/dE_f * dE_f/dp) / (df/dphi)
+
+with dE_f/dp from the neutrality (neutrality.fermi_level_gradient);
+W(phi, p) is differentiated directly. Everything is analytic, so the
+gradient costs about as much as one solve, without finite differences.
+
+    results = calculatingModule.calculate_batch(..., sensitivities=True)
+    results['dphi']['N_as']      # eV per cm^(-2), one value per row
+"""
+import math
+
+import numpy as np
+from fompy import constants
+
+import calculatingModule
+import neutrality
+from calcTypes import E_out_to_cgs, Params
+
+# параметры, по которым считаем производные, в единицах Params
+names = tuple(name for name in Params.names if name != 'mat')
+# у готовых материалов они берутся из fompy, от входных значений результат не зависит
+material_names = ('E_gap', 'epsilon', 'm_e', 'm_h')
+
+
+def gradients(phi, parms, E_d, m_e, m_h, mat, accuracy='exact'):
+    """
+    Derivatives at solved rows of calculate_batch.
+
+    {phi} [eV] - roots of f for {parms} (cgs columns as in calculate_batch,
+    with the material constants set and E_f [erg]); {E_d} [eV], {m_e}, {m_h}
+    and {mat} - the other columns; {accuracy} - as for the Fermi level.
+
+    Returns dict with 'dphi' [eV], 'dW' [cm] and 'dE_f' [eV], each a dict:
+    name -> derivative per unit of the parameter (eV, cm^(-3), cm^(-2), m_0, K, V/m).
+    Derivatives by the material constants of preset rows are 0, as for calculate_batch.
+    """
+    kT = constants.k * parms['T']
+    x_erg = phi * constants.eV
+    with np.errstate(over='ignore'):
+        occupation = 1/(1 + np.exp((parms['E_as'] + x_erg - parms['E_f'])/kT))
+    g = occupation*(1 - occupation)
+    z = (parms['E_as'] + x_erg - parms['E_f'])/kT
+    left = calculatingModule.f_left(phi, parms)
+    df_dphi = calculatingModule.df(phi, parms)
+    df_dE_f = -parms['N_as']*g/kT
+
+    # производные f по параметрам при постоянных phi и E_f
+    zeros = np.zeros_like(phi)
+    df_dp = dict.fromkeys(names, zeros)
+    df_dp.update(epsilon=left/(2*parms['epsilon']),
+                 N_d0=left/(2*parms['N_d0']),
+                 N_as=-occupation,
+                 E_as=parms['N_as']*g*constants.eV/kT,
+                 T=-parms['N_as']*g*z/parms['T'],
+                 E_out=zeros - E_out_to_cgs/(4*math.pi*constants.e))
+
+    dE_f = dict.fromkeys(names, zeros)
+    dE_f.update(neutrality.fermi_level_gradient(parms['E_f'], parms['E_gap'] / constants.eV, E_d, parms['N_d0'], parms['T'],
+                                                m_e, m_h, doped=mat != 'custom', accuracy=accuracy))
+
+    # W = sqrt(epsilon phi / (2 pi e^2 N_d0))
+    W_s = calculatingModule.W(phi, parms)
+    dW_direct = dict.fromkeys(names, zeros)
+    dW_direct.update(epsilon=W_s/(2*parms['epsilon']), N_d0=-W_s/(2*parms['N_d0']))
+
+    preset = mat != 'custom'
+    results = dict(dphi={}, dW={}, dE_f={})
+    for name in names:
+        dphi = -(df_dp[name] + df_dE_f*dE_f[name])/df_dphi
+        dW = W_s*dphi/(2*phi) + dW_direct[name]
+        derivatives = dict(dphi=dphi, dW=dW, dE_f=dE_f[name] / constants.eV)
+        for key, value in derivatives.items():
+            results[key][name] = np.where(preset, 0.0, value) if name in material_names else value
+    return results
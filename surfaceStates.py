@@ -0,0 +1,228 @@
+"""
+Surface states with a continuous density D_it(E) instead of one acceptor level.
+
+    states = surfaceStates.Gaussian(E0=0.4, sigma=0.05, N=1e13)
+    results = calculatingModule.calculate(params, states=states)
+
+Energies are counted from the valence band at the surface, as E_as. The
+states hold n_s = int D_it(E) / (1 + exp((E + phi - E_f)/kT)) dE electrons,
+a function of u = E_f - phi and T only. It is tabulated with its
+derivative once per distribution, E_gap and temperature node (nodes
+T_ratio apart, linear in log T between them); the root solver only
+interpolates (cubic Hermite in u), so solving stays as fast as with one level.
+A distribution must be hashable: use the classes below or subclass Distribution.
+"""
+from collections import namedtuple
+
+import numpy as np
+from fompy import constants
+
+import lruCache
+
+# соседние узлы по температуре; интерполяция между ними ошибается на ~1e-6 от n_s
+T_ratio = 1.005
+# шаг по u и по E в долях kT (и ширины распределения)
+steps_per_kT = 10
+# за 40 kT от распределения состояния заняты (или пусты) с точностью e^(-40)
+tail = 40
+
+_tables = lruCache.LRUCache(maxsize=2048)
+
+
+def simpson(lo, hi, step):
+    """Points of [{lo}, {hi}] at most {step} apart and the weights of Simpson's rule."""
+    n = 2*max(int(np.ceil((hi - lo) / (2*step))), 1)
+    E = np.linspace(lo, hi, n + 1)
+    weights = np.full(n + 1, 2.0)
+    weights[1::2] = 4.0
+    weights[[0, -1]] = 1.0
+    return E, weights * (hi - lo) / (3*n)
+
+
+class Distribution:
+    """
+    Base of the densities of states: density(E, E_gap) [cm^(-2) eV^(-1)],
+    support(E_gap) - (lo, hi) [eV] outside of which the density is 0,
+    width - the smallest energy scale of the density [eV].
+    If the states are all outside the gap, lo >= hi: then total is 0 and
+    level is NaN, so the point fails the E_as check of validation.
+    """
+
+    __slots__ = ()
+
+    def empty(self, E_gap):
+        """True if no states lie inside the gap."""
+        lo, hi = self.support(E_gap)
+        return not lo < hi
+
+    def grid(self, E_gap, step):
+        """Energies over the support with at most {step} between them and their quadrature weights."""
+        if self.empty(E_gap):
+            return np.empty(0), np.empty(0)
+        return simpson(*self.support(E_gap), step)
+
+    def total(self, E_gap):
+        """All states in the gap [cm^(-2)]."""
+        E, weights = self.grid(E_gap, self.width / steps_per_kT)
+        return float(np.dot(self.density(E, E_gap), weights))
+
+    def level(self, E_gap):
+        """Mean energy of the states [eV], shown as E_as; NaN if there are none in the gap."""
+        E, weights = self.grid(E_gap, self.width / steps_per_kT)
+        D = self.density(E, E_gap) * weights
+        return float(np.dot(D, E) / D.sum()) if D.sum() > 0 else float('nan')
+
+
+class Gaussian(Distribution, namedtuple('Gaussian', ['E0', 'sigma', 'N'])):
+    """Gaussian band of {N} [cm^(-2)] states around {E0} [eV] with standard deviation {sigma} [eV]."""
+
+    __slots__ = ()
+
+    @property
+    def width(self):
+        return self.sigma
+
+    def support(self, E_gap):
+        return max(self.E0 - 8*self.sigma, 0.0), min(self.E0 + 8*self.sigma, E_gap)
+
+    def density(self, E, E_gap):
+        return self.N / (self.sigma * np.sqrt(2*np.pi)) * np.exp(-(E - self.E0)**2 / (2*self.sigma**2))
+
+
+class UShaped(Distribution, namedtuple('UShaped', ['D_mid', 'D_edge', 'decay'])):
+    """
+    U-shaped continuum over the whole gap: {D_mid} [cm^(-2) eV^(-1)] near midgap,
+    rising by {D_edge} at both band edges and decaying into the gap over {decay} [eV].
+    """
+
+    __slots__ = ()
+
+    @property
+    def width(self):
+        return self.decay
+
+    def support(self, E_gap):
+        return 0.0, E_gap
+
+    def density(self, E, E_gap):
+        return self.D_mid + self.D_edge * (np.exp(-E / self.decay) + np.exp(-(E_gap - E) / self.decay))
+
+
+class Tabulated(Distribution, namedtuple('Tabulated', ['E', 'D'])):
+    """User-defined density: values {D} [cm^(-2) eV^(-1)] at increasing energies {E} [eV], linear between them."""
+
+    __slots__ = ()
+
+    def __new__(cls, E, D):
+        # кортежи, чтобы распределение можно было хэшировать
+        E, D = tuple(float(e) for e in E), tuple(float(d) for d in D)
+        if len(E) != len(D) or len(E) < 2 or np.any(np.diff(E) <= 0):
+            raise ValueError('E must increase and have as many values as D, at least two')
+        return super().__new__(cls, E, D)
+
+    @property
+    def width(self):
+        return float(np.diff(self.E).min())
+
+    def support(self, E_gap):
+        return max(self.E[0], 0.0), min(self.E[-1], E_gap)
+
+    def grid(self, E_gap, step):
+        # по отрезкам между узлами: на изломах плотности правило Симпсона теряет точность
+        if self.empty(E_gap):
+            return np.empty(0), np.empty(0)
+        lo, hi = self.support(E_gap)
+        edges = np.unique(np.clip(self.E, lo, hi))
+        parts = [simpson(a, b, step) for a, b in zip(edges[:-1], edges[1:])] or [simpson(lo, hi, step)]
+        return np.concatenate([E for E, _ in parts]), np.concatenate([weights for _, weights in parts])
+
+    def density(self, E, E_gap):
+        return np.interp(E, self.E, self.D, left=0.0, right=0.0)
+
+
+# n_s и dn_s/du [cm^(-2), cm^(-2) eV^(-1)] в точках u0 + i*du [eV]
+Table = namedtuple('Table', ['u0', 'du', 'N', 'dN'])
+
+
+def build_table(states, E_gap, T):
+    """Table of n_s(u) of {states} at {T} [K] by quadrature over the energies of the states."""
+    kT = constants.k * T / constants.eV
+    E, weights = states.grid(E_gap, min(kT, states.width) / steps_per_kT)
+    D = states.density(E, E_gap) * weights
+    du = kT / steps_per_kT
+    u = np.arange(E[0] - tail*kT, E[-1] + tail*kT + du, du)
+    N, dN = np.empty(u.size), np.empty(u.size)
+    # по кускам, чтобы матрица u x E не занимала много памяти
+    for start in range(0, u.size, 512):
+        z = np.clip((E[None, :] - u[start:start + 512, None]) / kT, -tail - 10, tail + 10)
+        f = 1/(1 + np.exp(z))
+        N[start:start + 512] = f @ D
+        dN[start:start + 512] = (f*(1 - f)) @ D / kT
+    return Table(u[0], du, N, dN)
+
+
+def table(states, E_gap, node):
+    """Cached table at the temperature node {node}: T = T_ratio**node."""
+    return _tables.get((states, float(E_gap), int(node)), lambda: build_table(states, E_gap, T_ratio**node))
+
+
+def _interpolate(N, dN, u0, du, start, size, u):
+    # кубический Эрмит по значениям и производным в узлах; у каждой строки своя таблица
+    # в N, dN с {start} и длиной {size}; вне таблицы состояния пусты или заполнены
+    s = (u - u0) / du
+    i = np.clip(np.floor(s), 0, size - 2).astype(int)
+    x = np.clip(s - i, 0.0, 1.0)
+    i += start
+    N0, N1, d0, d1 = N[i], N[i + 1], dN[i]*du, dN[i + 1]*du
+    x2, x3 = x*x, x*x*x
+    value = (2*x3 - 3*x2 + 1)*N0 + (x3 - 2*x2 + x)*d0 + (-2*x3 + 3*x2)*N1 + (x3 - x2)*d1
+    slope = ((6*x2 - 6*x)*N0 + (3*x2 - 4*x + 1)*d0 + (-6*x2 + 6*x)*N1 + (3*x2 - 2*x)*d1) / du
+    inside = (s >= 0) & (s <= size - 1)
+    value = np.where(inside, value, np.where(s < 0, 0.0, N[start + size - 1]))
+    return value, np.where(inside, slope, 0.0)
+
+
+class Occupancy:
+    """
+    n_s of {states} at fixed {T} [K] and {E_gap} [eV] (arrays or numbers):
+    the tables of every row are looked up once, a call with u only interpolates.
+    """
+
+    def __init__(self, states, T, E_gap):
+        T, E_gap = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(E_gap, dtype=float))
+        position = np.log(T) / np.log(T_ratio)
+        node = np.floor(position)
+        self.weight = position - node
+        # строки с одинаковыми E_gap и узлом T берут одни и те же две таблицы
+        gaps, gap_index = np.unique(E_gap, return_inverse=True)
+        nodes, node_index = np.unique(node, return_inverse=True)
+        groups, inverse = np.unique(gap_index.ravel()*nodes.size + node_index.ravel(), return_inverse=True)
+        inverse = inverse.reshape(T.shape)
+        # все нужные таблицы склеиваем, чтобы интерполировать все строки сразу
+        tables = [table(states, gaps[group // nodes.size], nodes[group % nodes.size] + j) for group in groups for j in (0, 1)]
+        size = np.array([t.N.size for t in tables], dtype=int)
+        start = np.concatenate(([0], np.cumsum(size)[:-1]))
+        u0, du = np.array([t.u0 for t in tables]), np.array([t.du for t in tables])
+        # без строк (все точки отброшены проверкой) таблиц нет
+        self.N = np.concatenate([t.N for t in tables] or [np.empty(0)])
+        self.dN = np.concatenate([t.dN for t in tables] or [np.empty(0)])
+        self.rows = [(u0[i], du[i], start[i], size[i]) for i in (2*inverse, 2*inverse + 1)]
+
+    def __call__(self, u):
+        """n_s [cm^(-2)] and dn_s/du [cm^(-2) eV^(-1)] at {u} = E_f - phi [eV]."""
+        u = np.broadcast_to(np.asarray(u, dtype=float), self.weight.shape)
+        (N0, dN0), (N1, dN1) = (_interpolate(self.N, self.dN, *rows, u) for rows in self.rows)
+        return (1 - self.weight)*N0 + self.weight*N1, (1 - self.weight)*dN0 + self.weight*dN1
+
+
+def occupied(states, u, T, E_gap):
+    """
+    Electrons in {states} n_s [cm^(-2)] and dn_s/du [cm^(-2) eV^(-1)]
+    at {u} = E_f - phi [eV], {T} [K] and {E_gap} [eV] (arrays, broadcast together).
+    """
+    u, T, E_gap = np.broadcast_arrays(*(np.asarray(col, dtype=float) for col in (u, T, E_gap)))
+    return Occupancy(states, T, E_gap)(u)
+
+
+def cache_info():
+    return _tables.info()
@@ -0,0 +1,150 @@
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import calculatingModule
+import resultStore
+from calcTypes import Params
+
+# колонки результата и их типы
+columns = {'phi': 'f8', 'W': 'f8', 'E_f': 'f8', 'status': 'i1'}
+# колонки профиля зон, по profile_points значений на точку
+profile_columns = ('x', 'E_v', 'E_c', 'E_d')
+
+
+class GridSpec:
+    """
+    Grid of parameter points for a sweep.
+
+    {base} - calcTypes.Params with the values of parameters that are not swept
+    {axes} - dict: parameter name -> 1D array of values.
+    The grid is the outer product of the axes in the given order,
+    points are numbered in C order (the last axis changes fastest).
+    Put T and N_d0 first: then neighbouring points share the bulk Fermi level.
+    """
+
+    def __init__(self, base, axes):
+        for name in axes:
+            if name not in Params.names or name == 'mat':
+                raise ValueError(f'Unknown sweep parameter: {name}')
+        self.base = base
+        self.axes = {name: np.asarray(values, dtype=float) for name, values in axes.items()}
+
+    @property
+    def shape(self):
+        return tuple(values.size for values in self.axes.values())
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def columns(self, start, stop):
+        """Parameter columns for the points with flat indices [start, stop)."""
+        index = np.unravel_index(np.arange(start, stop), self.shape)
+        cols = self.base.as_dict()
+        for (name, values), idx in zip(self.axes.items(), index):
+            cols[name] = values[idx]
+        return cols
+
+    def to_json(self):
+        return dict(base=self.base.as_dict(), axes={name: values.tolist() for name, values in self.axes.items()})
+
+    @classmethod
+    def from_json(cls, spec):
+        return cls(Params.from_dict(spec['base']), spec['axes'])
+
+
+def run_chunk(grid, start, stop, profile_points=0):
+    """Calculate the points [start, stop) of {grid}, returns dict of result columns."""
+    results = calculatingModule.calculate_batch(**grid.columns(start, stop), profile_points=profile_points)
+    chunk = {name: results[name] for name in columns}
+    if profile_points > 0:
+        for name in profile_columns:
+            chunk[name] = getattr(results['profile'], name)
+    return chunk
+
+
+def _run_and_save(grid, index, start, stop, out_dir, profile_points):
+    results = run_chunk(grid, start, stop, profile_points)
+    # каждый процесс пишет только в свой кусок колонок;
+    # кусок отмечается готовым после записи данных
+    with resultStore.ResultStore(out_dir, mode='r+') as store:
+        store.write(start, results)
+        store.flush()
+        store['chunk_done'][index] = 1
+    return index, stop - start
+
+
+def run_sweep(grid, out_dir, chunk_size=65536, workers=None, progress=None, profile_points=0):
+    """
+    Calculate all points of {grid} in parallel and save the results into {out_dir}.
+
+    The results are written into a resultStore with columns phi, W, E_f,
+    status (and band profile columns x, E_v, E_c, E_d of shape
+    (size, {profile_points}) if requested),
+    all in the flat order of the grid.
+    The grid is split into chunks of {chunk_size} points that run in a
+    process pool with {workers} processes (all cores by default).
+    Every worker writes its chunk straight into the store, so an
+    interrupted sweep is resumed by calling run_sweep with the same
+    arguments again: only the missing chunks are calculated.
+
+    {progress}(done, total) is called after every chunk with numbers of points.
+
+    Returns the number of calculated points.
+    """
+    n_chunks = -(-grid.size // chunk_size)
+    meta = dict(grid=grid.to_json(), chunk_size=chunk_size, profile_points=profile_points)
+    if resultStore.store_exists(out_dir):
+        store = resultStore.ResultStore(out_dir, mode='r')
+        if store.meta != json.loads(json.dumps(meta)):
+            raise ValueError(f'{out_dir} contains results of another sweep')
+    else:
+        store_columns = {name: (dtype, grid.size) for name, dtype in columns.items()}
+        store_columns['chunk_done'] = ('u1', n_chunks)
+        for name in profile_columns if profile_points > 0 else ():
+            store_columns[name] = ('f8', (grid.size, profile_points))
+        store = resultStore.create_store(out_dir, store_columns, meta)
+
+    chunk_done = np.array(store['chunk_done'])
+    store.close()
+    todo = [(index, index*chunk_size, min((index + 1)*chunk_size, grid.size))
+            for index in np.flatnonzero(chunk_done == 0).tolist()]
+    done = grid.size - sum(stop - start for _, start, stop in todo)
+    calculated = 0
+    if progress is not None:
+        progress(done, grid.size)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_and_save, grid, index, start, stop, out_dir, profile_points)
+                   for index, start, stop in todo]
+        for future in as_completed(futures):
+            _, n = future.result()
+            done += n
+            calculated += n
+            if progress is not None:
+                progress(done, grid.size)
+
+    return calculated
+
+
+def load_sweep(out_dir, allow_partial=False):
+    """
+    Open results of a sweep without loading them into memory.
+
+    Returns (grid, results) where results is a dict of memory-mapped arrays
+    of the grid shape (profile columns have one more dimension of profile points).
+    Raises ValueError if some chunks are missing, unless {allow_partial}.
+    """
+    store = resultStore.ResultStore(out_dir)
+    grid = GridSpec.from_json(store.meta['grid'])
+    if not allow_partial and not store['chunk_done'].all():
+        raise ValueError(f'Sweep in {out_dir} is not finished')
+
+    results = {}
+    for name in store.names:
+        if name != 'chunk_done':
+            column = store[name]
+            results[name] = column.reshape(grid.shape + column.shape[1:])
+    return grid, results
@@ -0,0 +1,18 @@
+import pytest
+
+import benchmark
+
+
+def test_only_prepares_selected_groups(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('prepared a case that is not selected')
+    for name in ('plot_cases', 'map_cases', 'batch_cases', 'path_cases'):
+        monkeypatch.setattr(benchmark, name, fail)
+    results = benchmark.run(size=2, repeat=1, only='phi/Si')
+    assert list(results['results']) == ['phi/Si']
+
+
+@pytest.mark.parametrize('group', range(len(benchmark.presets)*2))
+def test_group_names_match_cases(group):
+    names, prepare = benchmark.groups(2, plot=False)[group]
+    assert sorted(names) == sorted(prepare())
@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+
+import calcServer
+import calculatingModule
+import loadTest
+from calcTypes import Params
+
+point = dict(E_gap=1.12, E_d=0.05, N_d0=1e16, E_as=0.5, N_as=1e12)
+
+
+async def raw_request(port, data):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(data)
+    await writer.drain()
+    answer = await reader.read()
+    writer.close()
+    head, _, body = answer.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+def post(path, body):
+    body = json.dumps(body).encode()
+    return f'POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+
+
+def run_with_server(scenario, **settings):
+    async def main():
+        ready = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(calcServer.serve(port=0, ready=ready.set_result, **settings))
+        port = await ready
+        try:
+            return await scenario(port)
+        finally:
+            server.cancel()
+            try:
+                await server
+            except asyncio.CancelledError:
+                pass
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize('values', [point, dict(point, E_as=2.0), dict(point, E_out=-1e12), dict(point, mat='Si', T=-5)])
+def test_calculate_matches_module(values):
+    status, answer = run_with_server(lambda port: raw_request(port, post('/calculate', values)))
+    assert status == 200
+    expected = calculatingModule.calculate(Params(**values))
+    assert answer['message'] == expected.message
+    if expected.ok:
+        assert answer['phi'] == pytest.approx(expected.phi, abs=1e-5)
+
+
+def test_batch_deduplicates():
+    points = [point] * 5 + [dict(point, N_as=1e13)]
+
+    async def scenario(port):
+        status, answer = await raw_request(port, post('/batch', dict(points=points)))
+        _, metrics = await raw_request(port, b'GET /metrics HTTP/1.1\r\nConnection: close\r\n\r\n')
+        return status, answer, metrics
+
+    status, answer, metrics = run_with_server(scenario, window=0.01)
+    assert status == 200
+    assert len(answer['results']) == 6 and len({row['phi'] for row in answer['results']}) == 2
+    assert metrics['calculated'] == 2 and metrics['deduplicated'] == 4
+
+
+@pytest.mark.parametrize('data, status', [
+    (b'POST /calculate HTTP/1.1\r\nContent-Length: abc\r\n\r\n', 400),
+    (b'nonsense\r\n\r\n', 400),
+    (post('/calculate', dict(E_gap=1.0)), 400),
+    (post('/calculate', dict(point, mat='X')), 400),
+    (post('/nowhere', {}), 404),
+    (b'GET /calculate HTTP/1.1\r\nConnection: close\r\n\r\n', 405),
+])
+def test_bad_requests(data, status):
+    answer_status, answer = run_with_server(lambda port: raw_request(port, data))
+    assert answer_status == status
+    assert 'error' in answer
+
+
+def test_failing_row_fails_only_its_request(monkeypatch):
+    make_result = calcServer.make_result
+
+    def broken(row, engine='depletion'):
+        if row['status'] != calculatingModule.STATUS_OK:
+            raise RuntimeError('broken row')
+        return make_result(row, engine)
+
+    monkeypatch.setattr(calcServer, 'make_result', broken)
+
+    async def scenario(port):
+        return await asyncio.gather(raw_request(port, post('/calculate', point)),
+                                    raw_request(port, post('/calculate', dict(point, E_as=2.0))))
+
+    (good, answer), (bad, error) = run_with_server(scenario, window=0.05)
+    assert good == 200 and answer['message'] == 'ok'
+    assert bad == 500 and 'broken row' in error['error']
+
+
+def test_load_test_against_server():
+    scenario = lambda port: loadTest.run('127.0.0.1', port, requests=300, concurrency=16, distinct=20)
+    latencies, statuses, wall, metrics = run_with_server(scenario, window=0.005)
+    assert (statuses == 200).all() and (latencies > 0).all()
+    # 20 разных точек: остальное - из кэша или склеено с одинаковыми в пакете
+    assert metrics['requests'] == 300 and metrics['failed'] == 0
+    assert metrics['calculated'] == 20
+    assert metrics['calculated'] + metrics['deduplicated'] + metrics['cache_hits'] == 300
+    assert metrics['batches'] < 300
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import calcSession
+import calculatingModule
+from calcTypes import Params
+
+
+def test_check_sees_epsilon_change():
+    session = calcSession.Session()
+    params = Params(E_gap=1.12, E_d=0.05, N_d0=1e16, E_as=0.5, N_as=1e12, epsilon=11.7)
+    assert session.calculate(params).ok
+    changed = params.replace(epsilon=-1.0)
+    results = session.calculate(changed)
+    assert 'check' in session.recomputed
+    assert results.message == calculatingModule.calculate(changed).message
+    assert 'диэлектрическая проницаемость' in results.message
+
+
+base = Params(E_gap=1.12, E_d=0.05, N_d0=1e16, E_as=0.5, N_as=1e12, mat='Si')
+
+
+@pytest.mark.parametrize('changes, recomputed', [
+    (dict(E_out=1e5), ('material', 'check', 'phi', 'W', 'profile')),
+    (dict(T=310), ('material', 'Nc', 'check', 'E_f', 'phi', 'W', 'profile')),
+    (dict(N_d0=2e16), ('material', 'scond', 'Nc', 'check', 'E_f', 'phi', 'W', 'profile')),
+    # проверка параметров от E_d не зависит
+    (dict(E_d=0.06), ('material', 'scond', 'Nc', 'E_f', 'phi', 'W', 'profile')),
+])
+def test_only_dependent_stages_are_recomputed(changes, recomputed):
+    session = calcSession.Session()
+    session.calculate(base)
+    results = session.update(**changes)
+    assert session.recomputed == recomputed
+    expected = calculatingModule.calculate(base.replace(**changes))
+    assert results.phi == pytest.approx(expected.phi, rel=1e-8)
+    assert results.W == pytest.approx(expected.W, rel=1e-8)
+    assert np.allclose(results.E_v_s, expected.E_v_s, rtol=1e-8)
+
+
+def test_same_params_recompute_nothing():
+    session = calcSession.Session()
+    first = session.calculate(base)
+    assert session.calculate(base).profile is first.profile
+    assert session.recomputed == ()
+
+
+def test_unchanged_value_keeps_later_stages():
+    # у 'custom' E_d не входит в полупроводник без примесей: уровень Ферми тот же
+    custom = base.replace(mat='custom')
+    session = calcSession.Session()
+    session.calculate(custom)
+    session.update(E_d=0.06)
+    assert 'E_f' in session.recomputed and 'phi' not in session.recomputed and 'profile' in session.recomputed
+
+
+def test_poisson_session_and_errors():
+    session = calcSession.Session(engine='poisson')
+    assert session.calculate(base).phi == pytest.approx(calculatingModule.calculate(base, engine='poisson').phi)
+    with pytest.raises(ValueError):
+        calcSession.Session(engine='exact')
+    with pytest.raises(ValueError):
+        calcSession.Session().update(T=300)
@@ -0,0 +1,61 @@
+import pickle
+
+import numpy as np
+import pytest
+from fompy import constants
+
+import calculatingModule
+from calcTypes import BandProfile, E_out_to_cgs, Params, Results
+
+base = Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si')
+
+
+def test_params_are_values():
+    same = Params(**base.as_dict())
+    assert same == base and hash(same) == hash(base)
+    assert Params.from_dict(dict(base.as_dict(), extra=1)) == base
+    assert pickle.loads(pickle.dumps(base)) == base
+    assert base.replace(N_as=2e12) != base and base.replace(N_as=2e12).N_as == 2e12
+    # словарь с Params в ключах находит равный объект
+    assert {base: 1}[same] == 1
+
+
+def test_params_are_immutable():
+    with pytest.raises(AttributeError):
+        base.N_as = 1.0
+    with pytest.raises(AttributeError):
+        del base.T
+
+
+def test_cgs_units():
+    E_f = 0.3*constants.eV
+    parms = base.replace(E_out=1e5).cgs(E_f)
+    assert parms['E_gap'] == pytest.approx(1.12*constants.eV)
+    assert parms['E_as'] == pytest.approx(0.5*constants.eV)
+    assert parms['E_out'] == pytest.approx(1e5*E_out_to_cgs)
+    assert (parms['N_d0'], parms['N_as'], parms['T'], parms['E_f']) == (1e16, 1e12, 300.0, E_f)
+
+
+def test_results_levels():
+    results = calculatingModule.calculate(base)
+    assert results.ok
+    x = results.x_s
+    for name in ('E_v_s', 'E_c_s', 'E_d_s', 'E_f_s', 'E_as_s'):
+        assert getattr(results, name).shape == x.shape
+    # постоянные уровни растянуты на все x
+    assert (results.E_f_s == results.E_f).all()
+    assert results.E_c_s - results.E_v_s == pytest.approx(np.full(x.shape, base.E_gap))
+
+
+def test_failed_results_have_no_profile():
+    results = Results('Ошибка!')
+    assert not results.ok and results.profile is None
+    assert results.x_s.size == 0 and results.E_c_s.size == 0
+
+
+def test_profile_as_structured():
+    x = np.linspace(0, 1e-5, 4)
+    profile = BandProfile(x, -x, 1 - x, 0.9 - x, 0.3, 0.5)
+    table = profile.as_structured()
+    assert table.dtype.names == ('x', 'E_v', 'E_c', 'E_d')
+    assert np.array_equal(table['E_d'], 0.9 - x)
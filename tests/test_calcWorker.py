@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import calcWorker
+
+
+class Window:
+    """Заменяет окно PySimpleGUI: события складываются в очередь."""
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def write_event_value(self, key, value):
+        self.events.put((key, value))
+
+    def next(self, timeout=2):
+        return self.events.get(timeout=timeout)
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def window():
+    return Window()
+
+
+def test_results_and_errors_come_back(window):
+    worker = calcWorker.CalcWorker(window, lambda x: 1/x)
+    request_id = worker.submit(4)
+    assert window.next() == ('-RESULT-', (request_id, 4, 0.25))
+    request_id = worker.submit(0)
+    key, (result_id, params, error) = window.next()
+    assert result_id == request_id and isinstance(error, ZeroDivisionError)
+    # после ошибки поток жив
+    worker.submit(2)
+    assert window.next()[1][2] == 0.5
+    worker.stop()
+
+
+def test_only_latest_request_is_sent(window):
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def compute(x):
+        calls.append(x)
+        started.set()
+        release.wait()
+        return x
+
+    worker = calcWorker.CalcWorker(window, compute)
+    worker.submit(1)
+    started.wait()
+    worker.submit(2)
+    last = worker.submit(3)
+    release.set()
+    assert window.next() == ('-RESULT-', (last, 3, 3))
+    # 2 заменен до начала расчета, результат 1 устарел и не отправлен
+    assert calls == [1, 3] and window.events.empty()
+    worker.stop()
+
+
+def test_neighbours_are_prefetched(window):
+    calls, prefetched = [], []
+    worker = calcWorker.CalcWorker(window, lambda x: calls.append(x) or x, cache_size=10,
+                                   prefetch=lambda x: prefetched.append(x) or -x)
+    worker.submit(0, neighbours=[1, -1])
+    window.next()
+    wait_for(lambda: 1 in worker.cache and -1 in worker.cache)
+    # ответ из кэша приходит прямо из submit, без расчета
+    request_id = worker.submit(1, neighbours=[0, 2])
+    assert window.events.get_nowait() == ('-RESULT-', (request_id, 1, -1))
+    wait_for(lambda: 2 in worker.cache)
+    worker.stop()
+    assert calls == [0] and prefetched == [1, -1, 2]
+
+
+def test_stream_stops_on_newer_request(window):
+    release = threading.Event()
+
+    def compute(n):
+        yield n
+        release.wait()
+        yield n + 1
+
+    worker = calcWorker.StreamWorker(window, compute)
+    first = worker.submit(10)
+    assert window.next() == ('-STREAM-', (first, 10, 10))
+    second = worker.submit(20)
+    release.set()
+    assert window.next() == ('-STREAM-', (second, 20, 20))
+    assert window.next() == ('-STREAM-', (second, 20, 21))
+    assert window.events.empty()
+    worker.stop()
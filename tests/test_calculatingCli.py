@@ -0,0 +1,56 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+import calculatingCli
+import calculatingModule
+from calcTypes import Params
+
+point = dict(E_gap=1.12, E_d=0.05, N_d0=1e16, E_as=0.5, N_as=1e12)
+
+
+def options(**values):
+    return [f'--{name}={value}' for name, value in values.items()]
+
+
+def test_csv_round_trip(tmp_path):
+    source = tmp_path / 'points.csv'
+    with open(source, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['mat', 'N_d0', 'T'])
+        writer.writerows([['custom', 1e16, 300], ['Si', 1e15, 350], ['custom', 1e16, -5]])
+    output = tmp_path / 'results.npy'
+    assert calculatingCli.main(['-i', str(source), '-o', str(output)] + options(**point)) == 0
+    table = np.load(output)
+    assert table['status'].tolist() == [calculatingModule.STATUS_OK, calculatingModule.STATUS_OK,
+                                        calculatingModule.STATUS_INVALID]
+    for row in table[:2]:
+        params = Params(**{name: row[name].item() for name in Params.names})
+        # уровень Ферми calculate_batch совпадает с fompy с точностью 1e-6 E_gap
+        assert np.isclose(row['phi'], calculatingModule.calculate(params).phi, rtol=0, atol=1e-5)
+
+
+def test_json_and_csv_output(tmp_path, capsys):
+    source = tmp_path / 'points.json'
+    source.write_text(json.dumps([dict(point, N_as=1e12), dict(point, N_as=1e13)]))
+    assert calculatingCli.main(['-i', str(source)]) == 0
+    rows = list(csv.DictReader(capsys.readouterr().out.splitlines()))
+    assert [float(row['N_as']) for row in rows] == [1e12, 1e13]
+    assert float(rows[0]['phi']) < float(rows[1]['phi'])
+
+
+@pytest.mark.parametrize('name, text', [('empty.json', '[]'), ('empty.csv', 'E_gap,N_d0\n'), ('columns.json', '{"E_gap": []}')])
+def test_empty_input(tmp_path, capsys, name, text):
+    source = tmp_path / name
+    source.write_text(text)
+    assert calculatingCli.main(['-i', str(source)]) == 2
+    assert 'empty input' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('values', [dict(point, mat='Si', T=-5), dict(point, E_as=2.0), dict(point, E_out=-1e12)])
+def test_single_point_message(capsys, values):
+    assert calculatingCli.main(options(**values)) == 1
+    params = Params(**values)
+    assert capsys.readouterr().err.strip() == calculatingModule.calculate(params).message
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import calcSession
+import calculatingModule
+import validation
+from calcTypes import Params
+
+base = Params(E_gap=1.12, E_d=0.05, N_d0=1e16, E_as=0.5, N_as=1e12)
+
+
+@pytest.mark.parametrize('params', [base.replace(T=-1), base.replace(mat='Si', T=-5), base.replace(T=0)])
+def test_calculate_negative_T_is_invalid(params):
+    results = calculatingModule.calculate(params)
+    batch = calculatingModule.calculate_batch(*(getattr(params, name) for name in
+                                                ('E_gap', 'E_d', 'N_d0', 'E_as', 'N_as', 'T', 'E_out', 'mat')))
+    assert not results.ok
+    assert batch['status'][0] == calculatingModule.STATUS_INVALID
+    assert results.message == validation.message(batch['errors'][0])
+    assert batch['errors'][0] & validation.NOT_POSITIVE
+    assert calcSession.Session().calculate(params).message == results.message
+
+
+def test_calculate_matches_batch():
+    points = [base, base.replace(mat='Si'), base.replace(N_as=1e13, E_out=1e5), base.replace(T=400)]
+    batch = calculatingModule.calculate_batch(**{name: [getattr(p, name) for p in points] for name in Params.names})
+    for i, params in enumerate(points):
+        results = calculatingModule.calculate(params)
+        assert results.ok
+        assert np.isclose(results.phi, batch['phi'][i], rtol=1e-6)
+        assert np.isclose(results.W, batch['W'][i], rtol=1e-6)
+
+
+@pytest.mark.parametrize('spacing', ['uniform', 'adaptive'])
+def test_band_profile_rows_match_points(spacing):
+    results = calculatingModule.calculate(base, n_points=41, spacing=spacing)
+    profile = results.profile
+    s = calculatingModule.profile_grid(41, spacing)
+    assert profile.x == pytest.approx(results.W*s)
+    # обеднение: парабола с вершиной в x = W, дальше зоны плоские
+    assert profile.E_v == pytest.approx(results.phi*np.clip(1 - s, 0, None)**2)
+    assert profile.E_c - profile.E_v == pytest.approx(np.full(41, base.E_gap))
+    # линия доноров, как и в make_points, идет на E_d над валентной зоной
+    assert profile.E_d - profile.E_v == pytest.approx(np.full(41, base.E_d))
+    # строки пакета совпадают с отдельными точками
+    rows = calculatingModule.band_profile([results.phi, 2*results.phi], [results.W, results.W], base.E_gap, base.E_d,
+                                          base.E_as, [results.E_f, results.E_f], 41, spacing)
+    assert rows.E_v.shape == (2, 41)
+    assert rows.E_v[0] == pytest.approx(profile.E_v)
+    assert rows.E_v[1] == pytest.approx(2*profile.E_v)
+
+
+def test_profile_grid():
+    s = calculatingModule.profile_grid(40, 'adaptive')
+    assert s[0] == 0 and s[-1] == 2 and (np.diff(s) > 0).all()
+    assert (s < 1).sum() == 30
+    # у поверхности точки гуще, чем в объеме
+    assert np.diff(s)[0] < np.diff(s)[-1]
+    with pytest.raises(ValueError):
+        calculatingModule.profile_grid(40, 'log')
+
+
+def test_batch_broadcasts_and_mixes_statuses():
+    N_as = np.array([1e11, 1e12, 1e13, 1e12])
+    mat = np.array(['Si', 'Ge', 'GaAs', 'Si'], dtype=object)
+    # скаляры растягиваются на все строки, плохая строка не мешает остальным
+    batch = calculatingModule.calculate_batch(1.0, 0.05, 1e16, 0.5, N_as, np.array([300, 300, 300, -1]), 0, mat,
+                                              profile_points=7)
+    assert list(batch['status']) == [calculatingModule.STATUS_OK]*3 + [calculatingModule.STATUS_INVALID]
+    assert np.isnan(batch['phi'][3]) and batch['errors'][3] & validation.NOT_POSITIVE
+    assert batch['profile'].E_v.shape == (4, 7)
+    for i in range(3):
+        results = calculatingModule.calculate(Params(1.0, 0.05, 1e16, 0.5, N_as[i], mat=mat[i]), n_points=7)
+        assert batch['phi'][i] == pytest.approx(results.phi, rel=1e-6)
+        assert batch['profile'].E_c[i] == pytest.approx(results.E_c_s, rel=1e-5)
+
+
+def test_batch_rejects_unknown_options():
+    with pytest.raises(ValueError):
+        calculatingModule.calculate_batch(1.12, 0.05, 1e16, 0.5, 1e12, 300, 0, 'Si', engine='exact')
+    with pytest.raises(ValueError):
+        calculatingModule.calculate_batch(1.12, 0.05, 1e16, 0.5, 1e12, 300, 0, 'Si', engine='poisson', sensitivities=True)
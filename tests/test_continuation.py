@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from fompy import constants
+
+import calculatingModule
+import continuation
+from calcTypes import Params, E_out_to_cgs
+
+base = Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si')
+
+
+def test_follow_matches_calculate():
+    values = np.logspace(11, 14, 40)
+    path = continuation.follow(base, 'N_as', values)
+    assert np.allclose(path.values, values, rtol=1e-12)
+    for i in (0, 17, 39):
+        results = calculatingModule.calculate(base.replace(N_as=values[i]))
+        assert path.status[i] == calculatingModule.STATUS_OK
+        assert path.phi[i] == pytest.approx(results.phi, abs=1e-5)
+        assert path.W[i] == pytest.approx(results.W, rel=1e-4)
+    # прогноз по предыдущим точкам: на гладком пути Ньютону почти нечего делать
+    assert np.mean(path.iterations[2:]) < 4
+
+
+def test_follow_empty():
+    path = continuation.follow(base, 'N_as', [])
+    assert path.values.size == 0 and path.status.size == 0
+    assert path.status.dtype == np.int8
+
+
+def test_trace_locates_boundary():
+    # выше E_out = N_as*e/E_out_to_cgs поле сильнее акцепторов: validation отбрасывает точку
+    stop = 3e7
+    path = continuation.trace(base, 'E_out', 0, stop)
+    boundary = base.N_as * constants.e / E_out_to_cgs
+    first = np.flatnonzero(path.status != calculatingModule.STATUS_OK)[0]
+    assert path.jumps[first]
+    assert path.values[first - 1] <= boundary < path.values[first]
+    assert path.values[first] - path.values[first - 1] <= 1e-6 * stop * (1 + 1e-9)
+    assert path.values[-1] == stop
+
+
+def test_trace_matches_calculate():
+    path = continuation.trace(base, 'T', 200, 500)
+    assert path.values[0] == 200 and path.values[-1] == 500
+    assert (path.status == calculatingModule.STATUS_OK).all()
+    for i in (0, len(path.values) // 2, -1):
+        results = calculatingModule.calculate(base.replace(T=path.values[i]))
+        assert path.phi[i] == pytest.approx(results.phi, abs=1e-5)
+
+
+def test_unknown_parameter():
+    with pytest.raises(ValueError):
+        continuation.follow(base, 'mat', [1.0])
+    with pytest.raises(ValueError):
+        continuation.Tracer(base, 'T', scale='cubic')
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+import calculatingModule
+import diagnostics
+from calcTypes import Params
+
+base = Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si')
+
+
+def test_calculate_records_stages():
+    stats = diagnostics.stats
+    stats.reset()
+    results = calculatingModule.calculate(base.replace(N_as=2.5e12), diagnostics=True)
+    diag = results.diagnostics
+    assert list(diag.stages) == ['set_material', 'create_scond', 'checkparms', 'fermi_level', 'phi', 'W', 'band_profile']
+    assert diag.total == pytest.approx(sum(diag.stages.values())) and diag.total > 0
+    assert diag.iterations > 0 and diag.residual < 1e-6
+    # тот же объем: полупроводник и уровень Ферми уже в кэше
+    diag = calculatingModule.calculate(base.replace(N_as=2.6e12), diagnostics=True).diagnostics
+    assert diag.cache == {'scond': True, 'fermi_level': True}
+    assert stats.calls == 2 and stats.errors == 0 and stats.cache_hits['scond'] >= 1
+    # без диагностики ничего не собирается
+    assert calculatingModule.calculate(base).diagnostics is None
+    assert stats.calls == 2
+
+
+def test_poisson_stages():
+    diag = calculatingModule.calculate(base, engine='poisson', diagnostics=True).diagnostics
+    assert diag.engine == 'poisson' and 'poisson' in diag.stages and 'phi' not in diag.stages
+    assert diag.iterations > 0
+
+
+def test_stats_histograms():
+    stats = diagnostics.Stats()
+    for seconds in (2e-6, 2e-5, 2e-5, 3e-3):
+        stats.add_stage('plot', seconds)
+    diag = diagnostics.Diagnostics()
+    diag.stages['phi'] = 1e-4
+    diag.iterations = 7
+    stats.add(diag, ok=False)
+    # верхняя граница корзины, куда попал квантиль
+    assert 2e-5 <= stats.quantile('plot', 0.5) < 2e-5*10**0.25
+    assert 3e-3 <= stats.quantile('plot', 1.0) < 3e-3*10**0.25
+    dump = json.loads(json.dumps(stats.dump()))
+    assert dump['calls'] == 1 and dump['errors'] == 1 and dump['iterations'] == {'7': 1}
+    assert dump['stages']['plot']['count'] == 4 and sum(dump['stages']['plot']['hist']) == 4
+    assert 'solver iterations: mean 7.0, max 7' in stats.summary()
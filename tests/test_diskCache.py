@@ -0,0 +1,99 @@
+import pickle
+
+import numpy as np
+import pytest
+
+import calculatingModule
+import diskCache
+from calcTypes import Params
+
+base = Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si')
+batch_names = ('E_gap', 'E_d', 'N_d0', 'E_as', 'N_as', 'T', 'E_out', 'mat')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = diskCache.DiskCache(str(tmp_path / 'results.sqlite'))
+    yield cache
+    cache.close()
+
+
+def key_of(params):
+    return diskCache.make_key('calculate', params=params.as_dict(), n_points=31, spacing='uniform', engine='depletion',
+                              format=diskCache.results_format)
+
+
+def test_calculate_round_trip(cache):
+    calls = []
+    compute = lambda p: calls.append(p) or calculatingModule.calculate(p)
+    first = cache.calculate(base, compute=compute)
+    second = cache.calculate(base, compute=compute)
+    assert len(calls) == 1
+    assert cache.info()['hits'] == 1
+    assert (second.message, second.phi, second.W, second.E_f) == (first.message, first.phi, first.W, first.E_f)
+    for name in ('x_s', 'E_v_s', 'E_c_s', 'E_d_s', 'E_f_s', 'E_as_s'):
+        assert np.array_equal(getattr(second, name), getattr(first, name))
+
+
+def test_failed_result_round_trip(cache):
+    params = base.replace(T=-1)
+    first = cache.calculate(params)
+    second = cache.calculate(params)
+    assert not second.ok and second.profile is None
+    assert second.message == first.message
+
+
+class Payload:
+    called = False
+
+    def __reduce__(self):
+        return (Payload.mark, ())
+
+    @staticmethod
+    def mark():
+        Payload.called = True
+
+
+@pytest.mark.parametrize('blob', [pickle.dumps(Payload()), b'', b'{"message":"ok"}\n', b'{"message":"ok","points":null}\n1234'])
+def test_foreign_values_are_not_loaded(cache, blob):
+    cache.put(key_of(base), blob)
+    results = cache.calculate(base)
+    assert not Payload.called
+    assert results.ok and results.phi == pytest.approx(calculatingModule.calculate(base).phi)
+    assert cache.info()['errors'] == 1
+    # испорченное значение перезаписано верным
+    assert cache.calculate(base).phi == results.phi
+    assert cache.info()['errors'] == 1
+
+
+def test_calculate_batch_matches_module(cache):
+    points = [base, base.replace(N_as=1e13), base.replace(T=-1), base]
+    columns = {name: np.array([getattr(p, name) for p in points]) for name in batch_names}
+    expected = calculatingModule.calculate_batch(**columns, profile_points=5)
+    for _ in range(2):
+        results = cache.calculate_batch(**columns, profile_points=5)
+        for name in diskCache.row_columns:
+            assert np.array_equal(results[name], expected[name], equal_nan=True)
+            assert results[name].dtype == expected[name].dtype
+        assert np.array_equal(results['profile'].E_c, expected['profile'].E_c, equal_nan=True)
+    # одинаковые строки хранятся один раз, второй вызов ничего не считает
+    assert cache.info()['size'] == 3
+    assert (cache.info()['misses'], cache.info()['hits']) == (3, 3)
+
+
+def test_eviction(tmp_path):
+    cache = diskCache.DiskCache(str(tmp_path / 'small.sqlite'), max_bytes=3000)
+    for N_as in np.logspace(11, 13, 10):
+        cache.calculate(base.replace(N_as=N_as))
+    info = cache.info()
+    assert info['bytes'] <= 3000
+    assert 0 < info['size'] < 10
+    cache.close()
+
+
+def test_unusable_path_is_a_no_op(tmp_path):
+    # на месте каталога базы - файл: база не открывается, а расчет все равно идет
+    (tmp_path / 'file').write_text('')
+    cache = diskCache.DiskCache(str(tmp_path / 'file' / 'results.sqlite'))
+    assert cache.calculate(base).ok
+    assert cache.info()['errors'] > 0
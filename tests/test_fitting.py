@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import calculatingModule
+import fitting
+from calcTypes import Params
+
+base = calculatingModule.set_material(Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si'))
+T = np.linspace(200, 400, 5)
+
+
+def measure(params):
+    columns = {name: np.repeat(getattr(params, name), T.size) for name in Params.names}
+    results = calculatingModule.calculate_batch(**dict(columns, T=T))
+    return results['phi'], results['W']
+
+
+@pytest.mark.parametrize('N_as, E_as', [(3e11, 0.5), (1e12, 0.5), (1e13, 0.3), (1e13, 0.9)])
+def test_recovers_partially_filled_acceptors(N_as, E_as):
+    phi, W = measure(base.replace(N_as=N_as, E_as=E_as))
+    fit = fitting.fit(base, {'T': T}, phi=phi, W=W, workers=0)
+    assert fit.converged[0]
+    assert fit.N_as[0] == pytest.approx(N_as, rel=1e-8)
+    assert fit.E_as[0] == pytest.approx(E_as, abs=1e-8)
+    assert np.isfinite(fit.errors['E_as'][0])
+
+
+@pytest.mark.parametrize('E_as', [0.1, 0.2, 0.4, 0.8])
+def test_filled_acceptors(E_as):
+    # N_as ~ 1e11: акцепторы почти все заполнены при всех T, phi задает только N_as
+    phi, W = measure(base.replace(N_as=1e11, E_as=E_as))
+    fit = fitting.fit(base, {'T': T}, phi=phi, W=W, workers=0)
+    assert fit.converged[0]
+    assert fit.N_as[0] == pytest.approx(1e11, rel=1e-6)
+    # E_as либо найден, либо его ошибка честно больше всей запрещенной зоны
+    if fit.errors['E_as'][0] < base.E_gap:
+        assert fit.E_as[0] == pytest.approx(E_as, abs=3*fit.errors['E_as'][0] + 1e-6)
+    else:
+        assert E_as < 0.5
+    assert fit.cost[0] < 1e-6
+
+
+def test_unidentified_E_as_has_infinite_error():
+    phi, W = measure(base.replace(N_as=1e11, E_as=0.1))
+    fit = fitting.fit(base, {'T': T}, phi=phi, W=W, workers=0)
+    assert fit.errors['E_as'][0] == np.inf
+    assert np.isfinite(fit.errors['N_as'][0])
+
+
+def test_false_minimum_is_not_converged():
+    # без сетки спуск из точки у зоны проводимости застревает в ложном минимуме
+    phi, W = measure(base.replace(N_as=1e11, E_as=0.4))
+    start = base.replace(N_as=2e14, E_as=1.08)
+    stuck = fitting.fit(start, {'T': T}, phi=phi, W=W, sigma_phi=1e-4, sigma_W=1e-4*W, grid=0, workers=0)
+    assert not stuck.converged[0]
+    fit = fitting.fit(start, {'T': T}, phi=phi, W=W, sigma_phi=1e-4, sigma_W=1e-4*W, workers=0)
+    assert fit.converged[0]
+    assert fit.N_as[0] == pytest.approx(1e11, rel=1e-6)
+
+
+def test_noise_matches_errors():
+    rng = np.random.default_rng(1)
+    phi, W = measure(base)
+    n = 100
+    phi = phi + rng.normal(0, 0.01, (n, T.size))
+    W = W * (1 + rng.normal(0, 0.05, (n, T.size)))
+    fit = fitting.fit(base, {'T': T}, phi=phi, W=W, workers=0)
+    assert fit.converged.mean() > 0.95
+    assert np.mean(fit.cost) == pytest.approx(np.mean(fit.dof), rel=0.3)
+    # у части образцов шум уводит в соседнюю долину, поэтому сравниваем медиану, а не разброс
+    pulls = (fit.E_as - base.E_as) / fit.errors['E_as']
+    assert 0.4 < np.median(np.abs(pulls)) < 1.2
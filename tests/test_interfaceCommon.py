@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import diskCache
+import interfaceCommon
+from calcTypes import Params
+
+vals = (1.12, 0.01, 10, 0.56, 10, 0.36, 0.81, 11.7, 300, 1)
+
+
+def get_params(vals, mat):
+    # как getParams в interfaceL: концентрации и поле в единицах слайдеров
+    return Params(float(vals[0]), float(vals[1]), float(vals[2])*1e12, float(vals[3]), float(vals[4])*1e13,
+                  float(vals[5]), float(vals[6]), float(vals[7]), float(vals[8]), float(vals[9])*1e4, mat)
+
+
+def test_neighbours_of_moved_slider_first():
+    result = interfaceCommon.neighbours(vals, 'custom', get_params, 'SL9')
+    depth = interfaceCommon.prefetch_depth
+    assert [p.T for p in result[:2*depth]] == [301, 299, 302, 298, 303, 297]
+    # потом по шагу каждого другого слайдера
+    assert len(result) == 2*depth + 2*9
+
+
+def test_neighbours_skip_locked_sliders():
+    result = interfaceCommon.neighbours(vals, 'Si', get_params)
+    assert len(result) == 2*(10 - len(interfaceCommon.locked_sliders))
+    assert all(p.E_gap == 1.12 and p.epsilon == 11.7 for p in result)
+
+
+def test_prefetch_does_not_touch_disk(tmp_path):
+    cache = diskCache.DiskCache(str(tmp_path / 'results.sqlite'))
+    calculator = interfaceCommon.Calculator(cache)
+    params = get_params(vals, 'Si')
+    assert calculator.prefetch(params).ok
+    assert cache.info()['size'] == 0
+    assert calculator.calculate(params).ok
+    assert cache.info()['size'] == 1
+    cache.close()
+
+
+def test_calculate_reports_errors(tmp_path):
+    calculator = interfaceCommon.Calculator(diskCache.DiskCache(str(tmp_path / 'results.sqlite')))
+    results = calculator.calculate({'E_gap': 1.12})
+    assert results.message.startswith('Ошибка!')
+
+
+map_values = {'-MAPN-': '5', '-MAPX-': 'N_as', '-MAPX0-': '1e12', '-MAPX1-': '1e14',
+              '-MAPY-': 'E_as', '-MAPY0-': '0.1', '-MAPY1-': '1'}
+
+
+def test_map_request():
+    base = get_params(vals, 'Si')
+    request = interfaceCommon.map_request(base, map_values)
+    assert request[0] is base and request[1] == 'N_as' and request[3] == 'E_as'
+    assert np.allclose(request[2], np.logspace(12, 14, 5))
+    for change in ({'-MAPN-': '1'}, {'-MAPY-': 'N_as'}, {'-MAPX0-': 'a'}, {'-MAPX0-': '0'}):
+        with pytest.raises(ValueError):
+            interfaceCommon.map_request(base, dict(map_values, **change))
+
+
+def test_map_choices_exclude_other_axis():
+    x_names, y_names = interfaceCommon.map_choices('N_as', 'E_as')
+    assert 'E_as' not in x_names and 'N_as' in x_names
+    assert 'N_as' not in y_names and 'E_as' in y_names
+    assert 'mat' not in x_names
@@ -0,0 +1,55 @@
+import pytest
+
+import calculatingModule
+import lruCache
+from calcTypes import Params
+
+base = Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si')
+
+
+def test_least_recently_used_is_dropped():
+    cache = lruCache.LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a', lambda: 0) == 1
+    cache.put('c', 3)
+    # 'b' использовался раньше всех
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.peek('b', 'none') == 'none'
+    assert cache.info() == dict(hits=1, misses=1, size=2, maxsize=2)
+
+
+def test_exceptions_are_not_cached():
+    cache = lruCache.LRUCache()
+
+    def fail():
+        raise ValueError('no root')
+
+    with pytest.raises(ValueError):
+        cache.get('key', fail)
+    assert 'key' not in cache
+    assert cache.get('key', lambda: 5) == 5
+    cache.clear()
+    assert len(cache) == 0 and cache.info()['misses'] == 0
+
+
+def test_surface_sliders_reuse_semiconductor():
+    calculatingModule.scond_cache.clear()
+    calculatingModule.fermi_cache.clear()
+    first = calculatingModule.calculate(base)
+    # N_as, E_as и E_out не меняют объем: полупроводник и уровень Ферми берутся из кэша
+    for changes in (dict(N_as=3e12), dict(E_as=0.6), dict(E_out=1e5)):
+        assert calculatingModule.calculate(base.replace(**changes)).E_f == first.E_f
+    info = calculatingModule.cache_info()
+    assert info['scond']['size'] == 1 and info['fermi_level']['size'] == 1
+    calculatingModule.calculate(base.replace(N_d0=1e17))
+    assert calculatingModule.cache_info()['scond']['size'] == 2
+
+
+@pytest.mark.parametrize('T, guess', [(300, 310), (300, 150), (600, 300), (77, 300)])
+def test_fermi_level_near_matches_fompy(T, guess):
+    scond = calculatingModule.create_scond(base)
+    E_f0 = scond.fermi_level(guess)
+    expected = scond.fermi_level(T)
+    # fompy ищет корень бисекцией до 1e-6 E_gap
+    assert calculatingModule.fermi_level_near(scond, T, E_f0) == pytest.approx(expected, abs=2e-6*scond.Eg)
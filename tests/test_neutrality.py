@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from fompy import constants
+
+import calculatingModule
+import neutrality
+from calcTypes import Params
+
+
+def test_fast_matches_fompy():
+    eV, kT = neutrality.validate(size=200, seed=1, accuracy='fast')
+    assert kT < 0.004
+
+
+def test_exact_matches_fompy():
+    # E_gap до 3 эВ, а бисекция fompy точна до 1e-6 E_gap
+    eV, kT = neutrality.validate(size=200, seed=1, accuracy='exact')
+    assert eV < 3e-6
+
+
+def test_warm_start():
+    columns = dict(E_gap=np.full(50, 1.12), E_d=np.full(50, 0.05), N_d0=np.logspace(12, 18, 50),
+                   T=np.full(50, 300.0), m_e=0.36, m_h=0.81)
+    cold = neutrality.fermi_level(**columns)
+    warm = neutrality.fermi_level(**columns, E_f0=cold.root * (1 + 1e-4))
+    assert cold.converged.all() and warm.converged.all()
+    assert np.allclose(warm.root, cold.root, rtol=1e-9, atol=0)
+    assert warm.iterations.sum() < cold.iterations.sum()
+
+
+def test_intrinsic_custom_rows():
+    # 'custom' - собственный полупроводник: доноры не учитываются
+    params = calculatingModule.set_material(Params(1.0, 0.05, 1e17, 0.5, 1e12, 0.5, 0.5, 10.0, 300.0, 0.0, 'custom'))
+    reference = calculatingModule.create_scond(params).fermi_level(params.T)
+    E_f = neutrality.fermi_level(1.0, 0.05, 1e17, 300.0, 0.5, 0.5, doped=False, accuracy='exact').root
+    assert float(E_f) == pytest.approx(reference, abs=1e-6 * params.E_gap_erg)
+
+
+@pytest.mark.parametrize('accuracy', neutrality.accuracies)
+def test_gradient_matches_differences(accuracy):
+    point = dict(E_gap=1.12, E_d=0.05, N_d0=1e16, T=300.0, m_e=0.36, m_h=0.81)
+    level = lambda **change: float(neutrality.fermi_level(**dict(point, **change), accuracy=accuracy).root)
+    gradient = neutrality.fermi_level_gradient(level(), **point, accuracy=accuracy)
+    for name, step in dict(E_gap=1e-4, E_d=1e-4, N_d0=1e12, T=1e-2, m_e=1e-4, m_h=1e-4).items():
+        # сравниваем изменения E_f на шаге: у производных разные единицы
+        change = (level(**{name: point[name] + step}) - level(**{name: point[name] - step})) / 2
+        assert float(gradient[name])*step == pytest.approx(change, rel=1e-4, abs=1e-10*constants.eV), name
+
+
+def test_unknown_accuracy():
+    with pytest.raises(ValueError):
+        neutrality.fd_half(np.array([0.0]), 'rough')
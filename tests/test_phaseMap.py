@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import calculatingModule
+import phaseMap
+from calcTypes import Params
+
+base = Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si')
+
+
+def test_same_axis_is_rejected():
+    x = phaseMap.axis('N_as', 1e11, 1e13, 4)
+    with pytest.raises(ValueError):
+        phaseMap.evaluate(base, 'N_as', x, 'N_as', x, np.arange(4), np.arange(4))
+    with pytest.raises(ValueError):
+        phaseMap.compute_map(base, 'T', [300, 400], 'T', [300, 400])
+
+
+def test_axis():
+    assert np.allclose(phaseMap.axis('N_as', 1e12, 1e14, 3), [1e12, 1e13, 1e14])
+    assert np.allclose(phaseMap.axis('T', 200, 400, 3), [200, 300, 400])
+    with pytest.raises(ValueError):
+        phaseMap.axis('N_as', 0, 1e14, 3)
+    with pytest.raises(ValueError):
+        phaseMap.axis('mat', 0, 1, 3)
+
+
+def test_map_matches_calculate():
+    x = phaseMap.axis('N_as', 1e11, 1e13, 5)
+    y = phaseMap.axis('E_as', 0.2, 0.9, 4)
+    maps = phaseMap.compute_map(base, 'N_as', x, 'E_as', y)
+    assert maps['phi'].shape == (4, 5)
+    for row, col in ((0, 0), (2, 3), (3, 4)):
+        results = calculatingModule.calculate(base.replace(N_as=x[col], E_as=y[row]))
+        assert maps['phi'][row, col] == pytest.approx(results.phi, abs=1e-5)
+
+
+def test_progressive_ends_with_full_map():
+    x = phaseMap.axis('N_as', 1e11, 1e13, 70)
+    y = phaseMap.axis('T', 200, 400, 65)
+    levels = list(phaseMap.progressive(base, 'N_as', x, 'T', y, coarse=16))
+    strides = [stride for stride, _ in levels]
+    assert strides == sorted(strides, reverse=True) and strides[-1] == 1
+    full = phaseMap.compute_map(base, 'N_as', x, 'T', y)
+    for name in phaseMap.quantities:
+        assert np.allclose(levels[-1][1][name], full[name], equal_nan=True)
+    # грубые уровни - те же точки, что и полная карта
+    stride, coarse = levels[0]
+    assert np.allclose(coarse['phi'], full['phi'][::stride, ::stride], equal_nan=True)
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import calculatingModule
+import plotModel
+from calcTypes import Params, Results
+
+base = Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si')
+
+
+class Canvas(FigureCanvasAgg):
+    """Canvas без окна, считает полные перерисовки и blit."""
+
+    draws = blits = 0
+
+    def draw(self):
+        self.draws += 1
+        super().draw()
+
+    def blit(self, bbox=None):
+        self.blits += 1
+
+
+@pytest.fixture
+def plot():
+    figure = Figure()
+    canvas = Canvas(figure)
+    return plotModel.BandPlot(figure.add_subplot(), canvas)
+
+
+def test_small_changes_are_blitted(plot):
+    plot.update(calculatingModule.calculate(base))
+    assert plot.visible and plot.canvas.draws == 1
+    for N_as in (1.01e12, 1.02e12, 1.03e12):
+        plot.update(calculatingModule.calculate(base.replace(N_as=N_as)))
+    assert plot.canvas.draws == 1 and plot.canvas.blits == 3
+
+
+def test_lines_show_results(plot):
+    results = calculatingModule.calculate(base)
+    plot.update(results)
+    lines = dict(zip([name for _, name in plotModel.band_lines], plot.lines))
+    assert np.array_equal(lines['E_c'].get_xdata(), results.x_s)
+    assert np.array_equal(lines['E_c'].get_ydata(), results.E_c_s)
+    # постоянный уровень - две точки по краям
+    assert list(lines['E_f'].get_ydata()) == [results.E_f, results.E_f]
+    assert plot.phi_line.get_ydata()[0] == results.phi and plot.W_line.get_xdata()[0] == results.W
+    x_lo, x_hi = plot.ax.get_xlim()
+    assert x_lo < 0 and x_hi > max(results.W, results.x_s.max())
+
+
+def test_limits_follow_large_changes(plot):
+    plot.update(calculatingModule.calculate(base))
+    # на порядок меньший W занимает меньше половины оси: пределы меняются
+    plot.update(calculatingModule.calculate(base.replace(N_d0=1e18)))
+    assert plot.canvas.draws == 2
+
+
+def test_failed_results_hide_plot(plot):
+    plot.update(calculatingModule.calculate(base))
+    plot.update(Results('Ошибка!'))
+    assert not plot.visible and not any(line.get_visible() for line in plot.lines)
+    assert plot.canvas.draws == 2
+    plot.update(Results('Ошибка!'))
+    assert plot.canvas.draws == 2
+
+
+def test_map_plot():
+    figure = Figure()
+    map_plot = plotModel.MapPlot(figure.add_subplot(), Canvas(figure))
+    x, y = np.linspace(0, 1, 4), np.linspace(0, 2, 3)
+    data = np.outer(y, x)
+    data[0, 0] = np.nan
+    map_plot.update(x, y, data, 'phi', 'x', 'y')
+    assert map_plot.image.get_clim() == (0, 2) and map_plot.contours is None
+    map_plot.update(x, y, data, 'phi', 'x', 'y', filled=True)
+    assert map_plot.contours is not None and not map_plot.image.get_visible()
+    assert map_plot.colorbar.ax.get_ylabel() == plotModel.map_labels['phi']
+    # все точки пустые: контуры не строятся
+    map_plot.update(x, y, np.full((3, 4), np.nan), 'W', 'x', 'y', filled=True)
+    assert map_plot.contours is None and map_plot.image.get_visible()
+    assert map_plot.image.get_clim() == (0, 1)
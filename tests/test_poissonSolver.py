@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from fompy import constants
+from scipy.integrate import quad
+
+import calculatingModule
+import fermiDirac
+import poissonSolver
+from calcTypes import Params
+
+base = calculatingModule.set_material(Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si'))
+names = ('E_gap', 'E_d', 'N_d0', 'E_as', 'N_as', 'T', 'E_out', 'm_e', 'm_h', 'epsilon')
+
+
+def solve(*points, **kwargs):
+    columns = [[getattr(p, name) for p in points] for name in names]
+    return poissonSolver.solve(*columns, **kwargs)
+
+
+@pytest.mark.parametrize('eta', [-30.0, -5.0, -1.0, 0.0, 1.3, 5.0, 20.0])
+def test_fd_half_matches_integral(eta):
+    exact = quad(lambda x: np.sqrt(x)/(1 + np.exp(x - eta)), 0, max(eta, 0) + 60)[0]
+    f, df = fermiDirac.fd_half_both(eta)
+    assert fermiDirac.fd_half(eta) == f
+    assert f == pytest.approx(exact, rel=4e-3)
+    step = 1e-5
+    assert df == pytest.approx((fermiDirac.fd_half(eta + step) - fermiDirac.fd_half(eta - step))/(2*step), rel=1e-6)
+
+
+def test_depletion_matches_depletion_engine():
+    points = [base, base.replace(N_as=3e12), base.replace(N_d0=1e17)]
+    solution = solve(*points)
+    assert solution.converged.all()
+    for i, params in enumerate(points):
+        results = calculatingModule.calculate(params)
+        # приближение обеднения отбрасывает хвост свободных носителей: разница порядка kT
+        assert solution.phi[i] == pytest.approx(results.phi, abs=2*constants.k*params.T/constants.eV)
+        assert solution.W[i] == pytest.approx(results.W, rel=0.05)
+        assert solution.E_f[i] == pytest.approx(results.E_f, abs=1e-4)
+
+
+def test_charge_balance():
+    # заряд области пространственного заряда равен заряду поверхности
+    points = [base, base.replace(N_as=1e10, E_out=-1e8), base.replace(T=500)]
+    solution = solve(*points)
+    for i, params in enumerate(points):
+        problem = poissonSolver.Problem(*(np.array([getattr(params, name)]) for name in names))
+        problem.fermi_level()
+        xi = solution.x[i]/problem.L_D[0]
+        u = solution.E_v[i]*constants.eV/problem.kT[0]
+        q, _ = problem.charge(problem.ef[0] - u)
+        s, _ = problem.surface(u[:1])
+        assert np.trapezoid(q, xi) == pytest.approx(s[0], rel=1e-3)
+
+
+def test_accumulation_and_batch_rows():
+    # сильное отрицательное поле притягивает электроны к поверхности: изгиб вниз
+    points = [base, base.replace(N_as=1e10, E_out=-1e8), base.replace(N_as=1e11)]
+    solution = solve(*points)
+    assert solution.converged.all()
+    assert solution.phi[1] < 0 < solution.phi[0]
+    for i, params in enumerate(points):
+        row = solve(params)
+        assert row.phi[0] == pytest.approx(solution.phi[i], rel=1e-8)
+
+
+def test_warm_start():
+    cold = solve(base)
+    warm = solve(base, phi0=cold.phi)
+    assert warm.phi[0] == pytest.approx(cold.phi[0], rel=1e-8)
+    assert warm.iterations[0] <= cold.iterations[0]
+
+
+def test_calculate_engine():
+    results = calculatingModule.calculate(base, engine='poisson')
+    solution = solve(base)
+    assert results.ok and results.phi == pytest.approx(solution.phi[0])
+    assert results.E_v_s[0] == pytest.approx(results.phi, rel=1e-3)
+    assert abs(results.E_v_s[-1]) < 0.01*results.phi
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import resultStore
+
+
+def test_columns_round_trip(tmp_path):
+    path = str(tmp_path / 'store')
+    columns = {'phi': ('f8', 10), 'status': ('i1', 10), 'E_c': ('f8', (10, 3))}
+    with resultStore.create_store(path, columns, meta={'points': 10}) as store:
+        store.write(4, {'phi': np.arange(3.0), 'status': np.array([1, 2, 3]), 'E_c': np.ones((3, 3))})
+    assert resultStore.store_exists(path)
+    store = resultStore.ResultStore(path)
+    assert store.meta == {'points': 10}
+    assert set(store.names) == set(columns) and 'phi' in store and 'x' not in store
+    assert store.dtypes['status'] == np.int8 and store.shapes['E_c'] == (10, 3)
+    assert np.array_equal(store['phi'], [0, 0, 0, 0, 0, 1, 2, 0, 0, 0])
+    assert store['E_c'][4:7].sum() == 9 and store['E_c'].sum() == 9
+    # столбцы открываются как memmap и только для чтения
+    assert isinstance(store['phi'], np.memmap)
+    with pytest.raises(ValueError):
+        store['phi'][0] = 1
+    with pytest.raises(KeyError):
+        store['x']
+
+
+def test_disjoint_writers(tmp_path):
+    path = str(tmp_path / 'store')
+    resultStore.create_store(path, {'phi': ('f8', 6)}).close()
+    first, second = resultStore.ResultStore(path, 'r+'), resultStore.ResultStore(path, 'r+')
+    first.write(0, {'phi': [1, 2, 3]})
+    second.write(3, {'phi': [4, 5, 6]})
+    first.close()
+    second.close()
+    assert np.array_equal(resultStore.ResultStore(path)['phi'], [1, 2, 3, 4, 5, 6])
+
+
+def test_store_without_header_does_not_exist(tmp_path):
+    # столбцы без заголовка - недописанное хранилище
+    np.save(tmp_path / 'phi.npy', np.zeros(3))
+    assert not resultStore.store_exists(str(tmp_path))
@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+import pytest
+from fompy import constants
+from scipy.optimize import brentq
+
+import benchmark
+import calculatingModule
+import rootSolver
+from calcTypes import Params
+
+
+def f_baseline(x, p):
+    # функция исходной версии модуля, на math
+    x_erg = x * constants.eV
+    z = (p['E_as'] + x_erg - p['E_f']) / (constants.k * p['T'])
+    return (math.sqrt(p['epsilon'] * x_erg * p['N_d0'] / (2*math.pi*constants.e**2))
+            - p['N_as'] / (1 + math.exp(min(z, 700))) - p['E_out'] / (4*math.pi*constants.e))
+
+
+def cgs(params):
+    return params.cgs(calculatingModule.get_fermi_level(params))
+
+
+points = [p for mat in benchmark.presets for p in benchmark.corpus(mat, 10)]
+
+
+@pytest.mark.parametrize('params', points, ids=lambda p: p.mat)
+def test_scalar_matches_baseline_root(params):
+    parms = cgs(params)
+    solution = calculatingModule.solve_phi(parms)
+    assert solution.status == rootSolver.CONVERGED
+    assert solution.iterations <= 20
+    expected = brentq(f_baseline, 0, 1e3, args=(parms,), xtol=1e-14, rtol=1e-12)
+    assert solution.root == pytest.approx(expected, rel=1e-9)
+
+
+@pytest.mark.parametrize('params', points[::5], ids=lambda p: p.mat)
+def test_scalar_matches_vector(params):
+    parms = cgs(params)
+    scalar = calculatingModule.solve_phi(parms)
+    vector = calculatingModule.solve_phi({name: np.atleast_1d(value) for name, value in parms.items()})
+    assert scalar.status == vector.status[0]
+    assert scalar.root == pytest.approx(vector.root[0], rel=1e-9)
+
+
+def test_bracket_expansion():
+    # поле сильнее акцепторов: корень выше E_gap, отрезок [0, E_gap] приходится удваивать
+    parms = cgs(Params(E_gap=0.2, E_d=0.05, N_d0=1e14, E_as=0.1, N_as=1e11, E_out=3e7))
+    solution = calculatingModule.solve_phi(parms)
+    assert solution.converged
+    assert solution.root > parms['E_gap'] / constants.eV
+    assert solution.root == pytest.approx(brentq(f_baseline, 0, 1e3, args=(parms,), xtol=1e-14), rel=1e-9)
+
+
+def test_warm_start():
+    parms = cgs(Params(5, 0.5, 5e13, 2.5, 5e14, epsilon=12.5, E_out=2e5))
+    cold = calculatingModule.solve_phi(parms)
+    warm = calculatingModule.solve_phi(parms, x0=cold.root * (1 + 1e-3))
+    assert warm.root == pytest.approx(cold.root, rel=1e-9)
+    assert warm.iterations < cold.iterations
+    # приближение вне отрезка не ломает решение
+    assert calculatingModule.solve_phi(parms, x0=-1.0).root == pytest.approx(cold.root, rel=1e-9)
+
+
+def test_no_bracket():
+    # сильное поле обратного знака: f > 0 уже при phi = 0, корня при phi > 0 нет
+    parms = cgs(Params(E_gap=1.12, E_d=0.05, N_d0=1e16, E_as=0.5, N_as=1e12, E_out=-1e12))
+    solution = calculatingModule.solve_phi(parms)
+    assert solution.status == rootSolver.NO_BRACKET
+    assert math.isnan(solution.root)
+    with pytest.raises(rootSolver.SolverError):
+        calculatingModule.phi_solution(parms)
+
+
+def test_solve_increasing_scalar_simple():
+    fdf = lambda x, a: (x**3 - a, 3*x**2)
+    solution = rootSolver.solve_increasing_scalar(fdf, 0.0, 10.0, 2.0)
+    assert solution.converged
+    assert solution.root == pytest.approx(2**(1/3), rel=1e-12)
+    assert rootSolver.solve_increasing_scalar(fdf, 2.0, 10.0, 2.0).status == rootSolver.NO_BRACKET
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import calculatingModule
+import sensitivity
+from calcTypes import Params
+
+points = [
+    Params(1.0, 0.1, 1e16, 0.5, 1e12, 0.5, 0.6, 11.0, 300.0, 3e5, 'custom'),
+    Params(1.12, 0.05, 1e16, 0.5, 3e12, mat='Si', T=350.0, E_out=1e6),
+    Params(1.42, 0.02, 5e15, 0.8, 1e12, mat='GaAs', T=250.0),
+]
+# шаги центральных разностей в единицах Params
+steps = dict(E_gap=1e-5, E_d=1e-5, N_d0=1e11, E_as=1e-5, N_as=1e8, m_e=1e-5, m_h=1e-5, epsilon=1e-5, T=1e-3, E_out=1.0)
+
+
+def batch(params, **change):
+    columns = {name: np.array([getattr(params, name)]) for name in Params.names}
+    for name, value in change.items():
+        columns[name] = np.array([value])
+    return calculatingModule.calculate_batch(**columns, sensitivities=bool(not change))
+
+
+@pytest.mark.parametrize('params', points, ids=lambda p: p.mat)
+def test_sensitivities_match_differences(params):
+    results = batch(params)
+    assert results['status'][0] == calculatingModule.STATUS_OK
+    for name in sensitivity.names:
+        value, step = getattr(params, name), steps[name]
+        up, down = batch(params, **{name: value + step}), batch(params, **{name: value - step})
+        for quantity in ('phi', 'W', 'E_f'):
+            change = (up[quantity][0] - down[quantity][0]) / 2
+            scale = abs(results[quantity][0])
+            # сравниваем изменения на шаге: у производных разные единицы
+            assert results['d' + quantity][name][0]*step == pytest.approx(change, rel=1e-3, abs=1e-8*scale), (name, quantity)
+
+
+def test_material_constants_have_no_sensitivity():
+    results = batch(points[1])
+    for name in sensitivity.material_names:
+        for quantity in ('phi', 'W', 'E_f'):
+            assert results['d' + quantity][name][0] == 0
@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+import pytest
+from fompy import constants
+from scipy.integrate import quad
+
+import calculatingModule
+import surfaceStates
+import validation
+from calcTypes import Params
+
+E_gap = 1.12
+distributions = [
+    surfaceStates.Gaussian(E0=0.4, sigma=0.05, N=1e13),
+    # хвост за краем зоны обрезается
+    surfaceStates.Gaussian(E0=0.05, sigma=0.03, N=1e12),
+    surfaceStates.UShaped(D_mid=1e11, D_edge=1e13, decay=0.1),
+    surfaceStates.Tabulated([0.2, 0.5, 0.7, 1.3], [0.0, 3e13, 1e13, 2e13]),
+]
+
+
+def brute(states, u, T):
+    """n_s and the number of states in the gap by adaptive quadrature over [0, E_gap]."""
+    kT = constants.k * T / constants.eV
+    fermi = lambda E: 1/(1 + math.exp(min((E - u)/kT, 700)))
+    points = [u] + list(getattr(states, 'E', ())) + [getattr(states, 'E0', 0.0)]
+    points = [p for p in points if 0 < p < E_gap]
+    n_s = quad(lambda E: float(states.density(E, E_gap)) * fermi(E), 0, E_gap, points=points, limit=500, epsabs=0, epsrel=1e-10)[0]
+    total = quad(lambda E: float(states.density(E, E_gap)), 0, E_gap, points=points, limit=500, epsabs=0, epsrel=1e-10)[0]
+    return n_s, total
+
+
+@pytest.mark.parametrize('states', distributions, ids=lambda s: type(s).__name__)
+def test_total_and_level(states):
+    total = brute(states, 10.0, 300)[1]
+    assert states.total(E_gap) == pytest.approx(total, rel=1e-6)
+    E_mean = quad(lambda E: E * float(states.density(E, E_gap)), 0, E_gap, limit=500,
+                  points=[p for p in getattr(states, 'E', ()) if 0 < p < E_gap] or None)[0] / total
+    assert states.level(E_gap) == pytest.approx(E_mean, rel=1e-6)
+
+
+@pytest.mark.parametrize('states', distributions, ids=lambda s: type(s).__name__)
+@pytest.mark.parametrize('T', [150.0, 300.0, 451.3])
+def test_occupied_matches_quadrature(states, T):
+    total = states.total(E_gap)
+    for u in (0.1, 0.35, 0.6, 0.95):
+        n_s = surfaceStates.occupied(states, u, T, E_gap)[0]
+        assert float(n_s) == pytest.approx(brute(states, u, T)[0], abs=1e-5*total)
+
+
+def test_derivative_matches_difference():
+    states = distributions[0]
+    u, h = np.array([0.3, 0.4, 0.5]), 1e-6
+    n_s, dn_s = surfaceStates.occupied(states, u, 300.0, E_gap)
+    difference = (surfaceStates.occupied(states, u + h, 300.0, E_gap)[0] - surfaceStates.occupied(states, u - h, 300.0, E_gap)[0]) / (2*h)
+    assert np.allclose(dn_s, difference, rtol=1e-3)
+
+
+@pytest.mark.parametrize('states', [surfaceStates.Gaussian(E0=2.0, sigma=0.05, N=1e13),
+                                    surfaceStates.Gaussian(E0=-0.5, sigma=0.05, N=1e13),
+                                    surfaceStates.Tabulated([1.5, 2.0], [1e13, 1e13])],
+                         ids=['above', 'below', 'tabulated'])
+def test_outside_gap(states):
+    assert states.empty(E_gap)
+    assert states.total(E_gap) == 0.0
+    assert math.isnan(states.level(E_gap))
+    params = Params(E_gap, 0.05, 1e16, 0.5, 1e12, mat='Si')
+    results = calculatingModule.calculate(params, states=states)
+    assert not results.ok
+    assert results.message == validation.message(validation.E_AS_OUTSIDE_GAP)
+    batch = calculatingModule.calculate_batch(*(np.array([getattr(params, name)]) for name in
+                                                ('E_gap', 'E_d', 'N_d0', 'E_as', 'N_as', 'T', 'E_out', 'mat')), states=states)
+    assert batch['status'][0] == calculatingModule.STATUS_INVALID
+    assert batch['errors'][0] == validation.E_AS_OUTSIDE_GAP
+
+
+def test_solution_with_states_balances_charge():
+    states = distributions[0]
+    params = Params(E_gap, 0.05, 1e16, 0.5, 1e12, mat='Si')
+    results = calculatingModule.calculate(params, states=states)
+    assert results.ok
+    E_f = calculatingModule.get_fermi_level(calculatingModule.set_material(params)) / constants.eV
+    n_s = brute(states, E_f - results.phi, params.T)[0]
+    parms = calculatingModule.set_material(params).cgs(0.0)
+    # n_s меняется как exp(u/kT), а уровень Ферми известен с точностью ~1e-6 E_gap
+    assert calculatingModule.f_left(results.phi, parms) == pytest.approx(n_s, rel=1e-4)
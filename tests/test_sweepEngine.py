@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import calculatingModule
+import resultStore
+import sweepEngine
+from calcTypes import Params
+
+base = Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si')
+axes = {'T': [250.0, 300.0, 350.0], 'N_as': np.logspace(11, 13, 7)}
+
+
+@pytest.fixture
+def grid():
+    return sweepEngine.GridSpec(base, axes)
+
+
+def test_sweep_matches_batch(tmp_path, grid):
+    out_dir = str(tmp_path / 'sweep')
+    assert sweepEngine.run_sweep(grid, out_dir, chunk_size=4, workers=2, profile_points=5) == grid.size
+    loaded, results = sweepEngine.load_sweep(out_dir)
+    assert loaded.shape == (3, 7) and np.array_equal(loaded.axes['N_as'], grid.axes['N_as'])
+    expected = calculatingModule.calculate_batch(**grid.columns(0, grid.size), profile_points=5)
+    for name in sweepEngine.columns:
+        assert np.array_equal(results[name].ravel(), expected[name], equal_nan=True)
+    assert results['E_c'].shape == (3, 7, 5)
+    assert np.array_equal(results['E_c'].reshape(-1, 5), expected['profile'].E_c, equal_nan=True)
+    # последняя ось меняется быстрее всех
+    assert results['phi'][1, 2] == pytest.approx(calculatingModule.calculate(base.replace(T=300, N_as=grid.axes['N_as'][2])).phi, rel=1e-6)
+
+
+def test_interrupted_sweep_resumes(tmp_path, grid):
+    out_dir = str(tmp_path / 'sweep')
+    sweepEngine.run_sweep(grid, out_dir, chunk_size=5, workers=1)
+    _, results = sweepEngine.load_sweep(out_dir)
+    expected = np.array(results['phi'])
+    # как будто процесс упал посреди куска 2
+    with resultStore.ResultStore(out_dir, mode='r+') as store:
+        store['chunk_done'][2] = 0
+        store['phi'][10:15] = 0
+    with pytest.raises(ValueError):
+        sweepEngine.load_sweep(out_dir)
+    assert sweepEngine.load_sweep(out_dir, allow_partial=True)[1]['phi'].ravel()[10] == 0
+    progress = []
+    assert sweepEngine.run_sweep(grid, out_dir, chunk_size=5, workers=1, progress=lambda *p: progress.append(p)) == 5
+    assert progress == [(16, 21), (21, 21)]
+    assert np.array_equal(sweepEngine.load_sweep(out_dir)[1]['phi'], expected)
+
+
+def test_other_sweep_in_directory(tmp_path, grid):
+    out_dir = str(tmp_path / 'sweep')
+    sweepEngine.run_sweep(grid, out_dir, chunk_size=8, workers=1)
+    with pytest.raises(ValueError):
+        sweepEngine.run_sweep(grid, out_dir, chunk_size=4, workers=1)
+    other = sweepEngine.GridSpec(base.replace(E_as=0.6), axes)
+    with pytest.raises(ValueError):
+        sweepEngine.run_sweep(other, out_dir, chunk_size=8, workers=1)
+
+
+@pytest.mark.parametrize('name', ['mat', 'x'])
+def test_unknown_axis(name):
+    with pytest.raises(ValueError):
+        sweepEngine.GridSpec(base, {name: [1.0]})
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import calculatingModule
+import uncertainty
+from calcTypes import Params
+
+base = Params(1.12, 0.05, 1e16, 0.5, 1e12, mat='Si')
+spread = {'N_as': uncertainty.LogNormal(1e12, 1.5), 'E_as': uncertainty.Normal(0.5, 0.02)}
+
+
+def test_histogram_matches_numpy():
+    rng = np.random.default_rng(1)
+    values = rng.normal(0, 1, 100000)
+    histogram = uncertainty.StreamingHistogram(bins=256)
+    # первый кусок узкий: диапазон потом несколько раз расширяется
+    for chunk in np.split(np.sort(values)[40000:60000], 4) + np.split(values, 10):
+        histogram.update(chunk)
+    seen = np.concatenate((np.sort(values)[40000:60000], values))
+    assert histogram.count == seen.size
+    assert histogram.mean == pytest.approx(seen.mean(), abs=1e-12)
+    assert histogram.std == pytest.approx(seen.std(ddof=1), rel=1e-10)
+    q = [0.01, 0.25, 0.5, 0.75, 0.99]
+    assert np.allclose(histogram.quantile(q), np.quantile(seen, q), atol=histogram.resolution, rtol=0)
+    edges, density = histogram.density()
+    assert (density * np.diff(edges)).sum() == pytest.approx(1)
+
+
+def test_histogram_skips_nan_and_empty():
+    histogram = uncertainty.StreamingHistogram()
+    histogram.update([np.nan, np.inf])
+    summary = histogram.summary()
+    assert summary.count == 0 and np.isnan(summary.mean) and np.isnan(summary.median)
+    with pytest.raises(ValueError):
+        uncertainty.StreamingHistogram(bins=3)
+
+
+def test_propagate_matches_direct_batch():
+    samples, chunk_size = 3000, 1000
+    result = uncertainty.propagate(base, spread, samples=samples, chunk_size=chunk_size, workers=0, seed=5)
+    # те же куски напрямую, без гистограмм
+    chunks = [uncertainty.run_chunk(base, spread, i, chunk_size, seed=5) for i in range(3)]
+    status = np.concatenate([chunk['status'] for chunk in chunks])
+    assert result.samples == samples
+    assert np.array_equal(result.status, np.bincount(status, minlength=3))
+    for name in uncertainty.quantities:
+        values = np.concatenate([chunk[name] for chunk in chunks])[status == calculatingModule.STATUS_OK]
+        assert result.histograms[name].mean == pytest.approx(values.mean(), rel=1e-12)
+
+
+def test_samples_follow_distributions():
+    chunk = uncertainty.run_chunk(base.replace(E_out=0), {'N_d0': uncertainty.LogUniform(1e15, 1e17)}, 0, 2000)
+    assert (chunk['status'] == calculatingModule.STATUS_OK).all()
+    # изгиб зон зависит от N_d0, значит выборки различаются
+    assert np.unique(chunk['W']).size == 2000
+
+
+def test_result_does_not_depend_on_workers():
+    kwargs = dict(samples=2000, chunk_size=500, seed=3)
+    serial = uncertainty.propagate(base, spread, workers=0, **kwargs)
+    pooled = uncertainty.propagate(base, spread, workers=2, **kwargs)
+    assert np.array_equal(serial.status, pooled.status)
+    for name in uncertainty.quantities:
+        assert np.array_equal(serial.histograms[name].counts, pooled.histograms[name].counts)
+        assert serial.histograms[name].mean == pooled.histograms[name].mean
+
+
+@pytest.mark.parametrize('distributions', [{'mat': 1}, {'x': 1}, {'E_gap': uncertainty.Normal(1.1, 0.01)}])
+def test_bad_distributions(distributions):
+    with pytest.raises(ValueError):
+        uncertainty.propagate(base, distributions, samples=10, workers=0)
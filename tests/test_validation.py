@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+import calculatingModule
+import validation
+from calcTypes import Params
+
+# допустимая строка: E_gap, E_as, N_d0, N_as, E_out, T, epsilon, Nc, Nv
+valid = dict(E_gap=1.12, E_as=0.5, N_d0=1e16, N_as=1e12, E_out=1e5, T=300.0, epsilon=11.7, Nc=3e19, Nv=1e19)
+
+
+def test_valid_row():
+    assert validation.check(**valid) == 0
+    assert validation.message(0) == 'ok'
+
+
+@pytest.mark.parametrize('changes, bit', [
+    (dict(T=-1.0), validation.NOT_POSITIVE),
+    (dict(E_gap=0.0, E_as=0.0), validation.NOT_POSITIVE),
+    (dict(N_d0=0.0), validation.NOT_POSITIVE),
+    (dict(N_as=-1.0, E_out=-1e5), validation.NOT_POSITIVE),
+    (dict(epsilon=-1.0), validation.NOT_POSITIVE),
+    (dict(E_as=1.5), validation.E_AS_OUTSIDE_GAP),
+    (dict(E_as=-0.5), validation.E_AS_OUTSIDE_GAP),
+    (dict(E_out=1e9), validation.FIELD_ABOVE_ACCEPTORS),
+    (dict(N_d0=5e19, Nv=1e20), validation.DONORS_ABOVE_NC),
+    (dict(N_d0=5e19, Nc=1e20), validation.DONORS_ABOVE_NV),
+])
+def test_single_bit(changes, bit):
+    assert validation.check(**dict(valid, **changes)) == bit
+    assert validation.masks([bit])[next(name for name, value in validation.bits.items() if value == bit)][0]
+    for language in ('ru', 'en'):
+        assert validation.messages(bit, language) == [validation.texts[language][bit]]
+
+
+def test_bits_combine_and_nan_fails():
+    code = int(validation.check(**dict(valid, E_as=2.0, E_out=1e9)))
+    assert code == validation.E_AS_OUTSIDE_GAP | validation.FIELD_ABOVE_ACCEPTORS
+    assert validation.message(code, 'en').split('\n') == [validation.texts['en'][validation.E_AS_OUTSIDE_GAP],
+                                                          validation.texts['en'][validation.FIELD_ABOVE_ACCEPTORS]]
+    assert validation.check(**dict(valid, T=np.nan)) & validation.NOT_POSITIVE
+
+
+def test_vectorized():
+    errors = validation.check(**dict(valid, E_as=np.array([0.5, -0.5, 1.5])))
+    assert errors.dtype == np.uint8
+    assert errors.tolist() == [0, validation.E_AS_OUTSIDE_GAP, validation.E_AS_OUTSIDE_GAP]
+
+
+def test_negative_E_as_is_rejected_by_calculate():
+    results = calculatingModule.calculate(Params(E_gap=1.12, E_d=0.05, N_d0=1e16, E_as=-0.5, N_as=1e12))
+    assert results.message == validation.texts['ru'][validation.E_AS_OUTSIDE_GAP]
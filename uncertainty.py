@@ -0,0 +1,250 @@
+"""
+Propagation of input uncertainties to distributions of phi, W and E_f by Monte Carlo.
+
+    spread = {'N_as': uncertainty.LogNormal(1e13, 1.5), 'E_as': uncertainty.Normal(0.4, 0.02)}
+    result = uncertainty.propagate(params, spread, samples=10**6)
+    result.histograms['phi'].quantile([0.05, 0.5, 0.95])
+    result.histograms['W'].summary(level=0.95)
+
+Samples are drawn and calculated with calculatingModule.calculate_batch in
+chunks across a process pool; the chunks only update streaming histograms
+and moments, so memory does not grow with the number of samples.
+Chunk i is drawn from its own seed (seed, i), the result does not depend
+on the number of workers.
+"""
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+import calculatingModule
+from calcTypes import Params
+
+# величины, распределения которых собираем
+quantities = ('phi', 'W', 'E_f')
+# у готовых материалов эти параметры берутся из fompy, разброс для них не имеет смысла
+material_names = ('E_gap', 'epsilon', 'm_e', 'm_h')
+
+
+class Normal(namedtuple('Normal', ['mean', 'std'])):
+    """Normal distribution."""
+
+    def sample(self, rng, size):
+        return rng.normal(self.mean, self.std, size)
+
+
+class Uniform(namedtuple('Uniform', ['lo', 'hi'])):
+    """Uniform distribution on [{lo}, {hi}]."""
+
+    def sample(self, rng, size):
+        return rng.uniform(self.lo, self.hi, size)
+
+
+class LogNormal(namedtuple('LogNormal', ['median', 'factor'])):
+    """Log-normal distribution: {median} multiplied or divided by {factor} is one standard deviation."""
+
+    def sample(self, rng, size):
+        return self.median * self.factor**rng.standard_normal(size)
+
+
+class LogUniform(namedtuple('LogUniform', ['lo', 'hi'])):
+    """Uniform distribution of the logarithm on [{lo}, {hi}]."""
+
+    def sample(self, rng, size):
+        return 10**rng.uniform(np.log10(self.lo), np.log10(self.hi), size)
+
+
+class Empirical(namedtuple('Empirical', ['values'])):
+    """Resampling of measured {values}."""
+
+    def sample(self, rng, size):
+        return rng.choice(np.asarray(self.values, dtype=float), size)
+
+
+def draw(distribution, rng, size):
+    """
+    {size} samples of {distribution}: an object with sample(rng, size)
+    (see the classes above), a function (rng, size) -> array or a constant.
+    For the process pool a user function must be defined at module level.
+    """
+    if hasattr(distribution, 'sample'):
+        values = distribution.sample(rng, size)
+    elif callable(distribution):
+        values = distribution(rng, size)
+    else:
+        values = distribution
+    return np.broadcast_to(np.asarray(values, dtype=float), (size,))
+
+
+# count - число учтенных значений, mean, std - по всем значениям (не по гистограмме),
+# median, lower, upper - квантили 0.5 и центральный интервал уровня level,
+# mean_error - полуширина доверительного интервала среднего
+Summary = namedtuple('Summary', ['count', 'mean', 'std', 'median', 'lower', 'upper', 'mean_error'])
+
+
+class StreamingHistogram:
+    """
+    Histogram of a stream of values with {bins} equal bins and exact moments.
+
+    The range is set by the first values and doubles (adjacent bins merge)
+    whenever a value falls outside it, so no value is lost and quantiles
+    are accurate to one bin width (see resolution). NaN values are skipped.
+    """
+
+    def __init__(self, bins=2048):
+        if bins < 2 or bins % 2:
+            raise ValueError('Number of bins must be even')
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.lo = self.hi = None
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def edges(self):
+        return np.linspace(self.lo, self.hi, self.counts.size + 1)
+
+    @property
+    def resolution(self):
+        return (self.hi - self.lo) / self.counts.size
+
+    @property
+    def std(self):
+        return np.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def _grow(self, right):
+        # соседние бины сливаются, старый диапазон становится половиной нового
+        half = self.counts.size // 2
+        merged = self.counts.reshape(half, 2).sum(axis=1)
+        zeros = np.zeros(half, dtype=np.int64)
+        width = self.hi - self.lo
+        if right:
+            self.counts = np.concatenate((merged, zeros))
+            self.hi += width
+        else:
+            self.counts = np.concatenate((zeros, merged))
+            self.lo -= width
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return
+        lo, hi = values.min(), values.max()
+        if self.lo is None:
+            # запас в пол диапазона с каждой стороны, чтобы не сливать бины с первых же данных
+            margin = (hi - lo) / 2 or abs(lo) * 1e-6 or 1e-30
+            self.lo, self.hi = lo - margin, hi + margin
+        while hi > self.hi:
+            self._grow(right=True)
+        while lo < self.lo:
+            self._grow(right=False)
+        index = ((values - self.lo) / self.resolution).astype(np.int64)
+        self.counts += np.bincount(np.minimum(index, self.counts.size - 1), minlength=self.counts.size)
+
+        # моменты объединяем по формулам Чана
+        n, mean = values.size, values.mean()
+        total = self.count + n
+        delta = mean - self.mean
+        self._m2 += ((values - mean)**2).sum() + delta**2 * self.count * n / total
+        self.mean += delta * n / total
+        self.count = total
+        self.min, self.max = min(self.min, lo), max(self.max, hi)
+
+    def quantile(self, q):
+        """Quantiles {q} (scalar or array in [0, 1]), linear inside a bin; NaN while empty."""
+        q = np.asarray(q, dtype=float)
+        if not self.count:
+            return np.full(q.shape, np.nan)
+        cumulative = np.concatenate(([0], np.cumsum(self.counts)))
+        result = np.interp(q * self.count, cumulative, self.edges)
+        # за пределы наблюдавшихся значений квантиль не выходит
+        return np.clip(result, self.min, self.max)
+
+    def density(self):
+        """(edges, probability density) normalized to the counted values."""
+        return self.edges, self.counts / (max(self.count, 1) * self.resolution)
+
+    def summary(self, level=0.95):
+        """Summary with the central interval and the confidence interval of the mean of {level}."""
+        median, lower, upper = self.quantile([0.5, (1 - level)/2, (1 + level)/2])
+        z = NormalDist().inv_cdf((1 + level)/2)
+        mean_error = z * self.std / np.sqrt(self.count) if self.count > 1 else np.nan
+        return Summary(self.count, self.mean if self.count else np.nan, self.std, median, lower, upper, mean_error)
+
+
+# samples - всего выборок, status - число выборок с каждым статусом calculatingModule.STATUS_*
+# (индекс - код статуса), histograms - StreamingHistogram по каждой из quantities (только STATUS_OK)
+Propagation = namedtuple('Propagation', ['samples', 'status', 'histograms'])
+
+
+def check_distributions(base, distributions):
+    for name in distributions:
+        if name not in Params.names or name == 'mat':
+            raise ValueError(f'Unknown uncertain parameter: {name}')
+        if name in material_names and base.mat != 'custom':
+            raise ValueError(f'{name} of {base.mat} is fixed by the material, use mat=custom')
+
+
+def run_chunk(base, distributions, index, size, seed=0, engine='depletion', accuracy='exact'):
+    """Draw and calculate chunk {index} of {size} samples, returns dict of result columns."""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+    columns = base.as_dict()
+    for name, distribution in distributions.items():
+        columns[name] = draw(distribution, rng, size)
+    results = calculatingModule.calculate_batch(**columns, engine=engine, accuracy=accuracy)
+    return {name: results[name] for name in quantities + ('status',)}
+
+
+def propagate(base, distributions, samples=10**6, chunk_size=65536, workers=None, seed=0, engine='depletion',
+              accuracy='exact', bins=2048, progress=None):
+    """
+    Monte Carlo propagation of the uncertainties of {base} (calcTypes.Params).
+
+    {distributions} - dict: parameter name -> distribution (see draw);
+    the other parameters are fixed at their {base} values.
+    {samples} are calculated in chunks of {chunk_size} in a process pool of
+    {workers} processes (all cores by default, 0 - in this process);
+    at most two chunks per worker are in flight.
+    {engine} and {accuracy} as in calculate_batch; accuracy='fast' is several
+    times faster and its error (below 0.004 kT) is far below any real spread.
+    Histograms have {bins} bins, {progress}(done, total) is called after every chunk.
+
+    Returns Propagation.
+    """
+    check_distributions(base, distributions)
+    sizes = [min(chunk_size, samples - start) for start in range(0, samples, chunk_size)]
+    histograms = {name: StreamingHistogram(bins) for name in quantities}
+    status = np.zeros(3, dtype=np.int64)
+    done = 0
+
+    def collect(chunk):
+        nonlocal done
+        ok = chunk['status'] == calculatingModule.STATUS_OK
+        for name in quantities:
+            histograms[name].update(chunk[name][ok])
+        status[:] += np.bincount(chunk['status'], minlength=status.size)
+        done += chunk['status'].size
+        if progress is not None:
+            progress(done, samples)
+
+    if workers == 0:
+        for index, size in enumerate(sizes):
+            collect(run_chunk(base, distributions, index, size, seed, engine, accuracy))
+        return Propagation(samples, status, histograms)
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # куски учитываем по порядку, чтобы гистограммы не зависели от того, какой процесс быстрее
+        in_flight = deque()
+        for index, size in enumerate(sizes):
+            in_flight.append(pool.submit(run_chunk, base, distributions, index, size, seed, engine, accuracy))
+            if len(in_flight) >= 2*workers:
+                collect(in_flight.popleft().result())
+        while in_flight:
+            collect(in_flight.popleft().result())
+    return Propagation(samples, status, histograms)
@@ -0,0 +1,82 @@
+"""
+Checks of the calculation parameters for whole arrays of rows.
+
+    errors = validation.check(E_gap, E_as, N_d0, N_as, E_out, T, epsilon, Nc, Nv)
+    valid = errors == 0                          # rows that go to the solver
+    validation.masks(errors)['DONORS_ABOVE_NC']  # rows with one problem
+    validation.message(errors[i])                # text, only when shown to the user
+
+Every violated condition sets its own bit of the error code, so a row
+reports all its problems, not only the last one. Texts are looked up by
+the code only for display, in the chosen language.
+"""
+import numpy as np
+from fompy import constants
+
+from calcTypes import E_out_to_cgs
+
+# биты кода ошибки
+NOT_POSITIVE = 1 # T, E_gap, N_d0 и epsilon должны быть больше 0, N_as - не меньше 0
+E_AS_OUTSIDE_GAP = 2
+FIELD_ABOVE_ACCEPTORS = 4
+DONORS_ABOVE_NC = 8
+DONORS_ABOVE_NV = 16
+
+# имена битов в порядке проверки
+bits = {'NOT_POSITIVE': NOT_POSITIVE, 'E_AS_OUTSIDE_GAP': E_AS_OUTSIDE_GAP, 'FIELD_ABOVE_ACCEPTORS': FIELD_ABOVE_ACCEPTORS,
+        'DONORS_ABOVE_NC': DONORS_ABOVE_NC, 'DONORS_ABOVE_NV': DONORS_ABOVE_NV}
+
+texts = {
+    'ru': {
+        NOT_POSITIVE: 'Ошибка! Температура, ширина запрещенной зоны, концентрации и диэлектрическая проницаемость должны быть положительными',
+        E_AS_OUTSIDE_GAP: 'Ошибка! Поверхностные состояния по энергии НЕ попадают в запрещенную зону полупроводника',
+        FIELD_ABOVE_ACCEPTORS: 'Ошибка! Внешнее поле больше, чем поле создаваемое поверхностными акцепторами',
+        DONORS_ABOVE_NC: 'Ошибка! Концентрация доноров больше эффективной плотности состояний в зоне проводимости',
+        DONORS_ABOVE_NV: 'Ошибка! Концентрация доноров больше эффективной плотности состояний в валентной зоне',
+    },
+    'en': {
+        NOT_POSITIVE: 'Error! Temperature, band gap, concentrations and permittivity must be positive',
+        E_AS_OUTSIDE_GAP: 'Error! The surface states are outside the band gap',
+        FIELD_ABOVE_ACCEPTORS: 'Error! The external field is stronger than the field of the surface acceptors',
+        DONORS_ABOVE_NC: 'Error! The donor concentration exceeds the effective density of states of the conduction band',
+        DONORS_ABOVE_NV: 'Error! The donor concentration exceeds the effective density of states of the valence band',
+    },
+}
+
+
+def check(E_gap, E_as, N_d0, N_as, E_out, T, epsilon, Nc, Nv):
+    """
+    Error codes of rows: arrays (or numbers) broadcast together, in the units of
+    calcTypes.Params, {Nc} and {Nv} [cm^(-3)] at the temperature of the row.
+    Returns uint8 array of bit fields, 0 for valid rows. NaN fails every check it enters.
+    """
+    E_gap, E_as, N_d0, N_as, E_out, T, epsilon, Nc, Nv = np.broadcast_arrays(
+        *(np.asarray(col, dtype=float) for col in (E_gap, E_as, N_d0, N_as, E_out, T, epsilon, Nc, Nv)))
+    # условия записаны как отрицание допустимого, чтобы NaN считался ошибкой
+    errors = np.where(~((T > 0) & (E_gap > 0) & (N_d0 > 0) & (N_as >= 0) & (epsilon > 0)), NOT_POSITIVE, 0)
+    errors |= np.where(~((E_as >= 0) & (E_as <= E_gap)), E_AS_OUTSIDE_GAP, 0)
+    errors |= np.where(~(E_out * E_out_to_cgs <= N_as * constants.e), FIELD_ABOVE_ACCEPTORS, 0)
+    errors |= np.where(~(N_d0 <= Nc), DONORS_ABOVE_NC, 0)
+    errors |= np.where(~(N_d0 <= Nv), DONORS_ABOVE_NV, 0)
+    return errors.astype(np.uint8)
+
+
+def check_params(params, Nc, Nv):
+    """Error code of calcTypes.Params {params} (with the material constants set) as an int."""
+    return int(check(params.E_gap, params.E_as, params.N_d0, params.N_as, params.E_out, params.T, params.epsilon, Nc, Nv))
+
+
+def masks(errors):
+    """dict: bit name -> boolean array of the rows with this error."""
+    errors = np.asarray(errors)
+    return {name: (errors & bit) != 0 for name, bit in bits.items()}
+
+
+def messages(code, language='ru'):
+    """Texts of all errors in {code}, in the order of the checks."""
+    return [texts[language][bit] for bit in bits.values() if int(code) & bit]
+
+
+def message(code, language='ru'):
+    """'ok' for 0, else the texts of all errors in {code}, one per line."""
+    return '\n'.join(messages(code, language)) or 'ok'